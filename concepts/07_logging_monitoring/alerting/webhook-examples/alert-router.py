@@ -0,0 +1,452 @@
+# 07_logging_monitoring/alerting/webhook-examples/alert-router.py
+# Single Alertmanager receiver that replaces the four webhook services.
+#
+# Each payload is deduplicated and normalized (process_alert_data) once,
+# then handed to every enabled sink through that sink's own bounded queue,
+# so unchanged resends reach no sink except as repeat counts in the store. The
+# sinks reuse the delivery code of the individual services, so store,
+# Slack, PagerDuty, email and HTTP forwarding share one process and one
+# set of pooled connections. Run from this directory:
+#
+#   ROUTER_SINKS=store,slack,pagerduty python alert-router.py
+#
+# Sink settings can be overridden per sink, e.g. ROUTER_SLACK_CONCURRENCY,
+# ROUTER_SLACK_QUEUE_SIZE and ROUTER_SLACK_MAX_ATTEMPTS.
+
+import asyncio
+import importlib.util
+import logging
+import os
+import random
+import time
+from datetime import datetime
+
+from aiohttp import web
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger('alert-router')
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+ROUTER_SINKS = [s.strip() for s in os.getenv('ROUTER_SINKS', 'store').split(',') if s.strip()]
+# Wait for required sinks (the store) before answering, so a crash cannot
+# lose an alert that Alertmanager considers delivered; optional sinks are
+# only offered the notification once the required ones have confirmed
+ROUTER_WAIT_FOR_REQUIRED = os.getenv('ROUTER_WAIT_FOR_REQUIRED', 'true').lower() == 'true'
+ROUTER_ACK_TIMEOUT = float(os.getenv('ROUTER_ACK_TIMEOUT', '10'))
+ROUTER_DRAIN_SECONDS = float(os.getenv('ROUTER_DRAIN_SECONDS', '10'))
+
+_modules = {}
+
+def load_service(filename):
+    """Import one of the webhook services (their file names are not valid module names)"""
+    module = _modules.get(filename)
+    if module is None:
+        name = filename[:-3].replace('-', '_')
+        spec = importlib.util.spec_from_file_location(name, os.path.join(HERE, filename))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _modules[filename] = module
+    return module
+
+class Notification:
+    """One Alertmanager payload, parsed once and shared by all sinks.
+
+    ``data`` holds only the alerts that changed state; ``repeats`` counts
+    the unchanged resends that were filtered out (fingerprint -> count).
+    """
+
+    __slots__ = ('data', 'processed', 'repeats', 'received_at')
+
+    def __init__(self, data, processed, repeats=None):
+        self.data = data
+        self.processed = processed
+        self.repeats = repeats or {}
+        self.received_at = time.monotonic()
+
+    @property
+    def alerts(self):
+        return self.data.get('alerts', [])
+
+    @property
+    def group_key(self):
+        return self.data.get('groupKey', 'unknown')
+
+class Sink:
+    """Base class for router destinations.
+
+    Subclasses set ``name`` and the defaults below and implement
+    ``deliver``; raising from it schedules a retry with backoff. A sink
+    marked ``required`` must accept every notification: when its queue is
+    full the webhook is answered with 503 so Alertmanager retries later,
+    whereas optional sinks drop the notification and count it.
+    """
+
+    name = None
+    concurrency = 1
+    queue_size = 1000
+    max_attempts = 3
+    required = False
+
+    def __init__(self):
+        prefix = f'ROUTER_{self.name.upper()}_'
+        self.concurrency = int(os.getenv(prefix + 'CONCURRENCY', self.concurrency))
+        self.queue_size = int(os.getenv(prefix + 'QUEUE_SIZE', self.queue_size))
+        self.max_attempts = int(os.getenv(prefix + 'MAX_ATTEMPTS', self.max_attempts))
+
+    def accepts(self, notification):
+        return bool(notification.alerts)
+
+    async def start(self):
+        pass
+
+    async def deliver(self, notification):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+    def stats(self):
+        return {}
+
+class StoreSink(Sink):
+    """SQLite storage, repeat counts and rollups of generic-webhook.py"""
+
+    name = 'store'
+    concurrency = 4
+    required = True
+    # Set by the router when the http sink is enabled too: outbound rows are
+    # then queued in the same transaction as the alerts
+    forward = False
+
+    def accepts(self, notification):
+        # Repeats alone still bump the stored rows' repeat counters
+        return bool(notification.alerts or notification.repeats)
+
+    async def start(self):
+        self.generic = load_service('generic-webhook.py')
+        await asyncio.to_thread(self.generic.get_alert_writer)
+
+    async def deliver(self, notification):
+        generic = self.generic
+        try:
+            forward = notification.processed if self.forward and notification.alerts else None
+            ticket = generic.store_alert(notification.data, notification.group_key, notification.repeats, forward)
+            if not await asyncio.to_thread(ticket.wait, generic.WRITE_ACK_TIMEOUT):
+                raise TimeoutError('alert batch not committed in time')
+        except Exception:
+            # Unstored transitions must not count as repeats when they come again
+            generic._deduplicator.forget(notification.alerts)
+            raise
+
+    async def close(self):
+        await asyncio.to_thread(self.generic.get_alert_writer().stop)
+
+    def stats(self):
+        writer = self.generic.get_alert_writer()
+        return {'writer_queue_depth': writer.queue_depth, 'duplicates': self.generic._deduplicator.duplicates}
+
+class HttpSink(Sink):
+    """Durable forwarding to WEBHOOK_ENDPOINTS through generic-webhook.py's outbound queue"""
+
+    name = 'http'
+    concurrency = 2
+    # True when the store sink queues the outbound rows itself
+    via_store = False
+
+    async def start(self):
+        self.generic = load_service('generic-webhook.py')
+        self.forwarder = await asyncio.to_thread(self.generic.get_forwarder)
+
+    def accepts(self, notification):
+        return not self.via_store and self.forwarder is not None and bool(notification.alerts)
+
+    async def deliver(self, notification):
+        ticket = self.forwarder.enqueue(notification.processed)
+        if not await asyncio.to_thread(ticket.wait, self.generic.WRITE_ACK_TIMEOUT):
+            raise TimeoutError('outbound rows not committed in time')
+
+    def stats(self):
+        return {'pending': self.forwarder.pending(), 'delivered': self.forwarder.delivered}
+
+class SlackSink(Sink):
+    """Per-channel aggregated messages via slack-webhook.py's dispatcher"""
+
+    name = 'slack'
+
+    async def start(self):
+        self.slack = load_service('slack-webhook.py')
+        self.dispatcher = self.slack.get_dispatcher()
+
+    async def deliver(self, notification):
+        by_channel = {}
+        for alert in sorted(notification.alerts, key=lambda a: a.get('status') != 'firing'):
+            attachment = self.slack.format_alert_message(alert)
+            if alert.get('status') == 'resolved':
+                attachment['color'] = 'good'
+                attachment['title'] = f"✅ {alert.get('annotations', {}).get('summary', 'Alert Resolved')}"
+            by_channel.setdefault(self.slack.alert_channel(alert), []).append(attachment)
+        for channel, attachments in by_channel.items():
+            # OverflowError is retried with backoff, which slows this queue down
+            self.dispatcher.submit(channel, attachments, notification.group_key)
+
+    def stats(self):
+        return {'pending_alerts': self.dispatcher.pending, 'messages_sent': self.dispatcher.messages_sent}
+
+class PagerDutySink(Sink):
+    """Critical and warning alerts via pagerduty-webhook.py's coalescing dispatcher"""
+
+    name = 'pagerduty'
+    # Each delivery waits out the dispatcher's coalesce window
+    concurrency = 16
+    # The dispatcher already retries 429/5xx; a failure here is final
+    max_attempts = 1
+    severities = ('critical', 'warning')
+    actions = {'firing': 'trigger', 'resolved': 'resolve'}
+
+    async def start(self):
+        self.pagerduty = load_service('pagerduty-webhook.py')
+        self.dispatcher = self.pagerduty.get_dispatcher()
+
+    def _events(self, notification):
+        for alert in notification.alerts:
+            action = self.actions.get(alert.get('status'))
+            if action and alert.get('labels', {}).get('severity', 'info') in self.severities:
+                yield self.pagerduty.format_pagerduty_event(alert, action)
+
+    def accepts(self, notification):
+        return any(True for _ in self._events(notification))
+
+    async def deliver(self, notification):
+        futures = [asyncio.wrap_future(self.dispatcher.submit(event)) for event in self._events(notification)]
+        results = await asyncio.gather(*futures)
+        failed = [result for success, result in results if not success]
+        if failed:
+            raise RuntimeError(f"{len(failed)} PagerDuty events failed: {failed[0]}")
+
+    def stats(self):
+        return {'pending': self.dispatcher.pending, 'sent': self.dispatcher.sent,
+                'coalesced': self.dispatcher.coalesced}
+
+class EmailSink(Sink):
+    """Per-recipient digests via email-webhook.py's pooled SMTP dispatcher"""
+
+    name = 'email'
+
+    async def start(self):
+        self.email = load_service('email-webhook.py')
+        self.dispatcher = self.email.get_dispatcher()
+
+    async def deliver(self, notification):
+        by_recipient = {}
+        for alert in notification.alerts:
+            for recipient in self.email.alert_recipients(alert):
+                by_recipient.setdefault(recipient, []).append(alert)
+        for recipient, alerts in by_recipient.items():
+            urgent = any(a.get('status') == 'firing'
+                         and a.get('labels', {}).get('severity') in self.email.EMAIL_URGENT_SEVERITIES
+                         for a in alerts)
+            # Rendering happens on the digest flush, off this loop
+            await asyncio.to_thread(self.dispatcher.add, recipient, alerts, notification.group_key, urgent)
+
+    async def close(self):
+        await asyncio.to_thread(self.dispatcher.flush_all)
+
+    def stats(self):
+        return {'pending_digest_alerts': self.dispatcher.pending_digests, 'sent': self.dispatcher.sent}
+
+SINK_TYPES = {sink.name: sink for sink in (StoreSink, HttpSink, SlackSink, PagerDutySink, EmailSink)}
+
+class SinkRunner:
+    """Bounded queue and worker tasks in front of one sink"""
+
+    def __init__(self, sink):
+        self.sink = sink
+        self.queue = asyncio.Queue(maxsize=sink.queue_size)
+        self.workers = []
+        self.delivered = 0
+        self.failed = 0
+        self.retried = 0
+        self.dropped = 0
+
+    def start(self):
+        self.workers = [asyncio.create_task(self._worker()) for _ in range(self.sink.concurrency)]
+
+    @property
+    def full(self):
+        return self.queue.full()
+
+    def offer(self, notification):
+        """Queue a notification; returns a Future for its outcome, or None if full"""
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((notification, future))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return None
+        return future
+
+    async def _worker(self):
+        while True:
+            notification, future = await self.queue.get()
+            try:
+                error = await self._deliver(notification)
+                if not future.done():
+                    future.set_result(error)
+            finally:
+                self.queue.task_done()
+
+    async def _deliver(self, notification):
+        """Deliver with retries; returns None on success or the last error"""
+        for attempt in range(1, self.sink.max_attempts + 1):
+            try:
+                await self.sink.deliver(notification)
+                self.delivered += 1
+                return None
+            except Exception as e:
+                error = e
+                if attempt < self.sink.max_attempts:
+                    self.retried += 1
+                    await asyncio.sleep(random.uniform(0, min(30, 0.5 * 2 ** attempt)))
+        self.failed += 1
+        logger.error(f"Sink {self.sink.name} failed for group {notification.group_key}: {error}")
+        return error
+
+    async def drain(self, timeout):
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Sink {self.sink.name} closed with {self.queue.qsize()} notifications queued")
+        for task in self.workers:
+            task.cancel()
+
+    def stats(self):
+        return dict(self.sink.stats(),
+                    queued=self.queue.qsize(), queue_size=self.sink.queue_size,
+                    concurrency=self.sink.concurrency, delivered=self.delivered,
+                    failed=self.failed, retried=self.retried, dropped=self.dropped)
+
+class AlertRouter:
+    def __init__(self, sink_names=ROUTER_SINKS):
+        unknown = [name for name in sink_names if name not in SINK_TYPES]
+        if unknown:
+            raise ValueError(f"Unknown sinks {unknown}; choose from {sorted(SINK_TYPES)}")
+        self.runners = [SinkRunner(SINK_TYPES[name]()) for name in sink_names]
+        sinks = {runner.sink.name: runner.sink for runner in self.runners}
+        if 'store' in sinks and 'http' in sinks:
+            # One transaction for an alert and its outbound rows, as in generic-webhook.py
+            sinks['store'].forward = sinks['http'].via_store = True
+        self.generic = load_service('generic-webhook.py')
+        self.received = 0
+
+    async def start(self, app):
+        if self.generic.ALERT_DEDUP:
+            # The deduplicator falls back to the alerts table on cache misses
+            await asyncio.to_thread(self.generic.init_database)
+        for runner in self.runners:
+            await runner.sink.start()
+            runner.start()
+        logger.info(f"Routing alerts to {', '.join(r.sink.name for r in self.runners)}")
+
+    async def close(self, app):
+        for runner in self.runners:
+            await runner.drain(ROUTER_DRAIN_SECONDS)
+            await runner.sink.close()
+
+    async def handle_webhook(self, request):
+        try:
+            data = await request.json()
+        except ValueError:
+            return web.json_response({'error': 'Invalid JSON'}, status=400)
+        if not data:
+            return web.json_response({'error': 'No JSON data provided'}, status=400)
+        if not isinstance(data, dict) or not isinstance(data.get('alerts', []), list):
+            return web.json_response({'error': 'Expected an Alertmanager webhook object'}, status=400)
+
+        # Deduplicate once, before fan-out: every sink sees only state
+        # transitions, and the store also gets the repeat counts
+        alert_count = len(data.get('alerts', []))
+        repeats = {}
+        if self.generic.ALERT_DEDUP:
+            new_alerts, repeats = await asyncio.to_thread(self.generic._deduplicator.split, data.get('alerts', []))
+            data = dict(data, alerts=new_alerts)
+
+        notification = Notification(data, self.generic.process_alert_data(data), repeats)
+        self.received += 1
+        error, routed = await self._route(notification)
+        if error is not None:
+            # Alertmanager will retry; the retry must not count as a repeat
+            self.generic._deduplicator.forget(notification.alerts)
+            return error
+
+        processed = notification.processed
+        return web.json_response({
+            'message': 'Webhook routed',
+            'group_key': processed['group_key'],
+            'alert_count': alert_count,
+            'new_count': processed['alert_count'],
+            'duplicate_count': sum(repeats.values()),
+            'sinks': routed
+        }, status=202)
+
+    async def _route(self, notification):
+        """Offer a notification to every accepting sink; return (error response or None, routed sink names)"""
+        runners = [r for r in self.runners if r.sink.accepts(notification)]
+
+        # Refuse the whole payload up front rather than deliver it partially
+        full = [r.sink.name for r in runners if r.sink.required and r.full]
+        if full:
+            for runner in runners:
+                if runner.sink.name in full:
+                    runner.dropped += 1
+            return web.json_response({'error': 'Sink queues full', 'sinks': full}, status=503), []
+
+        # Required sinks first: if one fails, Alertmanager's retry must not
+        # resend what the optional sinks (Slack, PagerDuty, email) already sent
+        required_runners = [r for r in runners if r.sink.required]
+        optional_runners = [r for r in runners if not r.sink.required]
+        if not ROUTER_WAIT_FOR_REQUIRED:
+            required_runners, optional_runners = [], runners
+
+        routed, required = [], []
+        for runner in required_runners:
+            future = runner.offer(notification)
+            if future is not None:
+                routed.append(runner.sink.name)
+                required.append((runner.sink.name, future))
+
+        if required:
+            try:
+                errors = await asyncio.wait_for(asyncio.gather(*(f for _, f in required)), ROUTER_ACK_TIMEOUT)
+            except asyncio.TimeoutError:
+                return web.json_response({'error': 'Required sinks did not confirm in time'}, status=503), routed
+            failed = {name: str(e) for (name, _), e in zip(required, errors) if e is not None}
+            if failed:
+                return web.json_response({'error': 'Delivery failed', 'sinks': failed}, status=503), routed
+
+        for runner in optional_runners:
+            if runner.offer(notification) is not None:
+                routed.append(runner.sink.name)
+
+        return None, routed
+
+    async def handle_health(self, request):
+        return web.json_response({
+            'status': 'healthy',
+            'timestamp': datetime.utcnow().isoformat(),
+            'received': self.received,
+            'sinks': {runner.sink.name: runner.stats() for runner in self.runners}
+        })
+
+    def app(self):
+        app = web.Application()
+        app.router.add_post('/webhook', self.handle_webhook)
+        app.router.add_get('/health', self.handle_health)
+        app.on_startup.append(self.start)
+        app.on_cleanup.append(self.close)
+        return app
+
+if __name__ == '__main__':
+    port = int(os.getenv('PORT', 8084))
+    logger.info(f"Starting alert router on port {port}")
+    web.run_app(AlertRouter().app(), port=port)
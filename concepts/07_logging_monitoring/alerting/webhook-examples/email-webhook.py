@@ -1,15 +1,20 @@
 # 07_logging_monitoring/alerting/webhook-examples/email-webhook.py
+# To try it without a mail account, run a local debugging SMTP server:
+#
+#   python -m aiosmtpd -n -l localhost:8025
+#   SMTP_PORT=8025 SMTP_USE_TLS=false SMTP_USERNAME= python email-webhook.py
 
-import json
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from email.mime.base import MIMEBase
-from email import encoders
+from concurrent.futures import Future
 from flask import Flask, request, jsonify
 from datetime import datetime
 import os
 import logging
+import queue
+import threading
+import time
 from jinja2 import Template
 
 app = Flask(__name__)
@@ -26,6 +31,24 @@ SMTP_PASSWORD = os.getenv('SMTP_PASSWORD', 'password')
 SMTP_USE_TLS = os.getenv('SMTP_USE_TLS', 'true').lower() == 'true'
 FROM_EMAIL = os.getenv('FROM_EMAIL', 'alerts@example.com')
 TO_EMAILS = os.getenv('TO_EMAILS', 'admin@example.com').split(',')
+# Alerts carrying this label (comma-separated addresses) go to those
+# recipients instead of TO_EMAILS
+EMAIL_RECIPIENT_LABEL = os.getenv('EMAIL_RECIPIENT_LABEL', 'email_to')
+
+# Delivery tuning
+SMTP_POOL_SIZE = int(os.getenv('SMTP_POOL_SIZE', '2'))
+SMTP_TIMEOUT = float(os.getenv('SMTP_TIMEOUT', '10'))
+# Idle connections are checked with NOOP before reuse after this long, and
+# closed once idle past SMTP_IDLE_TIMEOUT (servers drop them around 5 min)
+SMTP_KEEPALIVE_SECONDS = float(os.getenv('SMTP_KEEPALIVE_SECONDS', '30'))
+SMTP_IDLE_TIMEOUT = float(os.getenv('SMTP_IDLE_TIMEOUT', '240'))
+EMAIL_MAX_ATTEMPTS = int(os.getenv('EMAIL_MAX_ATTEMPTS', '4'))
+EMAIL_QUEUE_SIZE = int(os.getenv('EMAIL_QUEUE_SIZE', '1000'))
+# Alerts for a recipient are collected into one digest email per window;
+# firing alerts of these severities send the digest right away
+EMAIL_DIGEST_WINDOW = float(os.getenv('EMAIL_DIGEST_WINDOW', '60'))
+EMAIL_DIGEST_MAX_ALERTS = int(os.getenv('EMAIL_DIGEST_MAX_ALERTS', '50'))
+EMAIL_URGENT_SEVERITIES = [s.strip() for s in os.getenv('EMAIL_URGENT_SEVERITIES', 'critical').split(',') if s.strip()]
 
 # Email templates
 HTML_TEMPLATE = """
@@ -163,39 +186,241 @@ Runbook URL: {{ alert.annotations.get('runbook_url') }}
 This alert was generated by AlertManager
 """
 
-def send_email(subject, html_body, text_body, to_emails=None):
-    """Send email notification"""
+# Compiled once; rendering reuses the same template code for every email
+HTML_EMAIL = Template(HTML_TEMPLATE)
+TEXT_EMAIL = Template(TEXT_TEMPLATE)
+
+def build_message(subject, html_body, text_body, to_emails):
+    msg = MIMEMultipart('alternative')
+    msg['Subject'] = subject
+    msg['From'] = FROM_EMAIL
+    msg['To'] = ', '.join(to_emails)
+    
+    # Add text and HTML parts
+    msg.attach(MIMEText(text_body, 'plain'))
+    msg.attach(MIMEText(html_body, 'html'))
+    return msg
+
+class SMTPPool:
+    """Reusable authenticated SMTP connections.
+    
+    Opening a connection costs a TCP handshake, STARTTLS and AUTH, which
+    dominate the time to send a small message. Connections are returned to
+    the pool after use; one that sat idle longer than SMTP_KEEPALIVE_SECONDS
+    is probed with NOOP before reuse, and one idle past SMTP_IDLE_TIMEOUT is
+    closed, since the server has probably dropped it already.
+    """
+    
+    def __init__(self, size=SMTP_POOL_SIZE):
+        self.size = size
+        self._idle = []  # (connection, last_used)
+        self._lock = threading.Lock()
+        self.connections_opened = 0
+    
+    def _connect(self):
+        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=SMTP_TIMEOUT)
+        try:
+            if SMTP_USE_TLS:
+                server.starttls()
+            
+            if SMTP_USERNAME and SMTP_PASSWORD:
+                server.login(SMTP_USERNAME, SMTP_PASSWORD)
+        except Exception:
+            self._close(server)
+            raise
+        self.connections_opened += 1
+        return server
+    
+    @staticmethod
+    def _close(server):
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+    
+    def acquire(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                server, last_used = self._idle.pop()
+            idle = time.monotonic() - last_used
+            if idle > SMTP_IDLE_TIMEOUT:
+                self._close(server)
+                continue
+            if idle > SMTP_KEEPALIVE_SECONDS:
+                try:
+                    if server.noop()[0] != 250:
+                        raise smtplib.SMTPServerDisconnected('NOOP failed')
+                except (smtplib.SMTPException, OSError):
+                    server.close()
+                    continue
+            return server
+        return self._connect()
+    
+    def release(self, server, broken=False):
+        if broken:
+            server.close()
+            return
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append((server, time.monotonic()))
+                return
+        self._close(server)
+    
+    def send(self, msg):
+        """Send on a pooled connection, reconnecting once if it was dropped"""
+        server = self.acquire()
+        try:
+            try:
+                server.send_message(msg)
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                # Closed by the server since it was last used or checked
+                server.close()
+                server = self._connect()
+                server.send_message(msg)
+        except Exception:
+            self.release(server, broken=True)
+            raise
+        self.release(server)
+    
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for server, _ in idle:
+            self._close(server)
+
+class EmailDispatcher:
+    """Per-recipient digests sent by background workers over an SMTPPool.
+    
+    Alerts are grouped by recipient for EMAIL_DIGEST_WINDOW seconds (or
+    EMAIL_DIGEST_MAX_ALERTS alerts, or until an urgent alert arrives) and
+    rendered into one email each. Rendered emails go on a bounded queue
+    drained by SMTP_POOL_SIZE sender threads, so webhooks return as soon as
+    their alerts are queued.
+    """
+    
+    def __init__(self, pool=None, window=EMAIL_DIGEST_WINDOW, max_alerts=EMAIL_DIGEST_MAX_ALERTS,
+                 queue_size=EMAIL_QUEUE_SIZE, workers=SMTP_POOL_SIZE):
+        self.pool = pool or SMTPPool(workers)
+        self.window = window
+        self.max_alerts = max_alerts
+        self.workers = workers
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        # recipient -> {'alerts': [...], 'group_keys': [...], 'timer': Timer}
+        self._digests = {}
+        self._started = False
+        self.sent = 0
+        self.failed = 0
+    
+    def start(self):
+        if not self._started:
+            self._started = True
+            for i in range(self.workers):
+                threading.Thread(target=self._worker, name=f'email-sender-{i}', daemon=True).start()
+        return self
+    
+    @property
+    def queue_depth(self):
+        return self._queue.qsize()
+    
+    @property
+    def pending_digests(self):
+        with self._lock:
+            return sum(len(d['alerts']) for d in self._digests.values())
+    
+    def add(self, recipient, alerts, group_key, urgent=False):
+        """Add alerts to a recipient's digest, flushing it when full or urgent"""
+        flush = None
+        with self._lock:
+            digest = self._digests.get(recipient)
+            if digest is None:
+                timer = threading.Timer(self.window, self.flush, args=(recipient,))
+                timer.daemon = True
+                digest = self._digests[recipient] = {'alerts': [], 'group_keys': [], 'timer': timer}
+                timer.start()
+            digest['alerts'].extend(alerts)
+            if group_key not in digest['group_keys']:
+                digest['group_keys'].append(group_key)
+            if urgent or len(digest['alerts']) >= self.max_alerts:
+                flush = recipient
+        if flush:
+            self.flush(flush)
+    
+    def flush(self, recipient):
+        with self._lock:
+            digest = self._digests.pop(recipient, None)
+        if digest is None:
+            return
+        digest['timer'].cancel()
+        group_key = ', '.join(digest['group_keys'])
+        subject, html_body, text_body = generate_email_content({'alerts': digest['alerts'], 'groupKey': group_key})
+        try:
+            self.submit(build_message(subject, html_body, text_body, [recipient]), timeout=5)
+        except queue.Full:
+            self.failed += 1
+            logger.error(f"Email queue full, dropped digest of {len(digest['alerts'])} alerts for {recipient}")
+    
+    def flush_all(self):
+        with self._lock:
+            recipients = list(self._digests)
+        for recipient in recipients:
+            self.flush(recipient)
+    
+    def submit(self, msg, timeout=1.0):
+        """Queue a message; returns a Future resolving to True/False"""
+        future = Future()
+        self._queue.put((msg, future), timeout=timeout)
+        return future
+    
+    def _worker(self):
+        while True:
+            msg, future = self._queue.get()
+            error = None
+            for attempt in range(1, EMAIL_MAX_ATTEMPTS + 1):
+                try:
+                    self.pool.send(msg)
+                    error = None
+                    break
+                except Exception as e:
+                    error = e
+                    if attempt < EMAIL_MAX_ATTEMPTS:
+                        time.sleep(min(30, 2 ** attempt))
+            if error is None:
+                self.sent += 1
+                logger.info(f"Email sent successfully to {msg['To']}")
+            else:
+                self.failed += 1
+                logger.error(f"Failed to send email to {msg['To']}: {error}")
+            future.set_result(error is None)
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+def get_dispatcher():
+    """Return the process-wide EmailDispatcher, starting it on first use"""
+    global _dispatcher
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                _dispatcher = EmailDispatcher().start()
+    return _dispatcher
+
+def alert_recipients(alert):
+    routed = alert.get('labels', {}).get(EMAIL_RECIPIENT_LABEL)
+    if routed:
+        return [r.strip() for r in routed.split(',') if r.strip()]
+    return TO_EMAILS
+
+def send_email(subject, html_body, text_body, to_emails=None, timeout=30):
+    """Send an email through the pooled senders and wait for the result"""
     if to_emails is None:
         to_emails = TO_EMAILS
     
     try:
-        msg = MIMEMultipart('alternative')
-        msg['Subject'] = subject
-        msg['From'] = FROM_EMAIL
-        msg['To'] = ', '.join(to_emails)
-        
-        # Add text and HTML parts
-        text_part = MIMEText(text_body, 'plain')
-        html_part = MIMEText(html_body, 'html')
-        
-        msg.attach(text_part)
-        msg.attach(html_part)
-        
-        # Connect to SMTP server and send email
-        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-        
-        if SMTP_USE_TLS:
-            server.starttls()
-        
-        if SMTP_USERNAME and SMTP_PASSWORD:
-            server.login(SMTP_USERNAME, SMTP_PASSWORD)
-        
-        server.send_message(msg)
-        server.quit()
-        
-        logger.info(f"Email sent successfully to {', '.join(to_emails)}")
-        return True
-        
+        msg = build_message(subject, html_body, text_body, to_emails)
+        return get_dispatcher().submit(msg).result(timeout)
     except Exception as e:
         logger.error(f"Failed to send email: {e}")
         return False
@@ -236,11 +461,8 @@ def generate_email_content(data):
     }
     
     # Generate email content
-    html_template = Template(HTML_TEMPLATE)
-    text_template = Template(TEXT_TEMPLATE)
-    
-    html_body = html_template.render(**context)
-    text_body = text_template.render(**context)
+    html_body = HTML_EMAIL.render(**context)
+    text_body = TEXT_EMAIL.render(**context)
     
     # Generate subject line
     if status == 'firing':
@@ -270,7 +492,14 @@ def health():
         'smtp_server': SMTP_SERVER,
         'smtp_port': SMTP_PORT,
         'from_email': FROM_EMAIL,
-        'to_emails': TO_EMAILS
+        'to_emails': TO_EMAILS,
+        'delivery': {
+            'pending_digest_alerts': get_dispatcher().pending_digests,
+            'queue_depth': get_dispatcher().queue_depth,
+            'sent': get_dispatcher().sent,
+            'failed': get_dispatcher().failed,
+            'smtp_connections_opened': get_dispatcher().pool.connections_opened
+        }
     })
 
 @app.route('/webhook', methods=['POST'])
@@ -282,26 +511,31 @@ def webhook():
         if not data:
             return jsonify({'error': 'No JSON data provided'}), 400
         
-        logger.info(f"Received webhook data: {json.dumps(data, indent=2)}")
-        
         alerts = data.get('alerts', [])
+        logger.info(f"Received webhook with {len(alerts)} alerts for group {data.get('groupKey')}")
+        
         if not alerts:
             return jsonify({'error': 'No alerts in payload'}), 400
         
-        # Generate email content
-        subject, html_body, text_body = generate_email_content(data)
+        by_recipient = {}
+        for alert in alerts:
+            for recipient in alert_recipients(alert):
+                by_recipient.setdefault(recipient, []).append(alert)
         
-        # Send email
-        success = send_email(subject, html_body, text_body)
+        # Queue alerts into each recipient's digest; emails are sent later
+        dispatcher = get_dispatcher()
+        group_key = data.get('groupKey', 'unknown')
+        for recipient, recipient_alerts in by_recipient.items():
+            urgent = any(a.get('status') == 'firing'
+                         and a.get('labels', {}).get('severity') in EMAIL_URGENT_SEVERITIES
+                         for a in recipient_alerts)
+            dispatcher.add(recipient, recipient_alerts, group_key, urgent=urgent)
         
-        if success:
-            return jsonify({
-                'message': 'Email notification sent successfully',
-                'alert_count': len(alerts),
-                'recipients': TO_EMAILS
-            }), 200
-        else:
-            return jsonify({'error': 'Failed to send email notification'}), 500
+        return jsonify({
+            'message': 'Alerts queued for email notification',
+            'alert_count': len(alerts),
+            'recipients': sorted(by_recipient)
+        }), 202
         
     except Exception as e:
         logger.error(f"Error processing webhook: {e}")
@@ -350,5 +584,6 @@ if __name__ == '__main__':
     logger.info(f"SMTP Server: {SMTP_SERVER}:{SMTP_PORT}")
     logger.info(f"From: {FROM_EMAIL}")
     logger.info(f"To: {', '.join(TO_EMAILS)}")
+    get_dispatcher()
     
     app.run(host='0.0.0.0', port=port, debug=debug)
\ No newline at end of file
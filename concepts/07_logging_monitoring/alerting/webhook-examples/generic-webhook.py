@@ -1,14 +1,22 @@
 # 07_logging_monitoring/alerting/webhook-examples/generic-webhook.py
 
+import base64
+import hashlib
 import json
+import random
 import requests
+from requests.adapters import HTTPAdapter
 from flask import Flask, request, jsonify
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 import os
 import logging
+import queue
 import sqlite3
 import threading
-from contextlib import contextmanager
+import time
+from collections import Counter, OrderedDict
+from contextlib import closing, contextmanager
 
 app = Flask(__name__)
 
@@ -21,10 +29,54 @@ DATABASE_PATH = os.getenv('DATABASE_PATH', '/tmp/alerts.db')
 WEBHOOK_ENDPOINTS = os.getenv('WEBHOOK_ENDPOINTS', '').split(',')
 WEBHOOK_ENDPOINTS = [url.strip() for url in WEBHOOK_ENDPOINTS if url.strip()]
 
+# Ingest writer tuning
+WRITE_BATCH_SIZE = int(os.getenv('WRITE_BATCH_SIZE', '500'))
+WRITE_BATCH_MS = int(os.getenv('WRITE_BATCH_MS', '2'))
+WRITE_QUEUE_SIZE = int(os.getenv('WRITE_QUEUE_SIZE', '10000'))
+# 'commit': respond once the alert's batch is committed (safe against crashes)
+# 'enqueue': respond as soon as the alert is queued for the writer
+WRITE_ACK_MODE = os.getenv('WRITE_ACK_MODE', 'commit')
+WRITE_ACK_TIMEOUT = float(os.getenv('WRITE_ACK_TIMEOUT', '5'))
+
+# Outbound forwarding
+FORWARD_WORKERS = int(os.getenv('FORWARD_WORKERS', '4'))
+FORWARD_TIMEOUT = float(os.getenv('FORWARD_TIMEOUT', '10'))
+FORWARD_MAX_ATTEMPTS = int(os.getenv('FORWARD_MAX_ATTEMPTS', '8'))
+FORWARD_BACKOFF_BASE = float(os.getenv('FORWARD_BACKOFF_BASE', '1'))
+FORWARD_BACKOFF_MAX = float(os.getenv('FORWARD_BACKOFF_MAX', '300'))
+FORWARD_POLL_SECONDS = float(os.getenv('FORWARD_POLL_SECONDS', '0.5'))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv('BREAKER_FAILURE_THRESHOLD', '5'))
+BREAKER_RESET_SECONDS = float(os.getenv('BREAKER_RESET_SECONDS', '30'))
+
+# Repeated notifications of an unchanged alert (same fingerprint, status and
+# endsAt) only bump the repeat counter of the stored row
+ALERT_DEDUP = os.getenv('ALERT_DEDUP', 'true').lower() == 'true'
+DEDUP_CACHE_SIZE = int(os.getenv('DEDUP_CACHE_SIZE', '10000'))
+
+# Retention: raw alerts older than ALERT_RETENTION_DAYS are deleted; they
+# stay counted in the rollups. Off by default (0 keeps them forever), so
+# existing history is only purged once this is set. Per-minute buckets older
+# than ROLLUP_MINUTE_RETENTION_HOURS are merged into hourly buckets.
+ALERT_RETENTION_DAYS = int(os.getenv('ALERT_RETENTION_DAYS', '0'))
+ROLLUP_MINUTE_RETENTION_HOURS = max(int(os.getenv('ROLLUP_MINUTE_RETENTION_HOURS', '48')), 24)
+COMPACTION_INTERVAL = float(os.getenv('COMPACTION_INTERVAL', '3600'))
+COMPACTION_CHUNK = int(os.getenv('COMPACTION_CHUNK', '5000'))
+
 # Initialize database
 def init_database():
     """Initialize SQLite database for alert storage"""
-    with sqlite3.connect(DATABASE_PATH) as conn:
+    # WAL lets the API read while the writer thread commits; the mode is
+    # stored in the database file so every later connection inherits it.
+    # It cannot change inside a transaction, so set it on its own
+    # autocommit connection before the schema and migrations run.
+    conn = sqlite3.connect(DATABASE_PATH, isolation_level=None)
+    try:
+        conn.execute('PRAGMA journal_mode=WAL')
+    finally:
+        conn.close()
+    
+    # Close explicitly: a connection left for gc would hold the database open
+    with closing(sqlite3.connect(DATABASE_PATH)) as conn, conn:
         conn.execute('''
             CREATE TABLE IF NOT EXISTS alerts (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -39,95 +91,873 @@ def init_database():
                 labels TEXT,
                 annotations TEXT,
                 raw_data TEXT,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                fingerprint TEXT,
+                ends_at TEXT,
+                repeat_count INTEGER NOT NULL DEFAULT 0,
+                last_seen_at DATETIME
             )
         ''')
         
+        # Databases created before deduplication lack its columns
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(alerts)')}
+        if 'fingerprint' not in columns:
+            conn.executescript('''
+                ALTER TABLE alerts ADD COLUMN fingerprint TEXT;
+                ALTER TABLE alerts ADD COLUMN ends_at TEXT;
+                ALTER TABLE alerts ADD COLUMN repeat_count INTEGER NOT NULL DEFAULT 0;
+                ALTER TABLE alerts ADD COLUMN last_seen_at DATETIME;
+                UPDATE alerts SET
+                    fingerprint = json_extract(raw_data, '$.fingerprint'),
+                    ends_at = json_extract(raw_data, '$.endsAt')
+                WHERE json_valid(raw_data);
+            ''')
+        
+        # Latest row per fingerprint, for the deduplicator's persistent lookup
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_alerts_fingerprint ON alerts(fingerprint, id);
+        ''')
+        
         conn.execute('''
             CREATE INDEX IF NOT EXISTS idx_timestamp ON alerts(timestamp);
         ''')
         
+        # Composite indexes ending in (created_at, id) serve both the filters
+        # and the newest-first keyset ordering of /alerts without a sort.
+        # They supersede the old single-column status/severity indexes.
+        conn.execute('DROP INDEX IF EXISTS idx_status')
+        conn.execute('DROP INDEX IF EXISTS idx_severity')
+        
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_alerts_status_severity_created
+            ON alerts(status, severity, created_at, id);
+        ''')
+        
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_alerts_status_created ON alerts(status, created_at, id);
+        ''')
+        
         conn.execute('''
-            CREATE INDEX IF NOT EXISTS idx_status ON alerts(status);
+            CREATE INDEX IF NOT EXISTS idx_alerts_severity_created ON alerts(severity, created_at, id);
         ''')
         
         conn.execute('''
-            CREATE INDEX IF NOT EXISTS idx_severity ON alerts(severity);
+            CREATE INDEX IF NOT EXISTS idx_alerts_created ON alerts(created_at, id);
         ''')
+        
+        init_fulltext_index(conn)
+        init_rollups(conn)
+        
+        # Durable outbound queue for forward_to_webhooks, one row per
+        # (payload, destination); rows are deleted once delivered.
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS outbound (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                destination TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                last_error TEXT,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_outbound_due ON outbound(next_attempt_at);
+        ''')
+        
+        # Deliveries that exhausted their retries or were rejected outright
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS outbound_dead (
+                id INTEGER PRIMARY KEY,
+                destination TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                attempts INTEGER NOT NULL,
+                last_error TEXT,
+                created_at DATETIME,
+                failed_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+def init_fulltext_index(conn):
+    """Create the FTS5 index over alert name, summary and description.
+    
+    It is an external-content table kept in sync by triggers, so the text is
+    not stored twice. SQLite builds without FTS5 fall back to LIKE queries.
+    """
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'alerts_fts'"
+    ).fetchone()
+    try:
+        conn.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS alerts_fts USING fts5(
+                alert_name, summary, description,
+                content='alerts', content_rowid='id'
+            )
+        ''')
+    except sqlite3.OperationalError as e:
+        logger.warning(f"FTS5 unavailable, text search will use LIKE: {e}")
+        return
+    
+    conn.executescript('''
+        CREATE TRIGGER IF NOT EXISTS alerts_fts_insert AFTER INSERT ON alerts BEGIN
+            INSERT INTO alerts_fts(rowid, alert_name, summary, description)
+            VALUES (new.id, new.alert_name, new.summary, new.description);
+        END;
+        CREATE TRIGGER IF NOT EXISTS alerts_fts_delete AFTER DELETE ON alerts BEGIN
+            INSERT INTO alerts_fts(alerts_fts, rowid, alert_name, summary, description)
+            VALUES ('delete', old.id, old.alert_name, old.summary, old.description);
+        END;
+        CREATE TRIGGER IF NOT EXISTS alerts_fts_update
+        AFTER UPDATE OF alert_name, summary, description ON alerts BEGIN
+            INSERT INTO alerts_fts(alerts_fts, rowid, alert_name, summary, description)
+            VALUES ('delete', old.id, old.alert_name, old.summary, old.description);
+            INSERT INTO alerts_fts(rowid, alert_name, summary, description)
+            VALUES (new.id, new.alert_name, new.summary, new.description);
+        END;
+    ''')
+    
+    if not exists:
+        # Index rows stored before the FTS table existed
+        conn.execute("INSERT INTO alerts_fts(alerts_fts) VALUES ('rebuild')")
+
+# Rollup key used for alerts without a status, severity or name
+ROLLUP_NONE = 'unknown'
+
+def init_rollups(conn):
+    """Create the counters behind /alerts/stats.
+    
+    alert_rollup holds running totals per (dimension, value), where dimension
+    is 'total', 'status', 'severity' or 'alert_name'. alert_rollup_minute and
+    alert_rollup_hour count alerts per severity per time bucket (unix
+    minute/hour). All of them are updated in the same transaction as the
+    alert rows, so the stats never need to scan the alerts table.
+    """
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'alert_rollup'"
+    ).fetchone()
+    conn.executescript('''
+        CREATE TABLE IF NOT EXISTS alert_rollup (
+            dimension TEXT NOT NULL,
+            value TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (dimension, value)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS idx_alert_rollup_count ON alert_rollup(dimension, count);
+        CREATE TABLE IF NOT EXISTS alert_rollup_minute (
+            minute INTEGER NOT NULL,
+            severity TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (minute, severity)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS alert_rollup_hour (
+            hour INTEGER NOT NULL,
+            severity TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (hour, severity)
+        ) WITHOUT ROWID;
+    ''')
+    
+    if not exists:
+        # Count the alerts stored before the rollups existed
+        for dimension, expression in (('total', "'total'"), ('status', 'status'),
+                                      ('severity', 'severity'), ('alert_name', 'alert_name')):
+            conn.execute(f'''
+                INSERT INTO alert_rollup (dimension, value, count)
+                SELECT ?, COALESCE({expression}, ?), COUNT(*) FROM alerts
+                GROUP BY 2 HAVING COUNT(*) > 0
+            ''', (dimension, ROLLUP_NONE))
+        conn.execute('''
+            INSERT INTO alert_rollup_minute (minute, severity, count)
+            SELECT CAST(strftime('%s', created_at) AS INTEGER) / 60, COALESCE(severity, ?), COUNT(*)
+            FROM alerts GROUP BY 1, 2
+        ''', (ROLLUP_NONE,))
+
+_fts_available = None
+
+def fts_available():
+    global _fts_available
+    if _fts_available is None:
+        with get_db_connection() as conn:
+            _fts_available = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'alerts_fts'"
+            ).fetchone() is not None
+    return _fts_available
 
 @contextmanager
 def get_db_connection():
     """Get database connection with context manager"""
-    conn = sqlite3.connect(DATABASE_PATH)
+    conn = sqlite3.connect(DATABASE_PATH, timeout=10)
     conn.row_factory = sqlite3.Row
     try:
         yield conn
     finally:
         conn.close()
 
-def store_alert(alert_data, group_key):
-    """Store alert in database"""
-    try:
-        alerts = alert_data.get('alerts', [])
+INSERT_ALERT_SQL = '''
+    INSERT INTO alerts (
+        timestamp, group_key, status, alert_name, instance, 
+        severity, summary, description, labels, annotations, raw_data,
+        fingerprint, ends_at
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+# Count repeats against the latest stored row of a fingerprint
+REPEAT_ALERT_SQL = '''
+    UPDATE alerts SET repeat_count = repeat_count + ?, last_seen_at = CURRENT_TIMESTAMP
+    WHERE id = (SELECT MAX(id) FROM alerts WHERE fingerprint = ?)
+'''
+
+ENQUEUE_OUTBOUND_SQL = '''
+    INSERT INTO outbound (destination, payload, next_attempt_at) VALUES (?, ?, ?)
+'''
+
+RESCHEDULE_OUTBOUND_SQL = '''
+    UPDATE outbound SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?
+'''
+
+DEAD_LETTER_SQL = '''
+    INSERT OR REPLACE INTO outbound_dead (id, destination, payload, attempts, last_error, created_at)
+    SELECT id, destination, payload, ?, ?, created_at FROM outbound WHERE id = ?
+'''
+
+DELETE_OUTBOUND_SQL = '''
+    DELETE FROM outbound WHERE id = ?
+'''
+
+ROLLUP_SQL = '''
+    INSERT INTO alert_rollup (dimension, value, count) VALUES (?, ?, ?)
+    ON CONFLICT (dimension, value) DO UPDATE SET count = count + excluded.count
+'''
+
+ROLLUP_MINUTE_SQL = '''
+    INSERT INTO alert_rollup_minute (minute, severity, count) VALUES (?, ?, ?)
+    ON CONFLICT (minute, severity) DO UPDATE SET count = count + excluded.count
+'''
+
+# Merge minute buckets older than the given minute into hourly buckets
+DOWNSAMPLE_MINUTES_SQL = '''
+    INSERT INTO alert_rollup_hour (hour, severity, count)
+    SELECT minute / 60, severity, SUM(count) FROM alert_rollup_minute
+    WHERE minute < ? GROUP BY 1, 2
+    ON CONFLICT (hour, severity) DO UPDATE SET count = count + excluded.count
+'''
+
+PRUNE_MINUTES_SQL = '''
+    DELETE FROM alert_rollup_minute WHERE minute < ?
+'''
+
+PURGE_ALERTS_SQL = '''
+    DELETE FROM alerts WHERE id IN (
+        SELECT id FROM alerts WHERE created_at < datetime('now', ?) ORDER BY created_at LIMIT ?
+    )
+'''
+
+# Statements in a batch are grouped and executed in this order, so rows a
+# later statement refers to are always written first.
+WRITE_ORDER = [
+    INSERT_ALERT_SQL,
+    REPEAT_ALERT_SQL,
+    ROLLUP_SQL,
+    ROLLUP_MINUTE_SQL,
+    DOWNSAMPLE_MINUTES_SQL,
+    PRUNE_MINUTES_SQL,
+    PURGE_ALERTS_SQL,
+    ENQUEUE_OUTBOUND_SQL,
+    RESCHEDULE_OUTBOUND_SQL,
+    DEAD_LETTER_SQL,
+    DELETE_OUTBOUND_SQL
+]
+
+class WriteTicket:
+    """A unit of work for AlertWriter; ``done`` is set once it is committed"""
+    
+    __slots__ = ('ops', 'done', 'error')
+    
+    def __init__(self, ops):
+        self.ops = ops
+        self.done = threading.Event()
+        self.error = None
+    
+    def wait(self, timeout=None):
+        """Return True once committed; raise if the batch failed"""
+        if not self.done.wait(timeout):
+            return False
+        if self.error:
+            raise self.error
+        return True
+
+class AlertWriter:
+    """Single writer thread for the alert database.
+    
+    Request handlers submit (sql, rows) operations and return; the writer
+    drains the queue into batches of up to WRITE_BATCH_SIZE rows or
+    WRITE_BATCH_MS milliseconds, runs each statement once with executemany
+    and commits the whole batch in one transaction. With WAL and
+    synchronous=FULL a commit is one sequential WAL append plus one fsync,
+    paid once per batch rather than per alert, so a batch whose ticket has
+    been acknowledged survives a crash or power loss. There is never more
+    than one connection contending for the write lock.
+    """
+    
+    def __init__(self, db_path, batch_size=WRITE_BATCH_SIZE, batch_ms=WRITE_BATCH_MS,
+                 queue_size=WRITE_QUEUE_SIZE):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.batch_seconds = batch_ms / 1000.0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._stopping = False
+        self.batches_written = 0
+        self.rows_written = 0
+    
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='alert-writer', daemon=True)
+            self._thread.start()
+        return self
+    
+    def submit(self, ops, timeout=1.0):
+        """Queue a list of (sql, rows) operations; raises queue.Full under backpressure"""
+        ticket = WriteTicket(ops)
+        self._queue.put(ticket, timeout=timeout)
+        return ticket
+    
+    def stop(self, timeout=10):
+        """Flush everything queued so far and stop the writer thread"""
+        if self._thread is None:
+            return
+        self._stopping = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+    
+    @property
+    def queue_depth(self):
+        return self._queue.qsize()
+    
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        # FULL fsyncs the WAL on every commit: acknowledged alerts are durable.
+        # Group commit keeps that to one fsync per batch.
+        conn.execute('PRAGMA synchronous=FULL')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        return conn
+    
+    def _collect(self, first):
+        """Gather tickets until the batch is full or its time window closes.
         
+        Everything already queued is taken without waiting, so tickets that
+        arrived during the previous commit share the next one. The writer
+        then lingers up to WRITE_BATCH_MS for more rows before committing.
+        """
+        batch = [first]
+        rows = sum(len(r) for _, r in first.ops)
+        deadline = time.monotonic() + self.batch_seconds
+        while rows < self.batch_size:
+            try:
+                ticket = self._queue.get_nowait()
+            except queue.Empty:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    ticket = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if ticket is None:
+                self._stopping = True
+                break
+            batch.append(ticket)
+            rows += sum(len(r) for _, r in ticket.ops)
+        return batch, rows
+    
+    def _write(self, conn, batch):
+        grouped = {}
+        for ticket in batch:
+            for sql, rows in ticket.ops:
+                grouped.setdefault(sql, []).extend(rows)
+        
+        order = {sql: i for i, sql in enumerate(WRITE_ORDER)}
+        with conn:
+            for sql in sorted(grouped, key=lambda s: order.get(s, len(order))):
+                conn.executemany(sql, grouped[sql])
+    
+    def _run(self):
+        conn = self._connect()
+        try:
+            while True:
+                first = self._queue.get()
+                if first is None:
+                    if self._queue.empty():
+                        return
+                    self._stopping = True
+                    continue
+                
+                batch, rows = self._collect(first)
+                try:
+                    self._write(conn, batch)
+                    self.batches_written += 1
+                    self.rows_written += rows
+                except Exception as e:
+                    logger.error(f"Failed to write batch of {len(batch)} tickets: {e}")
+                    for ticket in batch:
+                        ticket.error = e
+                finally:
+                    for ticket in batch:
+                        ticket.done.set()
+                
+                if self._stopping and self._queue.empty():
+                    return
+        finally:
+            conn.close()
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def get_alert_writer():
+    """Return the process-wide AlertWriter, starting it on first use"""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                init_database()
+                _writer = AlertWriter(DATABASE_PATH).start()
+                RetentionJob(_writer).start()
+    return _writer
+
+class RetentionJob:
+    """Periodic compaction, run through the writer so it never contends
+    with ingest for the write lock.
+    
+    Each pass folds old minute buckets into hourly ones and deletes raw
+    alerts past ALERT_RETENTION_DAYS in chunks of COMPACTION_CHUNK rows, one
+    writer batch per chunk, so ingest is never blocked for long. Deleted
+    alerts remain counted in the rollups.
+    """
+    
+    def __init__(self, writer, interval=COMPACTION_INTERVAL, retention_days=ALERT_RETENTION_DAYS,
+                 minute_retention_hours=ROLLUP_MINUTE_RETENTION_HOURS, chunk=COMPACTION_CHUNK):
+        self.writer = writer
+        self.interval = interval
+        self.retention_days = retention_days
+        self.minute_retention_hours = minute_retention_hours
+        self.chunk = chunk
+    
+    def start(self):
+        threading.Thread(target=self._run, name='alert-retention', daemon=True).start()
+        return self
+    
+    def _run(self):
+        while True:
+            try:
+                self.compact()
+            except Exception as e:
+                logger.error(f"Alert compaction failed: {e}")
+            time.sleep(self.interval)
+    
+    def compact(self):
+        cutoff_minute = int(time.time() // 60) - self.minute_retention_hours * 60
+        # Align to an hour so a partially folded hour is never split
+        cutoff_minute -= cutoff_minute % 60
+        self.writer.submit([
+            (DOWNSAMPLE_MINUTES_SQL, [(cutoff_minute,)]),
+            (PRUNE_MINUTES_SQL, [(cutoff_minute,)])
+        ], timeout=30).wait(60)
+        
+        if self.retention_days <= 0:
+            return
+        
+        age = f'-{self.retention_days} days'
+        while self._has_expired(age):
+            self.writer.submit([(PURGE_ALERTS_SQL, [(age, self.chunk)])], timeout=30).wait(60)
+    
+    def _has_expired(self, age):
         with get_db_connection() as conn:
-            for alert in alerts:
-                labels = alert.get('labels', {})
-                annotations = alert.get('annotations', {})
+            return conn.execute(
+                "SELECT 1 FROM alerts WHERE created_at < datetime('now', ?) LIMIT 1", (age,)
+            ).fetchone() is not None
+
+def alert_rows(alert_data, group_key):
+    """Build INSERT parameters for every alert in an Alertmanager payload"""
+    rows = []
+    timestamp = datetime.utcnow().isoformat()
+    for alert in alert_data.get('alerts', []):
+        labels = alert.get('labels', {})
+        annotations = alert.get('annotations', {})
+        rows.append((
+            timestamp,
+            group_key,
+            alert.get('status'),
+            labels.get('alertname'),
+            labels.get('instance'),
+            labels.get('severity'),
+            annotations.get('summary'),
+            annotations.get('description'),
+            json.dumps(labels),
+            json.dumps(annotations),
+            json.dumps(alert),
+            alert_fingerprint(alert),
+            alert.get('endsAt')
+        ))
+    return rows
+
+def alert_fingerprint(alert):
+    """Alertmanager's fingerprint, or a hash of the labels when it is absent"""
+    fingerprint = alert.get('fingerprint')
+    if fingerprint:
+        return fingerprint
+    labels = json.dumps(alert.get('labels', {}), sort_keys=True)
+    return hashlib.sha1(labels.encode()).hexdigest()[:16]
+
+class AlertDeduplicator:
+    """Separates state transitions from repeated notifications.
+    
+    Alertmanager re-sends every firing group each repeat_interval, and
+    each resend carries the same (fingerprint, status, endsAt) as before.
+    The last stored state per fingerprint is kept in an LRU of ``max_keys``
+    entries; on a miss it is read from the latest alerts row for that
+    fingerprint, so the decision survives restarts and cache evictions.
+    
+    Decisions are recorded in the cache immediately so concurrent requests
+    agree. If the write then fails, ``forget`` drops them again so the
+    retried notification is treated as new. Separate worker processes each
+    keep their own cache, so a race between them can store one extra row.
+    """
+    
+    def __init__(self, max_keys=DEDUP_CACHE_SIZE):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        # fingerprint -> (status, ends_at)
+        self._states = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.duplicates = 0
+    
+    def _load(self, fingerprints):
+        placeholders = ', '.join('?' * len(fingerprints))
+        with get_db_connection() as conn:
+            rows = conn.execute(f'''
+                SELECT fingerprint, status, ends_at FROM alerts WHERE id IN (
+                    SELECT MAX(id) FROM alerts WHERE fingerprint IN ({placeholders})
+                    GROUP BY fingerprint
+                )
+            ''', list(fingerprints)).fetchall()
+        return {row['fingerprint']: (row['status'], row['ends_at']) for row in rows}
+    
+    def split(self, alerts):
+        """Return (new_alerts, repeats) where repeats maps fingerprint -> count"""
+        keyed = [(alert_fingerprint(alert), (alert.get('status'), alert.get('endsAt')), alert)
+                 for alert in alerts]
+        
+        with self._lock:
+            missing = {fp for fp, _, _ in keyed if fp not in self._states}
+        stored = self._load(missing) if missing else {}
+        
+        new_alerts = []
+        repeats = Counter()
+        with self._lock:
+            for fingerprint, state, alert in keyed:
+                known = self._states.get(fingerprint)
+                if known is None:
+                    self.cache_misses += 1
+                    known = stored.get(fingerprint)
+                else:
+                    self.cache_hits += 1
+                    self._states.move_to_end(fingerprint)
                 
-                conn.execute('''
-                    INSERT INTO alerts (
-                        timestamp, group_key, status, alert_name, instance, 
-                        severity, summary, description, labels, annotations, raw_data
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    datetime.utcnow().isoformat(),
-                    group_key,
-                    alert.get('status'),
-                    labels.get('alertname'),
-                    labels.get('instance'),
-                    labels.get('severity'),
-                    annotations.get('summary'),
-                    annotations.get('description'),
-                    json.dumps(labels),
-                    json.dumps(annotations),
-                    json.dumps(alert)
-                ))
-            
-            conn.commit()
-            logger.info(f"Stored {len(alerts)} alerts to database")
-            
-    except Exception as e:
-        logger.error(f"Failed to store alerts: {e}")
+                if known == state:
+                    repeats[fingerprint] += 1
+                    self.duplicates += 1
+                else:
+                    new_alerts.append(alert)
+                
+                self._states[fingerprint] = state
+                self._states.move_to_end(fingerprint)
+                if len(self._states) > self.max_keys:
+                    self._states.popitem(last=False)
+        
+        return new_alerts, repeats
+    
+    def forget(self, alerts):
+        """Drop cached states after a failed write"""
+        with self._lock:
+            for alert in alerts:
+                self._states.pop(alert_fingerprint(alert), None)
 
-def forward_to_webhooks(data):
-    """Forward alert data to configured webhook endpoints"""
-    if not WEBHOOK_ENDPOINTS:
-        return
+_deduplicator = AlertDeduplicator()
+
+def rollup_rows(rows):
+    """Aggregate alert rows into ROLLUP_SQL and ROLLUP_MINUTE_SQL parameters"""
+    totals = Counter()
+    minutes = Counter()
+    minute = int(time.time() // 60)
+    for row in rows:
+        status, alert_name, severity = row[2], row[3], row[5]
+        totals['total', 'total'] += 1
+        totals['status', status or ROLLUP_NONE] += 1
+        totals['severity', severity or ROLLUP_NONE] += 1
+        totals['alert_name', alert_name or ROLLUP_NONE] += 1
+        minutes[minute, severity or ROLLUP_NONE] += 1
+    return (
+        [(dimension, value, count) for (dimension, value), count in totals.items()],
+        [(bucket, severity, count) for (bucket, severity), count in minutes.items()]
+    )
+
+def store_alert(alert_data, group_key, repeats=None, forward=None):
+    """Queue alerts, their rollup increments and repeat counts (fingerprint
+    -> count) for the writer thread and return the WriteTicket.
+    
+    ``forward`` (processed alert data) is queued for the webhook endpoints
+    in the same ticket, so the alerts and their outbound rows commit in one
+    transaction: a crash cannot store an alert that is never forwarded.
+    """
+    rows = alert_rows(alert_data, group_key)
+    totals, minutes = rollup_rows(rows)
+    ops = [
+        (INSERT_ALERT_SQL, rows),
+        (ROLLUP_SQL, totals),
+        (ROLLUP_MINUTE_SQL, minutes),
+        (REPEAT_ALERT_SQL, [(count, fingerprint) for fingerprint, count in (repeats or {}).items()])
+    ]
+    forwarder = get_forwarder() if forward is not None else None
+    if forwarder is not None:
+        ops += forwarder.outbound_ops(forward)
+    ticket = get_alert_writer().submit([(sql, params) for sql, params in ops if params])
+    if forwarder is not None:
+        forwarder.notify()
+    return ticket
+
+class CircuitBreaker:
+    """Per-destination breaker: closed -> open after repeated failures,
+    then a single half-open trial delivery decides whether to close again"""
+    
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_seconds=BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+    
+    def allow(self):
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = 'half_open'
+            if self.state == 'half_open' and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+    
+    def blocked(self):
+        """True while allow() would refuse; unlike allow(), takes no trial slot"""
+        with self._lock:
+            if self.state == 'open':
+                return time.monotonic() - self.opened_at < self.reset_seconds
+            return self.state == 'half_open' and self._trial_in_flight
+    
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+            self._trial_in_flight = False
+    
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+class PermanentDeliveryError(Exception):
+    """The destination rejected the payload; retrying will not help"""
+
+class WebhookForwarder:
+    """Delivers queued payloads from the outbound table.
+    
+    A dispatcher thread picks due rows and hands them to a bounded pool of
+    FORWARD_WORKERS threads. Each destination has its own requests.Session
+    (keep-alive connection pool) and circuit breaker; rows for an open
+    breaker simply stay queued. Failures are retried with exponential
+    backoff and jitter up to FORWARD_MAX_ATTEMPTS, then moved to
+    outbound_dead. All queue updates go through the AlertWriter.
+    """
+    
+    def __init__(self, writer, destinations, workers=FORWARD_WORKERS):
+        self.writer = writer
+        self.destinations = list(destinations)
+        self.workers = workers
+        self.sessions = {}
+        self.breakers = {}
+        for url in self.destinations:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers, max_retries=0)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers['Content-Type'] = 'application/json'
+            self.sessions[url] = session
+            self.breakers[url] = CircuitBreaker()
+        
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='forwarder')
+        self._in_flight = set()
+        self._in_flight_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread = None
+        self.delivered = 0
+        self.failed = 0
+    
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._dispatch_loop, name='forward-dispatcher', daemon=True)
+            self._thread.start()
+        return self
+    
+    def stop(self):
+        self._stopping = True
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        self._executor.shutdown(wait=True)
+        for session in self.sessions.values():
+            session.close()
+    
+    def outbound_ops(self, data):
+        """Writer operations that queue ``data`` for every destination"""
+        payload = json.dumps(data)
+        now = time.time()
+        return [(ENQUEUE_OUTBOUND_SQL, [(url, payload, now) for url in self.destinations])]
+    
+    def notify(self):
+        """Wake the dispatcher after outbound rows were submitted"""
+        self._wake.set()
+    
+    def enqueue(self, data):
+        """Durably queue ``data`` for every destination; returns the WriteTicket"""
+        ticket = self.writer.submit(self.outbound_ops(data))
+        self.notify()
+        return ticket
+    
+    def pending(self):
+        with get_db_connection() as conn:
+            return conn.execute('SELECT COUNT(*) FROM outbound').fetchone()[0]
+    
+    def breaker_states(self):
+        return {url: breaker.state for url, breaker in self.breakers.items()}
     
-    def send_webhook(url):
+    def _dispatch_loop(self):
+        # Keep at most two rows per worker queued in the pool
+        max_in_flight = self.workers * 2
+        conn = sqlite3.connect(DATABASE_PATH, timeout=10)
         try:
-            response = requests.post(
-                url,
-                json=data,
-                headers={'Content-Type': 'application/json'},
-                timeout=10
-            )
-            response.raise_for_status()
-            logger.info(f"Successfully forwarded alert to {url}")
+            while not self._stopping:
+                self._wake.wait(FORWARD_POLL_SECONDS)
+                self._wake.clear()
+                
+                with self._in_flight_lock:
+                    capacity = max_in_flight - len(self._in_flight)
+                if capacity <= 0:
+                    continue
+                
+                # Leave rows of open breakers out of the query: skipped rows
+                # would otherwise stay at the head of the queue and fill every
+                # batch, starving the healthy destinations
+                deliverable = [url for url, breaker in self.breakers.items() if not breaker.blocked()]
+                if not deliverable:
+                    continue
+                placeholders = ','.join('?' * len(deliverable))
+                rows = conn.execute(f'''
+                    SELECT id, destination, payload, attempts FROM outbound
+                    WHERE next_attempt_at <= ? AND destination IN ({placeholders})
+                    ORDER BY next_attempt_at LIMIT ?
+                ''', (time.time(), *deliverable, max_in_flight * 4)).fetchall()
+                
+                for row_id, destination, payload, attempts in rows:
+                    if capacity <= 0:
+                        break
+                    with self._in_flight_lock:
+                        if row_id in self._in_flight:
+                            continue
+                    breaker = self.breakers.get(destination)
+                    if breaker is None or not breaker.allow():
+                        continue
+                    with self._in_flight_lock:
+                        self._in_flight.add(row_id)
+                    capacity -= 1
+                    self._executor.submit(self._deliver, row_id, destination, payload, attempts)
         except Exception as e:
-            logger.error(f"Failed to forward alert to {url}: {e}")
+            logger.error(f"Forward dispatcher stopped: {e}")
+        finally:
+            conn.close()
     
-    # Send webhooks in parallel
-    threads = []
-    for url in WEBHOOK_ENDPOINTS:
-        thread = threading.Thread(target=send_webhook, args=(url,))
-        thread.start()
-        threads.append(thread)
+    def _backoff(self, attempts):
+        """Equal jitter: half the exponential delay plus a random half"""
+        delay = min(FORWARD_BACKOFF_MAX, FORWARD_BACKOFF_BASE * (2 ** attempts))
+        return delay / 2 + random.uniform(0, delay / 2)
     
-    # Wait for all threads to complete (with timeout)
-    for thread in threads:
-        thread.join(timeout=15)
+    def _deliver(self, row_id, destination, payload, attempts):
+        breaker = self.breakers[destination]
+        try:
+            try:
+                response = self.sessions[destination].post(destination, data=payload, timeout=FORWARD_TIMEOUT)
+                if 400 <= response.status_code < 500 and response.status_code not in (408, 429):
+                    raise PermanentDeliveryError(f"HTTP {response.status_code}")
+                response.raise_for_status()
+            except PermanentDeliveryError as e:
+                # The destination is up, it just refuses this payload
+                breaker.record_success()
+                self.failed += 1
+                logger.error(f"Forward to {destination} rejected, dead-lettering: {e}")
+                ops = [(DEAD_LETTER_SQL, [(attempts + 1, str(e), row_id)]), (DELETE_OUTBOUND_SQL, [(row_id,)])]
+            except Exception as e:
+                breaker.record_failure()
+                attempts += 1
+                if attempts >= FORWARD_MAX_ATTEMPTS:
+                    self.failed += 1
+                    logger.error(f"Giving up forwarding to {destination} after {attempts} attempts: {e}")
+                    ops = [(DEAD_LETTER_SQL, [(attempts, str(e), row_id)]), (DELETE_OUTBOUND_SQL, [(row_id,)])]
+                else:
+                    logger.warning(f"Forward to {destination} failed (attempt {attempts}): {e}")
+                    ops = [(RESCHEDULE_OUTBOUND_SQL, [(attempts, time.time() + self._backoff(attempts), str(e), row_id)])]
+            else:
+                breaker.record_success()
+                self.delivered += 1
+                ops = [(DELETE_OUTBOUND_SQL, [(row_id,)])]
+            
+            # Keep the row marked in flight until its new state is committed,
+            # otherwise the dispatcher could pick it up again and resend it.
+            self.writer.submit(ops, timeout=WRITE_ACK_TIMEOUT).wait(WRITE_ACK_TIMEOUT)
+        except Exception as e:
+            logger.error(f"Failed to record delivery state for outbound row {row_id}: {e}")
+        finally:
+            with self._in_flight_lock:
+                self._in_flight.discard(row_id)
+
+_forwarder = None
+
+def get_forwarder():
+    """Return the process-wide WebhookForwarder, or None without destinations"""
+    global _forwarder
+    if not WEBHOOK_ENDPOINTS:
+        return None
+    if _forwarder is None:
+        writer = get_alert_writer()
+        with _writer_lock:
+            if _forwarder is None:
+                _forwarder = WebhookForwarder(writer, WEBHOOK_ENDPOINTS).start()
+    return _forwarder
+
+def forward_to_webhooks(data):
+    """Queue alert data for delivery to the configured webhook endpoints"""
+    forwarder = get_forwarder()
+    if forwarder is None:
+        return None
+    return forwarder.enqueue(data)
 
 def process_alert_data(data):
     """Process and transform alert data"""
@@ -180,16 +1010,36 @@ def health():
     """Health check endpoint"""
     try:
         with get_db_connection() as conn:
-            cursor = conn.execute('SELECT COUNT(*) as count FROM alerts')
-            alert_count = cursor.fetchone()['count']
+            row = conn.execute(
+                "SELECT count FROM alert_rollup WHERE dimension = 'total' AND value = 'total'"
+            ).fetchone()
+            alert_count = row['count'] if row else 0
         
         return jsonify({
             'status': 'healthy',
             'timestamp': datetime.utcnow().isoformat(),
             'database_path': DATABASE_PATH,
             'total_alerts': alert_count,
+            'writer': {
+                'queue_depth': get_alert_writer().queue_depth,
+                'batches_written': get_alert_writer().batches_written,
+                'rows_written': get_alert_writer().rows_written,
+                'ack_mode': WRITE_ACK_MODE
+            },
+            'dedup': {
+                'enabled': ALERT_DEDUP,
+                'duplicates': _deduplicator.duplicates,
+                'cache_hits': _deduplicator.cache_hits,
+                'cache_misses': _deduplicator.cache_misses
+            },
             'webhook_endpoints': len(WEBHOOK_ENDPOINTS),
-            'configured_endpoints': WEBHOOK_ENDPOINTS
+            'configured_endpoints': WEBHOOK_ENDPOINTS,
+            'forwarding': {
+                'pending': get_forwarder().pending(),
+                'delivered': get_forwarder().delivered,
+                'failed': get_forwarder().failed,
+                'circuit_breakers': get_forwarder().breaker_states()
+            } if WEBHOOK_ENDPOINTS else None
         })
     except Exception as e:
         return jsonify({
@@ -207,21 +1057,40 @@ def webhook():
         if not data:
             return jsonify({'error': 'No JSON data provided'}), 400
         
-        logger.info(f"Received webhook with {len(data.get('alerts', []))} alerts")
+        alerts = data.get('alerts', [])
+        logger.info(f"Received webhook with {len(alerts)} alerts")
+        
+        # Only state transitions are stored and forwarded; repeats of an
+        # unchanged alert just bump the stored row's repeat counter
+        repeats = {}
+        if ALERT_DEDUP:
+            get_alert_writer()  # creates the schema the lookup reads on first use
+            new_alerts, repeats = _deduplicator.split(alerts)
+            data = dict(data, alerts=new_alerts)
         
         # Process alert data
         processed_data = process_alert_data(data)
         
-        # Store alerts in database
-        store_alert(data, processed_data['group_key'])
-        
-        # Forward to other webhooks
-        forward_to_webhooks(processed_data)
+        # Store alerts and queue them for forwarding in one transaction;
+        # delivery to the other webhooks happens in the background and
+        # never delays this response.
+        try:
+            forward = processed_data if processed_data['alerts'] else None
+            ticket = store_alert(data, processed_data['group_key'], repeats, forward)
+            if WRITE_ACK_MODE == 'commit' and not ticket.wait(WRITE_ACK_TIMEOUT):
+                raise TimeoutError('alert batch not committed in time')
+        except (queue.Full, TimeoutError, sqlite3.Error) as e:
+            # A non-2xx response makes Alertmanager retry the notification
+            logger.error(f"Failed to store alerts: {e}")
+            _deduplicator.forget(data['alerts'])
+            return jsonify({'error': 'Alert store unavailable', 'details': str(e)}), 503
         
         return jsonify({
             'message': 'Webhook processed successfully',
             'group_key': processed_data['group_key'],
-            'alert_count': processed_data['alert_count'],
+            'alert_count': len(alerts),
+            'new_count': processed_data['alert_count'],
+            'duplicate_count': sum(repeats.values()),
             'firing_count': processed_data['firing_count'],
             'resolved_count': processed_data['resolved_count'],
             'processed_at': processed_data['processed_at']
@@ -231,59 +1100,147 @@ def webhook():
         logger.error(f"Error processing webhook: {e}")
         return jsonify({'error': 'Internal server error', 'details': str(e)}), 500
 
+# Columns returned by /alerts; raw_data is only read when asked for
+ALERT_LIST_COLUMNS = [
+    'id', 'timestamp', 'group_key', 'status', 'alert_name', 'instance', 'severity',
+    'summary', 'description', 'labels', 'annotations', 'created_at',
+    'fingerprint', 'ends_at', 'repeat_count', 'last_seen_at'
+]
+JSON_COLUMNS = ('labels', 'annotations', 'raw_data')
+
+def encode_cursor(created_at, alert_id):
+    return base64.urlsafe_b64encode(json.dumps([created_at, alert_id]).encode()).decode()
+
+def decode_cursor(cursor):
+    created_at, alert_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return str(created_at), int(alert_id)
+
+def fts_phrase(text):
+    """Quote user input as FTS5 prefix phrases so operators are not interpreted"""
+    terms = [t for t in text.split() if t]
+    return ' '.join('"' + t.replace('"', '""') + '"*' for t in terms)
+
+def query_alerts(status=None, severity=None, alert_name=None, text=None, since_hours=None,
+                 cursor=None, limit=100, include=()):
+    """Return (alerts, next_cursor) newest first.
+    
+    Pagination is keyset-based: the cursor is the (created_at, id) of the
+    last row returned, so every page is an index range scan whatever its
+    depth. alert_name and text search go through the FTS5 index (prefix
+    match per word) when it exists.
+    """
+    # Blank search terms are no filter (and an empty FTS5 group is a syntax error)
+    alert_name = alert_name.strip() if alert_name else None
+    text = text.strip() if text else None
+    
+    columns = ALERT_LIST_COLUMNS + [c for c in include if c == 'raw_data']
+    query = f"SELECT {', '.join('a.' + c for c in columns)} FROM alerts a"
+    where = []
+    params = []
+    
+    match = []
+    if alert_name:
+        match.append(f"alert_name : ({fts_phrase(alert_name)})")
+    if text:
+        match.append(f"({fts_phrase(text)})")
+    if match and fts_available():
+        # An IN subquery runs the match once; a JOIN re-evaluates it per row
+        # walked along the (created_at, id) index
+        where.append('a.id IN (SELECT rowid FROM alerts_fts WHERE alerts_fts MATCH ?)')
+        params.append(' AND '.join(match))
+    else:
+        if alert_name:
+            where.append('a.alert_name LIKE ?')
+            params.append(f'%{alert_name}%')
+        if text:
+            where.append('(a.alert_name LIKE ? OR a.summary LIKE ? OR a.description LIKE ?)')
+            params.extend([f'%{text}%'] * 3)
+    
+    if status:
+        where.append('a.status = ?')
+        params.append(status)
+    
+    if severity:
+        where.append('a.severity = ?')
+        params.append(severity)
+    
+    if since_hours:
+        where.append("a.created_at > datetime('now', ?)")
+        params.append(f'-{int(since_hours)} hours')
+    
+    if cursor:
+        created_at, alert_id = decode_cursor(cursor)
+        where.append('(a.created_at, a.id) < (?, ?)')
+        params.extend([created_at, alert_id])
+    
+    if where:
+        query += ' WHERE ' + ' AND '.join(where)
+    
+    # Fetch one extra row to know whether another page exists
+    query += ' ORDER BY a.created_at DESC, a.id DESC LIMIT ?'
+    params.append(limit + 1)
+    
+    with get_db_connection() as conn:
+        rows = conn.execute(query, params).fetchall()
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]['created_at'], rows[-1]['id'])
+    
+    alerts = []
+    for row in rows:
+        alert = dict(row)
+        for column in JSON_COLUMNS:
+            if column in alert:
+                alert[column] = json.loads(alert[column]) if alert[column] else {}
+        alerts.append(alert)
+    
+    return alerts, next_cursor
+
 @app.route('/alerts', methods=['GET'])
 def get_alerts():
-    """Get stored alerts with filtering and pagination"""
+    """Get stored alerts with filtering and keyset pagination
+    
+    Query parameters: status, severity, alert_name, q (full-text over name,
+    summary and description), since_hours, limit, cursor (the next_cursor
+    of the previous page) and include=raw_data to return the full payload.
+    """
     try:
         # Query parameters
-        limit = min(int(request.args.get('limit', 100)), 1000)
-        offset = int(request.args.get('offset', 0))
+        limit = max(1, min(int(request.args.get('limit', 100)), 1000))
         status = request.args.get('status')
         severity = request.args.get('severity')
         alert_name = request.args.get('alert_name')
+        text = request.args.get('q')
         since_hours = request.args.get('since_hours', type=int)
+        cursor = request.args.get('cursor')
+        include = [f.strip() for f in request.args.get('include', '').split(',') if f.strip()]
         
-        # Build query
-        query = 'SELECT * FROM alerts WHERE 1=1'
-        params = []
-        
-        if status:
-            query += ' AND status = ?'
-            params.append(status)
-        
-        if severity:
-            query += ' AND severity = ?'
-            params.append(severity)
-        
-        if alert_name:
-            query += ' AND alert_name LIKE ?'
-            params.append(f'%{alert_name}%')
-        
-        if since_hours:
-            query += ' AND created_at > datetime("now", "-{} hours")'.format(since_hours)
-        
-        query += ' ORDER BY created_at DESC LIMIT ? OFFSET ?'
-        params.extend([limit, offset])
-        
-        with get_db_connection() as conn:
-            cursor = conn.execute(query, params)
-            alerts = [dict(row) for row in cursor.fetchall()]
-            
-            # Parse JSON fields
-            for alert in alerts:
-                alert['labels'] = json.loads(alert['labels']) if alert['labels'] else {}
-                alert['annotations'] = json.loads(alert['annotations']) if alert['annotations'] else {}
-                alert['raw_data'] = json.loads(alert['raw_data']) if alert['raw_data'] else {}
+        try:
+            alerts, next_cursor = query_alerts(
+                status=status,
+                severity=severity,
+                alert_name=alert_name,
+                text=text,
+                since_hours=since_hours,
+                cursor=cursor,
+                limit=limit,
+                include=include
+            )
+        except (ValueError, TypeError) as e:
+            return jsonify({'error': 'Invalid cursor', 'details': str(e)}), 400
         
         return jsonify({
             'alerts': alerts,
             'count': len(alerts),
             'limit': limit,
-            'offset': offset,
+            'next_cursor': next_cursor,
             'filters': {
                 'status': status,
                 'severity': severity,
                 'alert_name': alert_name,
+                'q': text,
                 'since_hours': since_hours
             }
         })
@@ -292,52 +1249,77 @@ def get_alerts():
         logger.error(f"Error getting alerts: {e}")
         return jsonify({'error': 'Internal server error', 'details': str(e)}), 500
 
+# Alerts per severity since a unix minute. Every alert is counted in exactly
+# one bucket table: compaction moves whole hours from the minute table to
+# the hour table, so the two never overlap.
+RECENT_BY_SEVERITY_SQL = '''
+    SELECT severity, SUM(count) as count FROM (
+        SELECT severity, count FROM alert_rollup_minute WHERE minute >= ?
+        UNION ALL
+        SELECT severity, count FROM alert_rollup_hour WHERE hour >= ? / 60
+    )
+    GROUP BY severity
+'''
+
+def recent_by_severity(conn, since_minute):
+    """{severity: count} since a unix minute, from the minute and hour rollups.
+    
+    Hourly buckets count whole hours, so a window reaching past the minute
+    retention starts at the hour containing ``since_minute``.
+    """
+    rows = conn.execute(RECENT_BY_SEVERITY_SQL, (since_minute, since_minute)).fetchall()
+    return {row['severity']: row['count'] for row in rows}
+
 @app.route('/alerts/stats', methods=['GET'])
 def get_alert_stats():
-    """Get alert statistics"""
+    """Get alert statistics
+    
+    Served from the rollup tables maintained on ingest, so the cost does not
+    grow with the alerts table. Totals include alerts already removed by
+    the retention job. since_hours adds counts for a longer window, read
+    from the hourly rollups once it reaches past ROLLUP_MINUTE_RETENTION_HOURS.
+    """
     try:
+        since_hours = request.args.get('since_hours', type=int)
+        if since_hours is not None and since_hours <= 0:
+            return jsonify({'error': 'since_hours must be positive'}), 400
+        
+        now_minute = int(time.time() // 60)
         with get_db_connection() as conn:
-            # Total alerts
-            total = conn.execute('SELECT COUNT(*) as count FROM alerts').fetchone()['count']
-            
-            # Alerts by status
-            status_stats = conn.execute('''
-                SELECT status, COUNT(*) as count 
-                FROM alerts 
-                GROUP BY status
+            totals = conn.execute('''
+                SELECT dimension, value, count FROM alert_rollup
+                WHERE dimension IN ('total', 'status', 'severity')
             ''').fetchall()
             
-            # Alerts by severity
-            severity_stats = conn.execute('''
-                SELECT severity, COUNT(*) as count 
-                FROM alerts 
-                GROUP BY severity
-            ''').fetchall()
-            
-            # Recent alerts (last 24 hours)
-            recent = conn.execute('''
-                SELECT COUNT(*) as count 
-                FROM alerts 
-                WHERE created_at > datetime("now", "-24 hours")
-            ''').fetchone()['count']
+            # Recent alerts (last 24 hours): at most 1440 buckets per severity
+            recent = recent_by_severity(conn, now_minute - 24 * 60)
+            window = recent_by_severity(conn, now_minute - since_hours * 60) if since_hours else None
             
             # Most frequent alerts
             frequent_alerts = conn.execute('''
-                SELECT alert_name, COUNT(*) as count 
-                FROM alerts 
-                GROUP BY alert_name 
-                ORDER BY count DESC 
+                SELECT value as alert_name, count
+                FROM alert_rollup
+                WHERE dimension = 'alert_name'
+                ORDER BY count DESC
                 LIMIT 10
             ''').fetchall()
         
-        return jsonify({
-            'total_alerts': total,
-            'recent_24h': recent,
-            'by_status': {row['status']: row['count'] for row in status_stats},
-            'by_severity': {row['severity']: row['count'] for row in severity_stats},
+        by_dimension = {'total': {}, 'status': {}, 'severity': {}}
+        for row in totals:
+            by_dimension[row['dimension']][row['value']] = row['count']
+        
+        stats = {
+            'total_alerts': by_dimension['total'].get('total', 0),
+            'recent_24h': sum(recent.values()),
+            'recent_24h_by_severity': recent,
+            'by_status': by_dimension['status'],
+            'by_severity': by_dimension['severity'],
             'most_frequent': [dict(row) for row in frequent_alerts],
             'generated_at': datetime.utcnow().isoformat()
-        })
+        }
+        if window is not None:
+            stats.update(since_hours=since_hours, recent=sum(window.values()), recent_by_severity=window)
+        return jsonify(stats)
         
     except Exception as e:
         logger.error(f"Error getting alert stats: {e}")
@@ -386,8 +1368,9 @@ def test_webhook():
     return webhook()
 
 if __name__ == '__main__':
-    # Initialize database
-    init_database()
+    # Initialize database and start the writer and forwarder threads
+    get_alert_writer()
+    get_forwarder()
     
     port = int(os.getenv('PORT', 8083))
     debug = os.getenv('DEBUG', 'false').lower() == 'true'
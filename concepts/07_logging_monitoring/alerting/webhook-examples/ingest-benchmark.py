@@ -0,0 +1,132 @@
+# 07_logging_monitoring/alerting/webhook-examples/ingest-benchmark.py
+# Alert ingest throughput benchmark for generic-webhook.py
+#
+# Compares the old path (one connection, row-by-row INSERT and a commit per
+# webhook) against the batched AlertWriter, with several concurrent
+# "request" threads. Run from this directory:
+#
+#   python ingest-benchmark.py --webhooks 2000 --alerts 5 --threads 8
+
+import argparse
+import importlib.util
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import closing
+from datetime import datetime
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def load_webhook_module():
+    """Import generic-webhook.py (its file name is not a valid module name)"""
+    spec = importlib.util.spec_from_file_location('generic_webhook', os.path.join(HERE, 'generic-webhook.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def make_payload(seq, alerts_per_webhook):
+    return {
+        'groupKey': f'bench-group-{seq % 50}',
+        'alerts': [
+            {
+                'status': 'firing' if i % 3 else 'resolved',
+                'labels': {
+                    'alertname': f'BenchAlert{(seq + i) % 20}',
+                    'instance': f'host-{i}:9100',
+                    'severity': ('critical', 'warning', 'info')[i % 3],
+                    'job': 'bench'
+                },
+                'annotations': {
+                    'summary': f'Benchmark alert {seq}-{i}',
+                    'description': 'Synthetic alert generated by ingest-benchmark.py'
+                },
+                'startsAt': datetime.utcnow().isoformat() + 'Z',
+                'fingerprint': f'{seq:08x}{i:04x}'
+            }
+            for i in range(alerts_per_webhook)
+        ]
+    }
+
+def run_threads(payloads, threads, handle):
+    """Feed payloads to ``handle`` from ``threads`` workers; return elapsed seconds"""
+    chunks = [payloads[i::threads] for i in range(threads)]
+
+    def worker(chunk):
+        for payload in chunk:
+            handle(payload)
+
+    workers = [threading.Thread(target=worker, args=(chunk,)) for chunk in chunks]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return time.perf_counter() - start
+
+def bench_per_request_commit(module, db_path, payloads, threads):
+    module.DATABASE_PATH = db_path
+    module.init_database()
+    with closing(sqlite3.connect(db_path, isolation_level=None)) as conn:
+        conn.execute('PRAGMA journal_mode=DELETE')
+
+    def handle(payload):
+        rows = module.alert_rows(payload, payload['groupKey'])
+        conn = sqlite3.connect(db_path, timeout=60)
+        try:
+            for row in rows:
+                conn.execute(module.INSERT_ALERT_SQL, row)
+            conn.commit()
+        finally:
+            conn.close()
+
+    return run_threads(payloads, threads, handle)
+
+def bench_writer(module, db_path, payloads, threads, wait_for_commit):
+    module.DATABASE_PATH = db_path
+    module.init_database()
+    writer = module.AlertWriter(db_path).start()
+
+    def handle(payload):
+        ticket = writer.submit([(module.INSERT_ALERT_SQL, module.alert_rows(payload, payload['groupKey']))], timeout=60)
+        if wait_for_commit:
+            ticket.wait()
+
+    start = time.perf_counter()
+    run_threads(payloads, threads, handle)
+    # Count the drain time too, so 'enqueue' mode is not flattered
+    writer.stop(timeout=120)
+    return time.perf_counter() - start
+
+def count_rows(db_path):
+    with closing(sqlite3.connect(db_path)) as conn:
+        return conn.execute('SELECT COUNT(*) FROM alerts').fetchone()[0]
+
+def main():
+    parser = argparse.ArgumentParser(description="Alert ingest throughput benchmark")
+    parser.add_argument("--webhooks", type=int, default=2000, help="Webhook payloads to ingest")
+    parser.add_argument("--alerts", type=int, default=5, help="Alerts per payload")
+    parser.add_argument("--threads", type=int, default=8, help="Concurrent request threads")
+    args = parser.parse_args()
+
+    module = load_webhook_module()
+    payloads = [make_payload(i, args.alerts) for i in range(args.webhooks)]
+    total_alerts = args.webhooks * args.alerts
+
+    scenarios = [
+        ('per-request commit (old)', lambda db: bench_per_request_commit(module, db, payloads, args.threads)),
+        ('batched writer, ack on commit', lambda db: bench_writer(module, db, payloads, args.threads, True)),
+        ('batched writer, ack on enqueue', lambda db: bench_writer(module, db, payloads, args.threads, False)),
+    ]
+
+    print(f"Ingesting {total_alerts} alerts ({args.webhooks} webhooks x {args.alerts}) with {args.threads} threads")
+    print(f"{'scenario':<34} {'seconds':>9} {'alerts/s':>11} {'rows':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for i, (name, run) in enumerate(scenarios):
+            db_path = os.path.join(tmp, f'bench-{i}.db')
+            elapsed = run(db_path)
+            print(f"{name:<34} {elapsed:>9.2f} {total_alerts / elapsed:>11.0f} {count_rows(db_path):>8}")
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,18 @@
 # 07_logging_monitoring/alerting/webhook-examples/pagerduty-webhook.py
 
-import json
-import requests
+import asyncio
+import aiohttp
+from concurrent.futures import Future
 from flask import Flask, request, jsonify
 from datetime import datetime
 import os
 import logging
 import hashlib
+import random
+import threading
+import time
+
+from rate_limit import TokenBucket, parse_retry_after
 
 app = Flask(__name__)
 
@@ -16,7 +22,20 @@ logger = logging.getLogger(__name__)
 
 # PagerDuty configuration
 PAGERDUTY_INTEGRATION_KEY = os.getenv('PAGERDUTY_INTEGRATION_KEY', 'your-integration-key-here')
-PAGERDUTY_API_URL = 'https://events.pagerduty.com/v2/enqueue'
+# Point at stub-server.py to test without a PagerDuty account
+PAGERDUTY_API_URL = os.getenv('PAGERDUTY_API_URL', 'https://events.pagerduty.com/v2/enqueue')
+
+# Outbound dispatcher tuning
+PAGERDUTY_CONCURRENCY = int(os.getenv('PAGERDUTY_CONCURRENCY', '8'))
+PAGERDUTY_TIMEOUT = float(os.getenv('PAGERDUTY_TIMEOUT', '10'))
+PAGERDUTY_MAX_ATTEMPTS = int(os.getenv('PAGERDUTY_MAX_ATTEMPTS', '4'))
+# Events for the same dedup_key within this window are sent once (latest wins)
+PAGERDUTY_COALESCE_MS = int(os.getenv('PAGERDUTY_COALESCE_MS', '250'))
+# PagerDuty throttles the Events API per integration key (about 120/min)
+PAGERDUTY_RATE_PER_MINUTE = float(os.getenv('PAGERDUTY_RATE_PER_MINUTE', '120'))
+PAGERDUTY_BURST = int(os.getenv('PAGERDUTY_BURST', '20'))
+# How long /webhook waits for delivery results before answering
+PAGERDUTY_ACK_TIMEOUT = float(os.getenv('PAGERDUTY_ACK_TIMEOUT', '30'))
 
 def create_dedup_key(alert):
     """Create a deduplication key for PagerDuty"""
@@ -90,27 +109,165 @@ def format_pagerduty_event(alert, event_action='trigger'):
     
     return event
 
+class PagerDutyDispatcher:
+    """Sends Events API v2 events from a background asyncio loop.
+    
+    Flask handlers call ``submit`` from any thread and get a Future with
+    (success, result). Events are held for PAGERDUTY_COALESCE_MS keyed by
+    dedup_key; a later event for the same key replaces the held one, so a
+    trigger immediately followed by a resolve, or a burst of re-triggers,
+    costs a single API call. Events for one key are never in flight twice,
+    which keeps them in order. Up to PAGERDUTY_CONCURRENCY requests share
+    one pooled aiohttp session, gated by a token bucket per routing key;
+    429 and 5xx responses are retried with backoff.
+    """
+    
+    def __init__(self, api_url=PAGERDUTY_API_URL, concurrency=PAGERDUTY_CONCURRENCY,
+                 coalesce_ms=PAGERDUTY_COALESCE_MS, rate_per_minute=PAGERDUTY_RATE_PER_MINUTE,
+                 burst=PAGERDUTY_BURST, max_attempts=PAGERDUTY_MAX_ATTEMPTS, timeout=PAGERDUTY_TIMEOUT):
+        self.api_url = api_url
+        self.concurrency = concurrency
+        self.coalesce_seconds = coalesce_ms / 1000.0
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self._loop = asyncio.new_event_loop()
+        self._thread = None
+        self._queue = None
+        self._session = None
+        self._buckets = {}
+        # dedup_key -> [event, futures]; events waiting out the coalesce window
+        self._held = {}
+        self._in_flight = set()
+        self.sent = 0
+        self.failed = 0
+        self.coalesced = 0
+        self.throttled = 0
+    
+    def start(self):
+        if self._thread is None:
+            ready = threading.Event()
+            self._thread = threading.Thread(target=self._run, args=(ready,),
+                                            name='pagerduty-dispatcher', daemon=True)
+            self._thread.start()
+            ready.wait()
+        return self
+    
+    def _run(self, ready):
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_until_complete(self._setup())
+        finally:
+            ready.set()
+        self._loop.run_forever()
+    
+    async def _setup(self):
+        self._queue = asyncio.Queue()
+        connector = aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=60)
+        self._session = aiohttp.ClientSession(
+            connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout))
+        for i in range(self.concurrency):
+            asyncio.create_task(self._worker())
+    
+    def submit(self, event):
+        """Queue an event; returns a Future resolving to (success, result)"""
+        future = Future()
+        self._loop.call_soon_threadsafe(self._hold, event, future)
+        return future
+    
+    def _hold(self, event, future):
+        key = event.get('dedup_key')
+        held = self._held.get(key)
+        if held is not None:
+            held[0] = event
+            held[1].append(future)
+            self.coalesced += 1
+            return
+        self._held[key] = [event, [future]]
+        self._loop.call_later(self.coalesce_seconds, self._release, key)
+    
+    def _release(self, key):
+        if key in self._in_flight:
+            # Wait for the previous event of this key to finish first
+            self._loop.call_later(self.coalesce_seconds, self._release, key)
+            return
+        event, futures = self._held.pop(key)
+        self._in_flight.add(key)
+        self._queue.put_nowait((key, event, futures))
+    
+    @property
+    def pending(self):
+        return len(self._held) + (self._queue.qsize() if self._queue else 0)
+    
+    def _bucket(self, routing_key):
+        bucket = self._buckets.get(routing_key)
+        if bucket is None:
+            bucket = self._buckets[routing_key] = TokenBucket(self.rate, self.burst)
+        return bucket
+    
+    async def _worker(self):
+        while True:
+            key, event, futures = await self._queue.get()
+            try:
+                outcome = await self._deliver(event)
+            except Exception as e:
+                outcome = (False, str(e))
+            finally:
+                self._in_flight.discard(key)
+            if outcome[0]:
+                self.sent += 1
+            else:
+                self.failed += 1
+            for future in futures:
+                future.set_result(outcome)
+    
+    async def _deliver(self, event):
+        bucket = self._bucket(event.get('routing_key'))
+        error = None
+        for attempt in range(1, self.max_attempts + 1):
+            await bucket.acquire()
+            try:
+                async with self._session.post(self.api_url, json=event) as response:
+                    body = await response.json(content_type=None)
+                    if response.status < 300:
+                        logger.info(f"Sent {event['event_action']} for {event.get('dedup_key')} to PagerDuty")
+                        return True, body
+                    error = f"HTTP {response.status}: {body}"
+                    if response.status == 429:
+                        self.throttled += 1
+                        retry_after = parse_retry_after(response.headers.get('Retry-After'), 2 ** attempt)
+                        bucket.penalize(retry_after)
+                        continue
+                    if response.status < 500:
+                        # Malformed event or bad routing key; retrying won't help
+                        break
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                error = str(e) or type(e).__name__
+            if attempt < self.max_attempts:
+                await asyncio.sleep(random.uniform(0, min(30, 2 ** attempt)))
+        logger.error(f"Failed to send PagerDuty event {event.get('dedup_key')}: {error}")
+        return False, error
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+def get_dispatcher():
+    """Return the process-wide PagerDutyDispatcher, starting it on first use"""
+    global _dispatcher
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                _dispatcher = PagerDutyDispatcher().start()
+    return _dispatcher
+
 def send_pagerduty_event(event):
-    """Send event to PagerDuty Events API"""
+    """Send event to PagerDuty Events API and wait for the result"""
     try:
-        response = requests.post(
-            PAGERDUTY_API_URL,
-            json=event,
-            headers={'Content-Type': 'application/json'},
-            timeout=10
-        )
-        response.raise_for_status()
-        
-        result = response.json()
-        logger.info(f"Successfully sent event to PagerDuty: {result}")
-        return True, result
-        
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Failed to send PagerDuty event: {e}")
-        return False, str(e)
+        return get_dispatcher().submit(event).result(PAGERDUTY_ACK_TIMEOUT)
     except Exception as e:
         logger.error(f"Unexpected error sending PagerDuty event: {e}")
-        return False, str(e)
+        return False, str(e) or type(e).__name__
 
 @app.route('/health', methods=['GET'])
 def health():
@@ -118,7 +275,14 @@ def health():
     return jsonify({
         'status': 'healthy', 
         'timestamp': datetime.utcnow().isoformat(),
-        'pagerduty_configured': bool(PAGERDUTY_INTEGRATION_KEY != 'your-integration-key-here')
+        'pagerduty_configured': bool(PAGERDUTY_INTEGRATION_KEY != 'your-integration-key-here'),
+        'dispatcher': {
+            'pending': get_dispatcher().pending,
+            'sent': get_dispatcher().sent,
+            'failed': get_dispatcher().failed,
+            'coalesced': get_dispatcher().coalesced,
+            'throttled': get_dispatcher().throttled
+        }
     })
 
 @app.route('/webhook', methods=['POST'])
@@ -130,13 +294,14 @@ def webhook():
         if not data:
             return jsonify({'error': 'No JSON data provided'}), 400
         
-        logger.info(f"Received webhook data: {json.dumps(data, indent=2)}")
-        
         alerts = data.get('alerts', [])
+        logger.info(f"Received webhook with {len(alerts)} alerts for group {data.get('groupKey')}")
+        
         if not alerts:
             return jsonify({'error': 'No alerts in payload'}), 400
         
-        results = []
+        dispatcher = get_dispatcher()
+        pending = []
         
         for alert in alerts:
             status = alert.get('status')
@@ -157,12 +322,20 @@ def webhook():
                 logger.info(f"Skipping alert with severity: {severity}")
                 continue
             
-            # Create and send PagerDuty event
+            # Create and queue PagerDuty event; all of them are sent concurrently
             event = format_pagerduty_event(alert, event_action)
-            success, result = send_pagerduty_event(event)
+            pending.append((labels.get('alertname', 'Unknown'), event_action, dispatcher.submit(event)))
+        
+        results = []
+        deadline = time.monotonic() + PAGERDUTY_ACK_TIMEOUT
+        for alert_name, event_action, future in pending:
+            try:
+                success, result = future.result(max(0, deadline - time.monotonic()))
+            except Exception as e:
+                success, result = False, str(e) or type(e).__name__
             
             results.append({
-                'alert': labels.get('alertname', 'Unknown'),
+                'alert': alert_name,
                 'action': event_action,
                 'success': success,
                 'result': result
@@ -245,5 +418,6 @@ if __name__ == '__main__':
         logger.warning("Set PAGERDUTY_INTEGRATION_KEY environment variable")
     
     logger.info(f"Starting PagerDuty webhook service on port {port}")
+    get_dispatcher()
     
     app.run(host='0.0.0.0', port=port, debug=debug)
\ No newline at end of file
@@ -0,0 +1,50 @@
+# 07_logging_monitoring/alerting/webhook-examples/rate_limit.py
+# Rate limiting shared by the Slack and PagerDuty webhook services
+
+import asyncio
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+class TokenBucket:
+    """Async token bucket: ``rate`` tokens per second, up to ``burst`` saved"""
+    
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+    
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+    
+    def penalize(self, seconds):
+        """Drain the bucket after a 429 so no request is sent for ``seconds``"""
+        self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+def parse_retry_after(value, default):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)"""
+    if value is None:
+        return default
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return default
+    if when is None:
+        return default
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
@@ -1,11 +1,16 @@
 # 07_logging_monitoring/alerting/webhook-examples/slack-webhook.py
 
-import json
-import requests
+import asyncio
+import aiohttp
+from collections import Counter
 from flask import Flask, request, jsonify
 from datetime import datetime
 import os
 import logging
+import random
+import threading
+
+from rate_limit import TokenBucket, parse_retry_after
 
 app = Flask(__name__)
 
@@ -17,6 +22,19 @@ logger = logging.getLogger(__name__)
 SLACK_WEBHOOK_URL = os.getenv('SLACK_WEBHOOK_URL', 'https://hooks.slack.com/services/YOUR/SLACK/WEBHOOK')
 SLACK_CHANNEL = os.getenv('SLACK_CHANNEL', '#alerts')
 SLACK_USERNAME = os.getenv('SLACK_USERNAME', 'AlertManager')
+# Alerts carrying this label are posted to that channel instead of SLACK_CHANNEL
+SLACK_CHANNEL_LABEL = os.getenv('SLACK_CHANNEL_LABEL', 'slack_channel')
+
+# Delivery queue tuning
+SLACK_BATCH_WINDOW = float(os.getenv('SLACK_BATCH_WINDOW', '2'))
+SLACK_MAX_ATTACHMENTS = int(os.getenv('SLACK_MAX_ATTACHMENTS', '20'))
+# Slack accepts about one message per second per incoming webhook
+SLACK_RATE_PER_SECOND = float(os.getenv('SLACK_RATE_PER_SECOND', '1'))
+SLACK_MAX_ATTEMPTS = int(os.getenv('SLACK_MAX_ATTEMPTS', '5'))
+# 429s a message may get before it is failed (a revoked webhook can throttle forever)
+SLACK_MAX_THROTTLED = int(os.getenv('SLACK_MAX_THROTTLED', '10'))
+SLACK_TIMEOUT = float(os.getenv('SLACK_TIMEOUT', '10'))
+SLACK_QUEUE_SIZE = int(os.getenv('SLACK_QUEUE_SIZE', '10000'))
 
 def format_alert_message(alert):
     """Format alert data for Slack message"""
@@ -96,32 +114,240 @@ def format_alert_message(alert):
     
     return attachment
 
-def send_slack_message(attachments, text=""):
-    """Send message to Slack via webhook"""
-    payload = {
-        "channel": SLACK_CHANNEL,
-        "username": SLACK_USERNAME,
-        "text": text,
-        "attachments": attachments
-    }
+def attachment_status(attachment):
+    """The alert status shown in a format_alert_message() attachment"""
+    for field in attachment.get('fields', ()):
+        if field.get('title') == 'Status':
+            return field.get('value')
+    return None
+
+class SlackDispatcher:
+    """Aggregating, rate-limited Slack delivery on a background asyncio loop.
     
-    try:
-        response = requests.post(
-            SLACK_WEBHOOK_URL,
-            json=payload,
-            timeout=10
-        )
-        response.raise_for_status()
-        logger.info(f"Successfully sent alert to Slack")
-        return True
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Failed to send Slack message: {e}")
+    Attachments are buffered per channel for SLACK_BATCH_WINDOW seconds (or
+    until SLACK_MAX_ATTACHMENTS accumulate) and posted as one message, so an
+    alert storm becomes a handful of messages instead of one per webhook.
+    Each channel has a single sender task, which keeps its messages in
+    order, and all senders share one pooled session and a token bucket for
+    the webhook URL. A 429 pauses every sender for the Retry-After period
+    and the same message is retried, so nothing is reordered; a message is
+    only failed after SLACK_MAX_THROTTLED 429s or SLACK_MAX_ATTEMPTS errors.
+    """
+    
+    def __init__(self, webhook_url=SLACK_WEBHOOK_URL, window=SLACK_BATCH_WINDOW,
+                 max_attachments=SLACK_MAX_ATTACHMENTS, rate=SLACK_RATE_PER_SECOND,
+                 max_attempts=SLACK_MAX_ATTEMPTS, timeout=SLACK_TIMEOUT, queue_size=SLACK_QUEUE_SIZE,
+                 max_throttled=SLACK_MAX_THROTTLED):
+        self.webhook_url = webhook_url
+        self.window = window
+        self.max_attachments = max_attachments
+        self.max_attempts = max_attempts
+        self.max_throttled = max_throttled
+        self.timeout = timeout
+        self.queue_size = queue_size
+        self._rate = rate
+        self._loop = asyncio.new_event_loop()
+        self._thread = None
+        self._session = None
+        self._bucket = None
+        # channel -> {'attachments': [...], 'groups': Counter, 'timer': handle}
+        self._buffers = {}
+        self._queues = {}
+        self._queued = 0
+        self._lock = threading.Lock()
+        self.messages_sent = 0
+        self.attachments_sent = 0
+        self.failed = 0
+        self.throttled = 0
+    
+    def start(self):
+        if self._thread is None:
+            ready = threading.Event()
+            self._thread = threading.Thread(target=self._run, args=(ready,),
+                                            name='slack-dispatcher', daemon=True)
+            self._thread.start()
+            ready.wait()
+        return self
+    
+    def _run(self, ready):
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_until_complete(self._setup())
+        finally:
+            ready.set()
+        self._loop.run_forever()
+    
+    async def _setup(self):
+        self._bucket = TokenBucket(self._rate)
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=4, keepalive_timeout=60),
+            timeout=aiohttp.ClientTimeout(total=self.timeout))
+    
+    def submit(self, channel, attachments, group_key):
+        """Queue attachments for a channel; raises OverflowError when full"""
+        with self._lock:
+            if self._queued + len(attachments) > self.queue_size:
+                raise OverflowError('Slack delivery queue is full')
+            self._queued += len(attachments)
+        self._loop.call_soon_threadsafe(self._add, channel, attachments, group_key)
+    
+    @property
+    def pending(self):
+        return self._queued
+    
+    def _add(self, channel, attachments, group_key):
+        buffer = self._buffers.get(channel)
+        if buffer is None:
+            buffer = self._buffers[channel] = {
+                'attachments': [],
+                'groups': Counter(),
+                'timer': self._loop.call_later(self.window, self._flush, channel)
+            }
+        buffer['attachments'].extend(attachments)
+        buffer['groups'][group_key] += len(attachments)
+        if len(buffer['attachments']) >= self.max_attachments:
+            self._flush(channel)
+    
+    def _flush(self, channel):
+        buffer = self._buffers.pop(channel, None)
+        if buffer is None:
+            return
+        buffer['timer'].cancel()
+        
+        queue = self._queues.get(channel)
+        if queue is None:
+            queue = self._queues[channel] = asyncio.Queue()
+            self._loop.create_task(self._sender(channel, queue))
+        
+        attachments = buffer['attachments']
+        for i in range(0, len(attachments), self.max_attachments):
+            chunk = attachments[i:i + self.max_attachments]
+            queue.put_nowait(self._message(channel, chunk, buffer['groups']))
+    
+    def _message(self, channel, attachments, groups):
+        # Count by the Status field: firing info alerts are green too
+        firing = sum(1 for a in attachments if attachment_status(a) == 'FIRING')
+        if len(groups) == 1:
+            text = f"Alert Group: {next(iter(groups))}"
+        else:
+            text = f"{len(attachments)} alerts from {len(groups)} groups"
+        if firing and firing != len(attachments):
+            text += f" ({firing} firing, {len(attachments) - firing} resolved)"
+        return {
+            "channel": channel,
+            "username": SLACK_USERNAME,
+            "text": text,
+            "attachments": attachments
+        }
+    
+    async def _sender(self, channel, queue):
+        while True:
+            payload = await queue.get()
+            count = len(payload['attachments'])
+            try:
+                delivered = await self._deliver(payload)
+            except Exception as e:
+                logger.error(f"Failed to send Slack message to {channel}: {e}")
+                delivered = False
+            with self._lock:
+                self._queued -= count
+            if delivered:
+                self.messages_sent += 1
+                self.attachments_sent += count
+            else:
+                self.failed += 1
+    
+    async def _deliver(self, payload):
+        error = None
+        attempt = 0
+        throttled = 0
+        while attempt < self.max_attempts:
+            await self._bucket.acquire()
+            try:
+                async with self._session.post(self.webhook_url, json=payload) as response:
+                    body = await response.text()
+                    if response.status < 300:
+                        logger.info(f"Sent {len(payload['attachments'])} alerts to Slack {payload['channel']}")
+                        return True
+                    error = f"HTTP {response.status}: {body[:200]}"
+                    if response.status == 429:
+                        # Throttling is not a failed attempt; wait as told and
+                        # retry, up to max_throttled times per message
+                        self.throttled += 1
+                        throttled += 1
+                        if throttled > self.max_throttled:
+                            break
+                        self._bucket.penalize(parse_retry_after(response.headers.get('Retry-After'), 1))
+                        continue
+                    if response.status < 500:
+                        break
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = str(e) or type(e).__name__
+            attempt += 1
+            if attempt < self.max_attempts:
+                await asyncio.sleep(random.uniform(0, min(30, 2 ** attempt)))
+        logger.error(f"Failed to send Slack message to {payload['channel']}: {error}")
         return False
 
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+def get_dispatcher():
+    """Return the process-wide SlackDispatcher, starting it on first use"""
+    global _dispatcher
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                _dispatcher = SlackDispatcher().start()
+    return _dispatcher
+
+def alert_channel(alert):
+    return alert.get('labels', {}).get(SLACK_CHANNEL_LABEL) or SLACK_CHANNEL
+
 @app.route('/health', methods=['GET'])
 def health():
     """Health check endpoint"""
-    return jsonify({'status': 'healthy', 'timestamp': datetime.utcnow().isoformat()})
+    dispatcher = get_dispatcher()
+    return jsonify({
+        'status': 'healthy',
+        'timestamp': datetime.utcnow().isoformat(),
+        'delivery': {
+            'pending_alerts': dispatcher.pending,
+            'messages_sent': dispatcher.messages_sent,
+            'alerts_sent': dispatcher.attachments_sent,
+            'failed_messages': dispatcher.failed,
+            'throttled': dispatcher.throttled
+        }
+    })
+
+def queue_alerts(data):
+    """Format alerts and queue them per channel; returns a Flask response"""
+    alerts = data.get('alerts', [])
+    if not alerts:
+        return jsonify({'error': 'No alerts in payload'}), 400
+    
+    # Firing alerts first, then resolved ones, grouped by destination channel
+    by_channel = {}
+    for alert in sorted(alerts, key=lambda a: a.get('status') != 'firing'):
+        attachment = format_alert_message(alert)
+        if alert.get('status') == 'resolved':
+            attachment['color'] = 'good'
+            attachment['title'] = f"✅ {alert.get('annotations', {}).get('summary', 'Alert Resolved')}"
+        by_channel.setdefault(alert_channel(alert), []).append(attachment)
+    
+    group_key = data.get('groupKey', 'unknown')
+    try:
+        for channel, attachments in by_channel.items():
+            get_dispatcher().submit(channel, attachments, group_key)
+    except OverflowError as e:
+        logger.error(f"Dropping alerts for group {group_key}: {e}")
+        return jsonify({'error': str(e)}), 503
+    
+    # Delivery happens in the background, aggregated with other webhooks
+    return jsonify({
+        'message': 'Alerts queued for Slack',
+        'channels': {channel: len(attachments) for channel, attachments in by_channel.items()}
+    }), 202
 
 @app.route('/webhook', methods=['POST'])
 def webhook():
@@ -132,45 +358,9 @@ def webhook():
         if not data:
             return jsonify({'error': 'No JSON data provided'}), 400
         
-        logger.info(f"Received webhook data: {json.dumps(data, indent=2)}")
-        
-        alerts = data.get('alerts', [])
-        if not alerts:
-            return jsonify({'error': 'No alerts in payload'}), 400
-        
-        # Group alerts by status
-        firing_alerts = [alert for alert in alerts if alert.get('status') == 'firing']
-        resolved_alerts = [alert for alert in alerts if alert.get('status') == 'resolved']
-        
-        attachments = []
-        
-        # Process firing alerts
-        if firing_alerts:
-            for alert in firing_alerts:
-                attachment = format_alert_message(alert)
-                attachments.append(attachment)
+        logger.info(f"Received webhook with {len(data.get('alerts', []))} alerts for group {data.get('groupKey')}")
         
-        # Process resolved alerts
-        if resolved_alerts:
-            for alert in resolved_alerts:
-                attachment = format_alert_message(alert)
-                attachment['color'] = 'good'
-                attachment['title'] = f"✅ {alert.get('annotations', {}).get('summary', 'Alert Resolved')}"
-                attachments.append(attachment)
-        
-        # Send to Slack
-        if attachments:
-            group_key = data.get('groupKey', 'unknown')
-            text = f"Alert Group: {group_key}"
-            
-            success = send_slack_message(attachments, text)
-            
-            if success:
-                return jsonify({'message': 'Alerts sent to Slack successfully'}), 200
-            else:
-                return jsonify({'error': 'Failed to send alerts to Slack'}), 500
-        else:
-            return jsonify({'message': 'No alerts to process'}), 200
+        return queue_alerts(data)
             
     except Exception as e:
         logger.error(f"Error processing webhook: {e}")
@@ -200,7 +390,7 @@ def test_alert():
     }
     
     # Process the test alert
-    return webhook()
+    return queue_alerts(test_alert)
 
 if __name__ == '__main__':
     port = int(os.getenv('PORT', 8080))
@@ -208,5 +398,6 @@ if __name__ == '__main__':
     
     logger.info(f"Starting Slack webhook service on port {port}")
     logger.info(f"Slack channel: {SLACK_CHANNEL}")
+    get_dispatcher()
     
     app.run(host='0.0.0.0', port=port, debug=debug)
\ No newline at end of file
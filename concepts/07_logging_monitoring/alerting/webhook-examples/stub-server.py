@@ -0,0 +1,158 @@
+# 07_logging_monitoring/alerting/webhook-examples/stub-server.py
+# Local stand-in for the notification APIs the webhook services call, for
+# load and failure testing without real accounts. Run from this directory:
+#
+#   python stub-server.py --port 8090 --latency-ms 80 --error-rate 0.05
+#   PAGERDUTY_API_URL=http://localhost:8090/v2/enqueue python pagerduty-webhook.py
+#   SLACK_WEBHOOK_URL=http://localhost:8090/slack/T000/B000/XXX python slack-webhook.py
+#
+# GET /stats returns what was received, including rate-limited requests and,
+# per Slack channel, messages whose alerts arrived older than an earlier
+# message's (out_of_order).
+
+import argparse
+import asyncio
+import random
+import time
+from collections import Counter, defaultdict, deque
+
+from aiohttp import web
+
+class SlidingWindowLimit:
+    """At most ``limit`` requests per ``window`` seconds per key"""
+
+    def __init__(self, limit, window=60.0):
+        self.limit = limit
+        self.window = window
+        self._hits = defaultdict(deque)
+
+    def retry_after(self, key):
+        """Record a request; return 0 if allowed, else seconds until it would be"""
+        if self.limit <= 0:
+            return 0
+        now = time.monotonic()
+        hits = self._hits[key]
+        while hits and now - hits[0] >= self.window:
+            hits.popleft()
+        if len(hits) >= self.limit:
+            return self.window - (now - hits[0])
+        hits.append(now)
+        return 0
+
+class StubServer:
+    def __init__(self, latency_ms, error_rate, pagerduty_rate, slack_rate):
+        self.latency = latency_ms / 1000.0
+        self.error_rate = error_rate
+        self.pagerduty_limit = SlidingWindowLimit(pagerduty_rate)
+        self.slack_limit = SlidingWindowLimit(slack_rate, window=1.0)
+        self.stats = Counter()
+        self.dedup_keys = Counter()
+        self.slack_channels = defaultdict(lambda: {'messages': 0, 'attachments': 0, 'out_of_order': 0, 'last_ts': 0})
+
+    async def _simulate(self, name):
+        """Apply latency and random failures; return an error response or None"""
+        self.stats[f'{name}_requests'] += 1
+        if self.latency:
+            await asyncio.sleep(random.uniform(0.5, 1.5) * self.latency)
+        if random.random() < self.error_rate:
+            self.stats[f'{name}_errors'] += 1
+            return web.json_response({'status': 'error', 'message': 'Injected failure'}, status=503)
+        return None
+
+    async def pagerduty_enqueue(self, request):
+        """Events API v2: POST /v2/enqueue"""
+        error = await self._simulate('pagerduty')
+        if error:
+            return error
+
+        event = await request.json()
+        errors = []
+        if not event.get('routing_key'):
+            errors.append("'routing_key' is missing")
+        if event.get('event_action') not in ('trigger', 'acknowledge', 'resolve'):
+            errors.append("'event_action' is invalid")
+        if event.get('event_action') == 'trigger' and not event.get('payload', {}).get('summary'):
+            errors.append("'payload.summary' is missing")
+        if errors:
+            self.stats['pagerduty_invalid'] += 1
+            return web.json_response({'status': 'invalid event', 'message': 'Event object is invalid',
+                                      'errors': errors}, status=400)
+
+        retry_after = self.pagerduty_limit.retry_after(event['routing_key'])
+        if retry_after:
+            self.stats['pagerduty_throttled'] += 1
+            return web.json_response({'status': 'throttle event', 'message': 'Requests for this service are arriving too quickly'},
+                                     status=429, headers={'Retry-After': str(int(retry_after) + 1)})
+
+        dedup_key = event.get('dedup_key') or f'{random.getrandbits(64):016x}'
+        self.dedup_keys[dedup_key] += 1
+        self.stats[f"pagerduty_{event['event_action']}"] += 1
+        return web.json_response({'status': 'success', 'message': 'Event processed',
+                                  'dedup_key': dedup_key}, status=202)
+
+    async def slack_webhook(self, request):
+        """Incoming webhook: POST /slack/T.../B.../..."""
+        error = await self._simulate('slack')
+        if error:
+            return error
+
+        retry_after = self.slack_limit.retry_after(request.match_info['path'])
+        if retry_after:
+            self.stats['slack_throttled'] += 1
+            return web.Response(text='rate_limited', status=429,
+                                headers={'Retry-After': str(max(1, round(retry_after)))})
+
+        message = await request.json()
+        attachments = message.get('attachments') or []
+        if not message.get('text') and not attachments:
+            self.stats['slack_invalid'] += 1
+            return web.Response(text='no_text', status=400)
+
+        channel = self.slack_channels[message.get('channel', 'default')]
+        timestamps = [a.get('ts', 0) for a in attachments]
+        if timestamps and min(timestamps) < channel['last_ts']:
+            channel['out_of_order'] += 1
+        channel['last_ts'] = max(timestamps + [channel['last_ts']])
+        channel['messages'] += 1
+        channel['attachments'] += len(attachments)
+        self.stats['slack_messages'] += 1
+        return web.Response(text='ok')
+
+    async def get_stats(self, request):
+        return web.json_response({
+            'stats': dict(self.stats),
+            'pagerduty_dedup_keys': len(self.dedup_keys),
+            'slack_channels': {name: {k: v for k, v in channel.items() if k != 'last_ts'}
+                               for name, channel in self.slack_channels.items()},
+        })
+
+    async def reset_stats(self, request):
+        self.stats.clear()
+        self.dedup_keys.clear()
+        self.slack_channels.clear()
+        return web.json_response({'status': 'reset'})
+
+    def app(self):
+        app = web.Application()
+        app.router.add_post('/v2/enqueue', self.pagerduty_enqueue)
+        app.router.add_post('/slack/{path:.*}', self.slack_webhook)
+        app.router.add_get('/stats', self.get_stats)
+        app.router.add_delete('/stats', self.reset_stats)
+        return app
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub notification APIs for webhook testing")
+    parser.add_argument("--port", type=int, default=8090, help="Port to listen on")
+    parser.add_argument("--latency-ms", type=float, default=50, help="Mean response latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument("--pagerduty-rate", type=int, default=120,
+                        help="PagerDuty events per routing key per minute before 429 (0 = unlimited)")
+    parser.add_argument("--slack-rate", type=int, default=1,
+                        help="Slack messages per webhook URL per second before 429 (0 = unlimited)")
+    args = parser.parse_args()
+
+    server = StubServer(args.latency_ms, args.error_rate, args.pagerduty_rate, args.slack_rate)
+    web.run_app(server.app(), port=args.port)
+
+if __name__ == "__main__":
+    main()
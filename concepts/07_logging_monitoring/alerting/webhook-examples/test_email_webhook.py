@@ -0,0 +1,120 @@
+# 07_logging_monitoring/alerting/webhook-examples/test_email_webhook.py
+# Digest batching and urgent flushes of email-webhook.py against a local
+# aiosmtpd server
+
+import importlib.util
+import os
+import socket
+import time
+from email import message_from_bytes
+
+import pytest
+
+pytest.importorskip('aiosmtpd')
+from aiosmtpd.controller import Controller
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+class Inbox:
+    """aiosmtpd handler that keeps every received message"""
+
+    def __init__(self):
+        self.messages = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append((envelope.rcpt_tos, message_from_bytes(envelope.content)))
+        return '250 OK'
+
+    def wait(self, count, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while len(self.messages) < count and time.monotonic() < deadline:
+            time.sleep(0.02)
+        return self.messages
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture(scope='module')
+def email_webhook():
+    spec = importlib.util.spec_from_file_location('email_webhook', os.path.join(HERE, 'email-webhook.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def inbox(email_webhook, monkeypatch):
+    inbox = Inbox()
+    controller = Controller(inbox, hostname='127.0.0.1', port=free_port())
+    controller.start()
+    monkeypatch.setattr(email_webhook, 'SMTP_SERVER', '127.0.0.1')
+    monkeypatch.setattr(email_webhook, 'SMTP_PORT', controller.port)
+    monkeypatch.setattr(email_webhook, 'SMTP_USE_TLS', False)
+    monkeypatch.setattr(email_webhook, 'SMTP_USERNAME', '')
+    yield inbox
+    controller.stop()
+
+
+def dispatcher_for(email_webhook, monkeypatch, window):
+    dispatcher = email_webhook.EmailDispatcher(window=window, workers=1).start()
+    monkeypatch.setattr(email_webhook, '_dispatcher', dispatcher)
+    return dispatcher
+
+
+def post(email_webhook, name, severity, recipient='oncall@example.com'):
+    alert = {
+        'status': 'firing',
+        'labels': {'alertname': name, 'severity': severity, 'email_to': recipient},
+        'annotations': {'summary': f'{name} fired'},
+    }
+    response = email_webhook.app.test_client().post('/webhook', json={'groupKey': 'g', 'alerts': [alert]})
+    assert response.status_code == 202
+
+
+def test_alerts_are_batched_into_one_digest(email_webhook, inbox, monkeypatch):
+    dispatcher = dispatcher_for(email_webhook, monkeypatch, window=0.5)
+    post(email_webhook, 'DiskFilling', 'warning')
+    post(email_webhook, 'HighLatency', 'warning')
+    assert dispatcher.pending_digests == 2
+    assert inbox.messages == []
+
+    messages = inbox.wait(1)
+    time.sleep(0.2)
+    assert len(messages) == 1
+    recipients, msg = messages[0]
+    assert recipients == ['oncall@example.com']
+    assert msg['Subject'] == '[WARNING] 2 alerts'
+    assert dispatcher.sent == 1
+    assert dispatcher.pool.connections_opened == 1
+
+
+def test_critical_alert_flushes_immediately(email_webhook, inbox, monkeypatch):
+    dispatcher = dispatcher_for(email_webhook, monkeypatch, window=60)
+    post(email_webhook, 'DiskFilling', 'warning')
+    post(email_webhook, 'ServiceDown', 'critical')
+
+    messages = inbox.wait(1)
+    assert len(messages) == 1
+    assert messages[0][1]['Subject'] == '[CRITICAL] 2 alerts'
+    assert dispatcher.pending_digests == 0
+
+
+def test_digests_are_per_recipient(email_webhook, inbox, monkeypatch):
+    dispatcher = dispatcher_for(email_webhook, monkeypatch, window=60)
+    post(email_webhook, 'DiskFilling', 'warning', recipient='storage@example.com')
+    post(email_webhook, 'ServiceDown', 'critical', recipient='oncall@example.com')
+
+    messages = inbox.wait(1)
+    time.sleep(0.2)
+    assert [recipients for recipients, _ in messages] == [['oncall@example.com']]
+    assert dispatcher.pending_digests == 1
+
+    dispatcher.flush_all()
+    messages = inbox.wait(2)
+    assert messages[1][0] == ['storage@example.com']
+    assert messages[1][1]['Subject'] == '[WARNING] DiskFilling'
@@ -6,10 +6,13 @@ import random
 import time
 from datetime import datetime
 from flask import Flask, jsonify, request
-from prometheus_client import Counter, Histogram, Gauge, generate_latest, CONTENT_TYPE_LATEST
+import atexit
 import os
 import threading
 
+from log_sampling import LogSampler
+from metrics import ERROR_COUNT, RequestTimer, render_metrics
+
 app = Flask(__name__)
 
 # Configure structured logging
@@ -20,32 +23,63 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
-# Prometheus metrics
-REQUEST_COUNT = Counter('http_requests_total', 'Total HTTP requests', ['method', 'endpoint', 'status'])
-REQUEST_LATENCY = Histogram('http_request_duration_seconds', 'HTTP request latency')
-ACTIVE_CONNECTIONS = Gauge('active_connections', 'Active connections')
-ERROR_COUNT = Counter('errors_total', 'Total errors', ['type'])
-
 class StructuredLogger:
-    @staticmethod
-    def log(level, message, **kwargs):
+    def __init__(self, sampler=None):
+        self.sampler = sampler or LogSampler.from_env()
+        self.service = os.getenv('APP_NAME', 'sample-app')
+        self.version = '1.0.0'
+        # Compact separators and a single encoder instance avoid per-call setup in json.dumps
+        self._encode = json.JSONEncoder(separators=(',', ':'), default=str).encode
+
+    def log(self, level, message, route=None, **kwargs):
+        levelno = logging.getLevelName(level)
+        if not isinstance(levelno, int):
+            levelno = logging.INFO
+        if not logger.isEnabledFor(levelno):
+            return
+
+        emit, repeated, evicted = self.sampler.decide(
+            levelno, message, route,
+            status_code=kwargs.get('status_code'),
+            response_time=kwargs.get('response_time')
+        )
+        for (key_levelno, key_message, key_route, _), count in evicted:
+            self._write(key_levelno, f"{key_message} (repeated {count} times)",
+                        {'route': key_route, 'repeated': count})
+        if not emit:
+            return
+
+        if route is not None:
+            kwargs['route'] = route
+        if repeated:
+            kwargs['repeated'] = repeated
+        self._write(levelno, message, kwargs)
+
+    def flush(self):
+        """Emit suppression summaries that are still pending"""
+        for (levelno, message, route, _), count in self.sampler.drain():
+            self._write(levelno, f"{message} (repeated {count} times)",
+                        {'route': route, 'repeated': count})
+
+    def _write(self, levelno, message, fields):
         log_entry = {
             'timestamp': datetime.utcnow().isoformat(),
-            'level': level,
+            'level': logging.getLevelName(levelno),
             'message': message,
-            'service': os.getenv('APP_NAME', 'sample-app'),
-            'version': '1.0.0',
-            **kwargs
+            'service': self.service,
+            'version': self.version,
+            **fields
         }
-        logger.info(json.dumps(log_entry))
+        logger.log(levelno, self._encode(log_entry))
 
 structured_logger = StructuredLogger()
+atexit.register(structured_logger.flush)
 
 def generate_sample_logs():
     """Generate sample logs for demonstration"""
     events = [
         {'event': 'user_login', 'user_id': random.randint(1, 1000), 'success': True},
-        {'event': 'api_call', 'endpoint': '/api/data', 'response_time': random.randint(10, 500)},
+        {'event': 'api_call', 'endpoint': '/api/data', 'response_time': round(random.uniform(0.01, 0.5), 3)},
         {'event': 'database_query', 'query_time': random.randint(5, 200), 'rows_affected': random.randint(1, 100)},
         {'event': 'cache_hit', 'cache_key': f'user_{random.randint(1, 100)}', 'hit_rate': random.uniform(0.7, 0.95)},
         {'event': 'error_occurred', 'error_type': 'ValidationError', 'error_code': 400}
@@ -61,24 +95,17 @@ def generate_sample_logs():
 
 @app.before_request
 def before_request():
-    request.start_time = time.time()
-    ACTIVE_CONNECTIONS.inc()
+    request.timer = RequestTimer(request.method, request.endpoint)
 
 @app.after_request
 def after_request(response):
-    request_latency = time.time() - request.start_time
-    REQUEST_LATENCY.observe(request_latency)
-    REQUEST_COUNT.labels(
-        method=request.method,
-        endpoint=request.endpoint or 'unknown',
-        status=response.status_code
-    ).inc()
-    ACTIVE_CONNECTIONS.dec()
+    request_latency = request.timer.finish(response.status_code)
     
     # Log the request
     structured_logger.log(
         'INFO',
         'HTTP request processed',
+        route=request.timer.endpoint,
         method=request.method,
         path=request.path,
         status_code=response.status_code,
@@ -97,7 +124,8 @@ def health():
 @app.route('/metrics')
 def metrics():
     """Prometheus metrics endpoint"""
-    return generate_latest(), 200, {'Content-Type': CONTENT_TYPE_LATEST}
+    body, content_type = render_metrics()
+    return body, 200, {'Content-Type': content_type}
 
 @app.route('/')
 def index():
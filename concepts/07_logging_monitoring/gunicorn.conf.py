@@ -0,0 +1,23 @@
+# 07_logging_monitoring/gunicorn.conf.py
+# Run with: gunicorn -c gunicorn.conf.py app:app
+
+import os
+import shutil
+
+# Must be set before any worker imports prometheus_client
+PROMETHEUS_MULTIPROC_DIR = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/prometheus-multiproc')
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8080')}"
+workers = int(os.getenv('GUNICORN_WORKERS', '4'))
+threads = int(os.getenv('GUNICORN_THREADS', '2'))
+
+
+def on_starting(server):
+    """Start every run with an empty metrics directory"""
+    shutil.rmtree(PROMETHEUS_MULTIPROC_DIR, ignore_errors=True)
+    os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+
+
+def child_exit(server, worker):
+    from metrics import mark_process_dead
+    mark_process_dead(worker.pid)
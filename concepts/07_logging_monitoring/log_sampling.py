@@ -0,0 +1,143 @@
+# 07_logging_monitoring/log_sampling.py
+
+import logging
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+
+# Routes that are scraped/probed constantly and carry no useful signal per request
+DEFAULT_ROUTE_RATES = {
+    'health': 0.0,
+    'metrics': 0.0,
+}
+
+
+def parse_route_rates(spec):
+    """Parse a LOG_SAMPLE_RATES spec such as 'health=0,metrics=0,api_data=0.25'"""
+    rates = {}
+    for item in (spec or '').split(','):
+        if '=' not in item:
+            continue
+        route, rate = item.split('=', 1)
+        try:
+            rates[route.strip()] = min(max(float(rate), 0.0), 1.0)
+        except ValueError:
+            continue
+    return rates
+
+
+class LogSampler:
+    """Decide which structured log records are emitted.
+
+    Records are kept when any of the following holds, in order:
+      * the level is ERROR or above, or the status code is 5xx
+      * the request was slower than ``slow_threshold`` seconds
+      * a random draw passes the sample rate of the record's route
+
+    Records kept by the first two rules are always emitted. Sampled records
+    are then rate-limited per (level, message, route, status): at most
+    ``burst`` identical records are emitted per ``dedup_window`` seconds and
+    the rest are counted so the next emitted record can report "repeated N
+    times". The dedup table is an LRU bounded by ``max_keys`` so memory
+    stays flat no matter how many distinct messages are produced.
+    """
+
+    def __init__(self, route_rates=None, default_rate=1.0, slow_threshold=0.5,
+                 dedup_window=10.0, burst=5, max_keys=1024,
+                 clock=time.monotonic, rng=random.random):
+        self.route_rates = dict(DEFAULT_ROUTE_RATES)
+        self.route_rates.update(route_rates or {})
+        self.default_rate = default_rate
+        self.slow_threshold = slow_threshold
+        self.dedup_window = dedup_window
+        self.burst = burst
+        self.max_keys = max_keys
+        self._clock = clock
+        self._rng = rng
+        self._lock = threading.Lock()
+        # key -> [window_start, emitted_in_window, suppressed]
+        self._windows = OrderedDict()
+        # Suppression counts of evicted keys, reported on the next emitted record
+        self._evicted = []
+        self.sampled_out = 0
+        self.suppressed_total = 0
+
+    @classmethod
+    def from_env(cls):
+        """Build a sampler from LOG_* environment variables"""
+        return cls(
+            route_rates=parse_route_rates(os.getenv('LOG_SAMPLE_RATES', '')),
+            default_rate=float(os.getenv('LOG_SAMPLE_DEFAULT', '1.0')),
+            slow_threshold=float(os.getenv('LOG_SLOW_REQUEST_SECONDS', '0.5')),
+            dedup_window=float(os.getenv('LOG_DEDUP_WINDOW', '10')),
+            burst=int(os.getenv('LOG_DEDUP_BURST', '5')),
+        )
+
+    def _always_keep(self, levelno, status_code, response_time):
+        if levelno >= logging.ERROR:
+            return True
+        if status_code is not None and status_code >= 500:
+            return True
+        return response_time is not None and response_time >= self.slow_threshold
+
+    def decide(self, levelno, message, route=None, status_code=None, response_time=None):
+        """Return (emit, repeated, evicted) for a candidate record.
+
+        ``repeated`` is the number of identical records suppressed since the
+        last one emitted for this key; ``evicted`` is a list of
+        (key, count) pairs whose suppression summary must be flushed.
+        """
+        if self._always_keep(levelno, status_code, response_time):
+            # Never deduplicated, but still flush pending summaries
+            with self._lock:
+                evicted, self._evicted = self._evicted, []
+            return True, 0, evicted
+
+        rate = self.route_rates.get(route, self.default_rate)
+        if rate <= 0.0 or (rate < 1.0 and self._rng() >= rate):
+            with self._lock:
+                self.sampled_out += 1
+            return False, 0, ()
+
+        key = (levelno, message, route, status_code)
+        now = self._clock()
+
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None:
+                window = [now, 0, 0]
+                self._windows[key] = window
+                if len(self._windows) > self.max_keys:
+                    old_key, old = self._windows.popitem(last=False)
+                    if old[2]:
+                        self._evicted.append((old_key, old[2]))
+            else:
+                self._windows.move_to_end(key)
+
+            if now - window[0] >= self.dedup_window:
+                window[0] = now
+                window[1] = 0
+
+            if window[1] >= self.burst:
+                window[2] += 1
+                self.suppressed_total += 1
+                return False, 0, ()
+
+            window[1] += 1
+            repeated, window[2] = window[2], 0
+            evicted, self._evicted = self._evicted, []
+
+        return True, repeated, evicted
+
+    def drain(self):
+        """Return and reset all pending suppression counts (e.g. at shutdown)"""
+        with self._lock:
+            pending = list(self._evicted)
+            self._evicted = []
+            for key, window in self._windows.items():
+                if window[2]:
+                    pending.append((key, window[2]))
+                    window[2] = 0
+        return pending
@@ -0,0 +1,97 @@
+# 07_logging_monitoring/metrics.py
+
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# Bucket edges line up with the latency SLOs alerted on in
+# alerting/prometheus-rules.yml (p95 > 0.5s) so quantile estimates near the
+# objective are exact rather than interpolated across a wide bucket.
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.15, 0.2, 0.25, 0.3,
+    0.4, 0.5, 0.75, 1.0, 1.5, 2.5, 5.0, 10.0
+)
+
+# Set by gunicorn.conf.py (or the environment) when running several workers.
+# Each worker then writes its samples to mmap files in this directory and
+# /metrics aggregates them, instead of reporting whichever worker answered.
+MULTIPROC_DIR = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+
+
+def _latency_buckets():
+    """Default buckets plus any extra SLO thresholds from LATENCY_SLO_SECONDS"""
+    extra = []
+    for value in os.getenv('LATENCY_SLO_SECONDS', '').split(','):
+        try:
+            extra.append(float(value))
+        except ValueError:
+            continue
+    return tuple(sorted(set(LATENCY_BUCKETS).union(extra)))
+
+
+REQUEST_COUNT = Counter(
+    'http_requests_total', 'Total HTTP requests',
+    ['method', 'endpoint', 'status']
+)
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'HTTP request latency',
+    ['method', 'endpoint'],
+    buckets=_latency_buckets()
+)
+# 'livesum' adds up the values of live workers and drops those of dead ones
+IN_FLIGHT = Gauge(
+    'http_requests_in_flight', 'HTTP requests currently being served',
+    ['method', 'endpoint'],
+    multiprocess_mode='livesum'
+)
+ACTIVE_CONNECTIONS = Gauge(
+    'active_connections', 'Active connections',
+    multiprocess_mode='livesum'
+)
+ERROR_COUNT = Counter('errors_total', 'Total errors', ['type'])
+
+
+class RequestTimer:
+    """Tracks one request from before_request to after_request"""
+
+    __slots__ = ('method', 'endpoint', 'start')
+
+    def __init__(self, method, endpoint):
+        self.method = method
+        self.endpoint = endpoint or 'unknown'
+        self.start = time.perf_counter()
+        IN_FLIGHT.labels(method=self.method, endpoint=self.endpoint).inc()
+        ACTIVE_CONNECTIONS.inc()
+
+    def finish(self, status_code):
+        """Record the request and return its latency in seconds"""
+        latency = time.perf_counter() - self.start
+        REQUEST_LATENCY.labels(method=self.method, endpoint=self.endpoint).observe(latency)
+        REQUEST_COUNT.labels(method=self.method, endpoint=self.endpoint, status=status_code).inc()
+        IN_FLIGHT.labels(method=self.method, endpoint=self.endpoint).dec()
+        ACTIVE_CONNECTIONS.dec()
+        return latency
+
+
+def render_metrics():
+    """Return (body, content_type) for the /metrics endpoint"""
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid):
+    """Drop a dead worker's live gauges; called from gunicorn's child_exit hook"""
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid)
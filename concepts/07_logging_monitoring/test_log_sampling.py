@@ -0,0 +1,69 @@
+# 07_logging_monitoring/test_log_sampling.py
+
+import logging
+
+from log_sampling import LogSampler, parse_route_rates
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_sampler(**kwargs):
+    kwargs.setdefault('clock', FakeClock())
+    kwargs.setdefault('rng', lambda: 0.0)
+    return LogSampler(burst=5, dedup_window=10.0, **kwargs)
+
+
+def emitted(sampler, count, levelno=logging.INFO, message='HTTP request processed', **kwargs):
+    return [sampler.decide(levelno, message, 'api_data', **kwargs)[0] for _ in range(count)]
+
+
+def test_parse_route_rates():
+    assert parse_route_rates('health=0, api_data=0.25,bad,x=abc,y=2') == {'health': 0.0, 'api_data': 0.25, 'y': 1.0}
+
+
+def test_duplicates_beyond_burst_are_suppressed_and_reported():
+    sampler = make_sampler()
+    assert emitted(sampler, 8, status_code=200, response_time=0.01) == [True] * 5 + [False] * 3
+    assert sampler.suppressed_total == 3
+    sampler._clock.now = 10.0
+    assert sampler.decide(logging.INFO, 'HTTP request processed', 'api_data',
+                          status_code=200, response_time=0.01) == (True, 3, [])
+
+
+def test_slow_info_requests_are_never_deduplicated():
+    sampler = make_sampler()
+    emitted(sampler, 5, status_code=200, response_time=0.01)
+    assert emitted(sampler, 3, status_code=200, response_time=2.0) == [True] * 3
+
+
+def test_5xx_info_requests_are_never_deduplicated():
+    sampler = make_sampler()
+    assert emitted(sampler, 10, status_code=503, response_time=0.01) == [True] * 10
+    assert sampler.suppressed_total == 0
+
+
+def test_errors_are_never_deduplicated():
+    sampler = make_sampler()
+    assert emitted(sampler, 10, levelno=logging.ERROR, message='boom') == [True] * 10
+
+
+def test_always_kept_records_bypass_route_sampling():
+    sampler = make_sampler(route_rates={'api_data': 0.0})
+    assert emitted(sampler, 2, status_code=200, response_time=0.01) == [False, False]
+    assert sampler.sampled_out == 2
+    assert emitted(sampler, 1, status_code=500) == [True]
+    assert emitted(sampler, 1, status_code=200, response_time=0.5) == [True]
+
+
+def test_evicted_summaries_flush_with_next_emitted_record():
+    sampler = LogSampler(burst=1, max_keys=1, clock=FakeClock(), rng=lambda: 0.0)
+    sampler.decide(logging.INFO, 'a')
+    sampler.decide(logging.INFO, 'a')
+    assert sampler.decide(logging.INFO, 'b') == (True, 0, [((logging.INFO, 'a', None, None), 1)])
+    assert sampler.drain() == []
@@ -7,77 +7,307 @@ import statistics
 import json
 import argparse
 import sys
-from typing import Dict, List
+import threading
+import uuid
+import calendar
+import socket
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
 import matplotlib.pyplot as plt
 import pandas as pd
 from datetime import datetime
 
-class StartupBenchmark:
+from startup_results import REGRESSION_EXIT, ResultsStore, check_regressions
+
+# Label that ties a benchmark run's containers to its events subscription
+BENCHMARK_LABEL = "startup-benchmark.run"
+START_TIMEOUT = 30
+HEALTH_TIMEOUT = 60
+
+# Iteration timeline, in seconds since the create request on the local monotonic clock
+PHASES = ("create_returned", "created", "start_returned", "running", "first_log", "port_open", "healthy")
+
+def parse_log_timestamp(line: bytes) -> int:
+    """Daemon time (ns) of a log line fetched with timestamps=True (RFC 3339, UTC)"""
+    stamp = line.split(b" ", 1)[0].decode()
+    date, _, fraction = stamp.rstrip("Z").partition(".")
+    seconds = calendar.timegm(time.strptime(date, "%Y-%m-%dT%H:%M:%S"))
+    return seconds * 10**9 + int((fraction + "000000000")[:9])
+
+class ClockAlignment:
+    """Maps daemon timestamps onto the local monotonic clock.
+    
+    An event caused by an API call is stamped by the daemon between the
+    call's request and response, so each call bounds the offset
+    (daemon time - monotonic time) to an interval. Intersecting those
+    intervals narrows the offset to the fastest round trip seen, and holds
+    whether or not the daemon's clock agrees with ours (remote daemon, VM).
+    """
+    
     def __init__(self):
+        self.low = float('-inf')
+        self.high = float('inf')
+        self._lock = threading.Lock()
+    
+    def observe(self, before: float, after: float, daemon_ns: int):
+        """Record an event stamped ``daemon_ns`` by a call made between two monotonic readings"""
+        daemon = daemon_ns / 1e9
+        low, high = daemon - after, daemon - before
+        with self._lock:
+            if low > self.high or high < self.low:
+                # A clock was stepped (NTP); start over from this call
+                self.low, self.high = low, high
+            else:
+                self.low, self.high = max(self.low, low), min(self.high, high)
+    
+    @property
+    def uncertainty(self) -> float:
+        return (self.high - self.low) / 2
+    
+    def to_monotonic(self, daemon_ns: int) -> float:
+        return daemon_ns / 1e9 - (self.low + self.high) / 2
+
+class EventCollector:
+    """Container events for one benchmark run, from a single events stream.
+    
+    Transitions are timed with the daemon's own timestamps (timeNano), so
+    measurements carry no polling interval or inspect round trip. Events
+    are kept for containers between watch() and forget(), so an event that
+    arrives before anyone waits for it is not lost, and teardown events of
+    removed containers are not kept at all. Create events are kept
+    regardless, as they arrive before the caller knows the container ID.
+    """
+    
+    def __init__(self, client, run_id: str):
+        self.client = client
+        self.run_id = run_id
+        self._events = {}
+        self._cond = threading.Condition()
+        self._stream = None
+    
+    def start(self):
+        # The request is made here, so the subscription is live before any container exists
+        self._stream = self.client.events(
+            decode=True,
+            filters={"type": "container", "label": f"{BENCHMARK_LABEL}={self.run_id}"}
+        )
+        threading.Thread(target=self._run, name="docker-events", daemon=True).start()
+        return self
+    
+    def _run(self):
+        try:
+            for event in self._stream:
+                container_id = event.get("id") or event.get("Actor", {}).get("ID")
+                action = event.get("Action") or event.get("status", "")
+                timestamp = event.get("timeNano") or event.get("time", 0) * 10**9
+                with self._cond:
+                    if container_id in self._events or action == "create":
+                        self._events.setdefault(container_id, []).append((action, timestamp))
+                        self._cond.notify_all()
+        except Exception:
+            # Stream closed by close(), or the daemon went away
+            pass
+    
+    def watch(self, container_id: str):
+        with self._cond:
+            self._events.setdefault(container_id, [])
+    
+    def wait_for(self, container_id: str, actions: Tuple[str, ...], timeout: float) -> Optional[Tuple[str, int]]:
+        """First (action, timeNano) whose action is one of ``actions``, or None on timeout"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                for action, timestamp in self._events.get(container_id, ()):
+                    if action in actions:
+                        return action, timestamp
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+    
+    def forget(self, container_id: str):
+        with self._cond:
+            self._events.pop(container_id, None)
+    
+    def close(self):
+        if self._stream is not None:
+            self._stream.close()
+
+class StartupBenchmark:
+    def __init__(self, concurrency: int = 1, warmup: int = 1, cooldown: float = 2.0, probe_port: int = None):
         self.client = docker.from_env()
         self.results = {}
+        self.concurrency = concurrency
+        self.warmup = warmup
+        self.cooldown = cooldown
+        self.probe_port = probe_port
+        self.run_id = uuid.uuid4().hex[:12]
+        self.events = None
+        self.clock = ClockAlignment()
+    
+    def _get_events(self) -> EventCollector:
+        if self.events is None:
+            self.events = EventCollector(self.client, self.run_id).start()
+        return self.events
+    
+    def close(self):
+        if self.events:
+            self.events.close()
+    
+    def _has_healthcheck(self, image: str) -> bool:
+        healthcheck = self.client.api.inspect_image(image).get("Config", {}).get("Healthcheck") or {}
+        return bool(healthcheck.get("Test")) and healthcheck["Test"][0] != "NONE"
+    
+    def _container_ip(self, container_id: str) -> Optional[str]:
+        networks = self.client.api.inspect_container(container_id)["NetworkSettings"].get("Networks") or {}
+        return next((net["IPAddress"] for net in networks.values() if net.get("IPAddress")), None)
+    
+    def _wait_for_port(self, host: str, deadline: float) -> Optional[float]:
+        """Monotonic time the first TCP connect to ``host``:probe_port succeeds"""
+        while time.monotonic() < deadline:
+            try:
+                with socket.create_connection((host, self.probe_port), timeout=0.1):
+                    return time.monotonic()
+            except OSError:
+                time.sleep(0.005)
+        return None
+    
+    def _follow_first_log(self, container_id: str, marks: Dict):
+        # The stream ends when the container is removed
+        try:
+            for line in self.client.api.logs(container_id, stream=True, follow=True, timestamps=True):
+                marks["first_log"] = parse_log_timestamp(line)
+                break
+        except Exception:
+            pass
+    
+    def _run_iteration(self, image: str, command: str, healthcheck: bool) -> Dict:
+        """Create, start and remove one container; return its raw timing marks.
         
+        Local marks are monotonic seconds, event marks are daemon
+        nanoseconds; _timeline() converts them once the clock offset has
+        been narrowed by every iteration of the batch.
+        """
+        events = self._get_events()
+        container_id = None
+        log_thread = None
+        marks = {"t0": time.monotonic()}
+        try:
+            container_id = self.client.api.create_container(
+                image,
+                command=command or "sleep 30",
+                labels={BENCHMARK_LABEL: self.run_id}
+            )["Id"]
+            marks["create_returned"] = time.monotonic()
+            events.watch(container_id)
+            marks["start_requested"] = time.monotonic()
+            self.client.api.start(container_id)
+            marks["start_returned"] = time.monotonic()
+            log_thread = threading.Thread(target=self._follow_first_log, args=(container_id, marks), daemon=True)
+            log_thread.start()
+            
+            # Events are delivered after the fact, so these waits do not affect the times
+            started = events.wait_for(container_id, ("start", "die"), START_TIMEOUT)
+            if started is None or started[0] != "start":
+                raise RuntimeError("container did not start")
+            # The process has been exec'd when the daemon emits start
+            marks["running"] = started[1]
+            self.clock.observe(marks["start_requested"], marks["start_returned"], started[1])
+            # Events arrive in order, so create has been seen by now
+            created = events.wait_for(container_id, ("create",), 0)
+            if created:
+                marks["created"] = created[1]
+                self.clock.observe(marks["t0"], marks["create_returned"], created[1])
+            
+            if self.probe_port:
+                # Probe the container address directly: a published port is
+                # accepted by docker-proxy before anything listens
+                host = self._container_ip(container_id)
+                if host:
+                    marks["port_open"] = self._wait_for_port(host, time.monotonic() + HEALTH_TIMEOUT)
+            
+            if healthcheck:
+                health = events.wait_for(
+                    container_id, ("health_status: healthy", "health_status: unhealthy", "die"), HEALTH_TIMEOUT
+                )
+                if health and health[0] == "health_status: healthy":
+                    marks["healthy"] = health[1]
+            return marks
+        finally:
+            if container_id:
+                # Force removal kills and removes in one call: no stop timeout, no auto-remove race
+                try:
+                    self.client.api.remove_container(container_id, force=True)
+                except docker.errors.APIError:
+                    pass
+                events.forget(container_id)
+            if log_thread:
+                log_thread.join(timeout=1)
+    
+    def _timeline(self, marks: Dict) -> Dict:
+        """Phase times of one iteration, in seconds since its create request"""
+        t0 = marks["t0"]
+        timeline = {}
+        for phase in PHASES:
+            value = marks.get(phase)
+            if value is None:
+                continue
+            # Integer marks are daemon nanoseconds, floats are local monotonic seconds
+            timeline[phase] = (self.clock.to_monotonic(value) if isinstance(value, int) else value) - t0
+        return timeline
+    
     def benchmark_image(self, image: str, iterations: int = 10, command: str = None) -> Dict:
-        """Benchmark startup time for a specific image"""
-        print(f"Benchmarking {image} ({iterations} iterations)...")
+        """Benchmark startup time for a specific image.
         
-        startup_times = []
-        ready_times = []
+        ``warmup`` discarded iterations run first (image layers and page
+        cache settle), then ``iterations`` measured ones, ``concurrency`` at
+        a time, then a ``cooldown`` pause so container teardown does not
+        overlap the next image. Each iteration's timeline (see PHASES) is
+        kept; ready time is healthy, else port_open, else running.
+        """
+        print(f"Benchmarking {image} ({iterations} iterations, concurrency {self.concurrency})...")
+        healthcheck = self._has_healthcheck(image)
+        # Start the shared event stream here, not lazily from the worker threads
+        self._get_events()
         
-        for i in range(iterations):
-            print(f"  Iteration {i+1}/{iterations}")
-            
-            # Record start time
-            start_time = time.time()
-            
+        for i in range(self.warmup):
             try:
-                # Start container
-                container = self.client.containers.run(
-                    image,
-                    command=command or "sleep 30",
-                    detach=True,
-                    remove=True
-                )
-                
-                # Wait for container to be running
-                while container.status != 'running':
-                    container.reload()
-                    time.sleep(0.01)
-                
-                startup_time = time.time() - start_time
-                startup_times.append(startup_time)
-                
-                # Check if container has health check
-                container_info = self.client.api.inspect_container(container.id)
-                if container_info.get('State', {}).get('Health'):
-                    # Wait for healthy status
-                    health_start = time.time()
-                    while True:
-                        container.reload()
-                        health = container.attrs.get('State', {}).get('Health', {})
-                        if health.get('Status') == 'healthy':
-                            ready_time = time.time() - start_time
-                            ready_times.append(ready_time)
-                            break
-                        elif health.get('Status') == 'unhealthy':
-                            ready_times.append(float('inf'))
-                            break
-                        time.sleep(0.1)
-                        if time.time() - health_start > 60:  # Timeout
-                            ready_times.append(float('inf'))
-                            break
-                else:
-                    ready_times.append(startup_time)
-                
-                # Stop container
-                container.stop(timeout=1)
-                
+                self._run_iteration(image, command, healthcheck)
             except Exception as e:
-                print(f"    Error: {e}")
-                startup_times.append(float('inf'))
-                ready_times.append(float('inf'))
-            
-            time.sleep(0.5)  # Brief pause between iterations
+                print(f"    Warm-up error: {e}")
+        
+        ready_phase = "healthy" if healthcheck else "port_open" if self.probe_port else "running"
+        raw_marks = [None] * iterations
+        wall_start = time.monotonic()
+        
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            futures = {pool.submit(self._run_iteration, image, command, healthcheck): i for i in range(iterations)}
+            for done, future in enumerate(as_completed(futures), 1):
+                i = futures[future]
+                try:
+                    raw_marks[i] = future.result()
+                    # Progress uses the offset so far; final times are recomputed below
+                    print(f"  Iteration {done}/{iterations}: {self._timeline(raw_marks[i])['running']:.3f}s")
+                except Exception as e:
+                    print(f"  Iteration {done}/{iterations}: Error: {e}")
+        
+        wall_time = time.monotonic() - wall_start
+        time.sleep(self.cooldown)
+        
+        timelines = [self._timeline(marks) if marks else {} for marks in raw_marks]
+        startup_times = [timeline.get("running", float('inf')) for timeline in timelines]
+        ready_times = [timeline.get(ready_phase, float('inf')) for timeline in timelines]
+        phase_stats = {}
+        for phase in PHASES:
+            values = [timeline[phase] for timeline in timelines if phase in timeline]
+            if values:
+                phase_stats[phase] = {
+                    "median": statistics.median(values),
+                    "mean": statistics.mean(values),
+                    "min": min(values),
+                    "max": max(values),
+                    "count": len(values)
+                }
         
         # Calculate statistics
         valid_startup = [t for t in startup_times if t != float('inf')]
@@ -105,7 +335,14 @@ class StartupBenchmark:
                 "max": max(valid_ready) if valid_ready else 0,
                 "stdev": statistics.stdev(valid_ready) if len(valid_ready) > 1 else 0
             },
-            "success_rate": len(valid_startup) / iterations * 100
+            "success_rate": len(valid_startup) / iterations * 100,
+            "ready_phase": ready_phase,
+            "timelines": timelines,
+            "phase_stats": phase_stats,
+            "clock_uncertainty": self.clock.uncertainty,
+            "concurrency": self.concurrency,
+            "warmup": self.warmup,
+            "wall_time": wall_time
         }
     
     def benchmark_multiple_images(self, images: List[str], iterations: int = 10) -> Dict:
@@ -163,7 +400,8 @@ class StartupBenchmark:
                         "median_startup": result["startup_stats"]["median"],
                         "min_startup": result["startup_stats"]["min"],
                         "max_startup": result["startup_stats"]["max"],
-                        "success_rate": result["success_rate"]
+                        "success_rate": result["success_rate"],
+                        **{f"median_{phase}": stats["median"] for phase, stats in result.get("phase_stats", {}).items()}
                     })
             
             df = pd.DataFrame(data)
@@ -177,13 +415,13 @@ class StartupBenchmark:
             report.append(f"Iterations per image: {results.get('iterations_per_image', 'N/A')}")
             report.append("")
             
-            # Sort by mean startup time
+            # Sort by median startup time (robust to outlier iterations)
             image_results = []
             for image, result in results.get("images", {}).items():
                 if "error" not in result:
                     image_results.append((image, result))
             
-            image_results.sort(key=lambda x: x[1]["startup_stats"]["mean"])
+            image_results.sort(key=lambda x: x[1]["startup_stats"]["median"])
             
             for image, result in image_results:
                 report.append(f"📦 {image}")
@@ -194,6 +432,11 @@ class StartupBenchmark:
                 report.append(f"  Min/Max: {stats['min']:.3f}s / {stats['max']:.3f}s")
                 report.append(f"  Standard deviation: {stats['stdev']:.3f}s")
                 report.append(f"  Success rate: {result['success_rate']:.1f}%")
+                phases = result.get("phase_stats")
+                if phases:
+                    report.append(f"  Timeline (median since create request, ±{result['clock_uncertainty'] * 1000:.1f}ms):")
+                    for phase, phase_stats in phases.items():
+                        report.append(f"    {phase:<16} {phase_stats['median']:.3f}s ({phase_stats['count']}/{result['iterations']})")
                 report.append("")
             
             # Summary
@@ -202,10 +445,10 @@ class StartupBenchmark:
                 slowest = image_results[-1]
                 report.append("📊 Summary")
                 report.append("-" * 20)
-                report.append(f"Fastest: {fastest[0]} ({fastest[1]['startup_stats']['mean']:.3f}s)")
-                report.append(f"Slowest: {slowest[0]} ({slowest[1]['startup_stats']['mean']:.3f}s)")
+                report.append(f"Fastest: {fastest[0]} ({fastest[1]['startup_stats']['median']:.3f}s median)")
+                report.append(f"Slowest: {slowest[0]} ({slowest[1]['startup_stats']['median']:.3f}s median)")
                 
-                speedup = slowest[1]['startup_stats']['mean'] / fastest[1]['startup_stats']['mean']
+                speedup = slowest[1]['startup_stats']['median'] / fastest[1]['startup_stats']['median']
                 report.append(f"Speed difference: {speedup:.2f}x")
             
             return "\n".join(report)
@@ -253,10 +496,24 @@ def main():
     parser.add_argument("--plot", help="Generate plot (PNG file)")
     parser.add_argument("--base-images", action="store_true", help="Benchmark common base images")
     parser.add_argument("--command", help="Custom command to run in container")
+    parser.add_argument("-c", "--concurrency", type=int, default=1,
+                        help="Iterations run at once (compare results only at equal concurrency)")
+    parser.add_argument("--warmup", type=int, default=1, help="Discarded warm-up iterations per image")
+    parser.add_argument("--cooldown", type=float, default=2.0, help="Pause in seconds after each image")
+    parser.add_argument("--probe-port", type=int,
+                        help="Time when this container port first accepts TCP connections (probes the container IP)")
+    parser.add_argument("--store", help="SQLite results database to append this run to")
+    parser.add_argument("--label", help="Label for the stored run, e.g. a branch name")
+    parser.add_argument("--baseline", help="Compare with this stored run ID or label (latest run with it); "
+                                           f"exits with {REGRESSION_EXIT} on a regression")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Relative median slowdown counted as a regression (default 0.10)")
     
     args = parser.parse_args()
+    if args.baseline and not args.store:
+        parser.error("--baseline needs --store")
     
-    benchmark = StartupBenchmark()
+    benchmark = StartupBenchmark(args.concurrency, args.warmup, args.cooldown, args.probe_port)
     
     try:
         if args.base_images:
@@ -281,12 +538,32 @@ def main():
         if args.plot:
             benchmark.plot_results(results, args.plot)
         
+        if args.store:
+            store = ResultsStore(args.store)
+            try:
+                run_id = store.save_run(results, args.label)
+                print(f"Stored as run {run_id} in {args.store}")
+                if args.baseline:
+                    try:
+                        comparison, regressed = check_regressions(store, run_id, args.baseline,
+                                                                  threshold=args.threshold)
+                    except LookupError as e:
+                        print(f"Comparison failed: {e}")
+                        sys.exit(1)
+                    print(comparison)
+                    if regressed:
+                        sys.exit(REGRESSION_EXIT)
+            finally:
+                store.close()
+        
     except KeyboardInterrupt:
         print("\nBenchmark interrupted by user")
         sys.exit(1)
     except Exception as e:
         print(f"Benchmark failed: {e}")
         sys.exit(1)
+    finally:
+        benchmark.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,319 @@
+# Location: utilities/performance/benchmarks/startup_results.py
+# Historical results store and regression checks for the startup benchmark
+#
+# Runs of container-startup-times.py are kept in SQLite, one row per
+# iteration and metric (startup, ready and each timeline phase). A run is
+# compared to a baseline run image by image on medians: a bootstrap gives
+# the confidence interval of the relative change and a Mann-Whitney U test
+# its significance, so a few slow outlier iterations neither cause nor hide
+# a regression.
+
+import argparse
+import json
+import math
+import sqlite3
+import sys
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Exit status of the CLI when a regression is found (1 is any other failure,
+# including a baseline that cannot be found)
+REGRESSION_EXIT = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    label TEXT,
+    concurrency INTEGER,
+    metadata TEXT
+);
+CREATE TABLE IF NOT EXISTS samples (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    image TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    value REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_samples_run ON samples(run_id, image, metric);
+CREATE INDEX IF NOT EXISTS idx_runs_label ON runs(label, id);
+"""
+
+class ResultsStore:
+    """SQLite store of benchmark runs"""
+
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def save_run(self, results: Dict, label: str = None) -> int:
+        """Store the output of benchmark_multiple_images(); return the run ID"""
+        images = {image: result for image, result in results.get("images", {}).items() if "error" not in result}
+        concurrency = next((result.get("concurrency") for result in images.values()), None)
+        metadata = {
+            "iterations_per_image": results.get("iterations_per_image"),
+            "success_rate": {image: result["success_rate"] for image, result in images.items()},
+            "failed": [image for image, result in results.get("images", {}).items() if "error" in result],
+        }
+
+        rows = []
+        for image, result in images.items():
+            for metric, key in (("startup", "startup_times"), ("ready", "ready_times")):
+                rows += [(image, metric, value) for value in result.get(key, []) if math.isfinite(value)]
+            for timeline in result.get("timelines", []):
+                rows += [(image, phase, value) for phase, value in timeline.items()]
+
+        with self.conn:
+            run_id = self.conn.execute(
+                "INSERT INTO runs (timestamp, label, concurrency, metadata) VALUES (?, ?, ?, ?)",
+                (results.get("timestamp") or datetime.now().isoformat(), label, concurrency, json.dumps(metadata))
+            ).lastrowid
+            self.conn.executemany(
+                "INSERT INTO samples (run_id, image, metric, value) VALUES (?, ?, ?, ?)",
+                [(run_id, *row) for row in rows]
+            )
+        return run_id
+
+    def runs(self, label: str = None, limit: int = 20) -> List[Dict]:
+        """Most recent runs first"""
+        query = "SELECT id, timestamp, label, concurrency FROM runs"
+        params = ()
+        if label is not None:
+            query += " WHERE label = ?"
+            params = (label,)
+        rows = self.conn.execute(query + " ORDER BY id DESC LIMIT ?", params + (limit,))
+        return [dict(zip(("id", "timestamp", "label", "concurrency"), row)) for row in rows]
+
+    def resolve(self, ref: str, before: int = None) -> Optional[int]:
+        """Run ID from a numeric ID, or the latest run with that label (older than ``before``)"""
+        if str(ref).isdigit():
+            row = self.conn.execute("SELECT id FROM runs WHERE id = ?", (int(ref),)).fetchone()
+        else:
+            row = self.conn.execute(
+                "SELECT id FROM runs WHERE label = ? AND id < ? ORDER BY id DESC LIMIT 1",
+                (ref, before if before is not None else sys.maxsize)
+            ).fetchone()
+        return row[0] if row else None
+
+    def run_info(self, run_id: int) -> Dict:
+        row = self.conn.execute(
+            "SELECT id, timestamp, label, concurrency, metadata FROM runs WHERE id = ?", (run_id,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(f"No run {run_id}")
+        info = dict(zip(("id", "timestamp", "label", "concurrency"), row[:4]))
+        info["metadata"] = json.loads(row[4] or "{}")
+        return info
+
+    def samples(self, run_id: int, metric: str) -> Dict[str, np.ndarray]:
+        """Per-image values of one metric in a run"""
+        values = {}
+        for image, value in self.conn.execute(
+            "SELECT image, value FROM samples WHERE run_id = ? AND metric = ?", (run_id, metric)
+        ):
+            values.setdefault(image, []).append(value)
+        return {image: np.array(image_values) for image, image_values in values.items()}
+
+def rank(values: np.ndarray) -> np.ndarray:
+    """1-based ranks, ties sharing their average rank"""
+    _, inverse, counts = np.unique(values, return_inverse=True, return_counts=True)
+    average = np.cumsum(counts) - (counts - 1) / 2
+    return average[inverse]
+
+def mann_whitney(a, b) -> Tuple[float, float]:
+    """Two-sided Mann-Whitney U test: (U of ``a``, p-value).
+
+    Normal approximation with tie and continuity corrections, which is
+    close to exact from about eight samples per group.
+    """
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    n1, n2 = len(a), len(b)
+    combined = np.concatenate([a, b])
+    u = float(rank(combined)[:n1].sum() - n1 * (n1 + 1) / 2)
+
+    n = n1 + n2
+    _, counts = np.unique(combined, return_counts=True)
+    ties = float((counts ** 3 - counts).sum())
+    sigma = math.sqrt(n1 * n2 / 12 * ((n + 1) - ties / (n * (n - 1))))
+    if sigma == 0:
+        return u, 1.0
+    diff = u - n1 * n2 / 2
+    z = (diff - math.copysign(0.5, diff)) / sigma if diff else 0.0
+    return u, math.erfc(abs(z) / math.sqrt(2))
+
+def bootstrap_ci(values, statistic=np.median, resamples: int = 5000,
+                 confidence: float = 0.95, seed: int = 0) -> Tuple[float, float]:
+    """Percentile bootstrap confidence interval of ``statistic``"""
+    values = np.asarray(values, dtype=np.float64)
+    rng = np.random.default_rng(seed)
+    samples = values[rng.integers(0, len(values), (resamples, len(values)))]
+    estimates = statistic(samples, axis=1)
+    tail = (1 - confidence) / 2 * 100
+    return float(np.percentile(estimates, tail)), float(np.percentile(estimates, 100 - tail))
+
+def relative_change_ci(baseline, current, resamples: int = 5000,
+                       confidence: float = 0.95, seed: int = 0) -> Tuple[float, float]:
+    """Bootstrap interval of median(current) / median(baseline) - 1"""
+    baseline = np.asarray(baseline, dtype=np.float64)
+    current = np.asarray(current, dtype=np.float64)
+    rng = np.random.default_rng(seed)
+    base = np.median(baseline[rng.integers(0, len(baseline), (resamples, len(baseline)))], axis=1)
+    cur = np.median(current[rng.integers(0, len(current), (resamples, len(current)))], axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        changes = cur / base - 1
+    tail = (1 - confidence) / 2 * 100
+    return float(np.percentile(changes, tail)), float(np.percentile(changes, 100 - tail))
+
+def compare_samples(baseline, current, threshold: float = 0.10, alpha: float = 0.05) -> Dict:
+    """Compare two samples of one metric (lower is better).
+
+    A regression is a median slowdown larger than ``threshold`` (relative)
+    that is also significant at ``alpha``; an improvement is the mirror
+    image. Anything else is reported unchanged.
+    """
+    baseline_median = float(np.median(baseline))
+    current_median = float(np.median(current))
+    change = current_median / baseline_median - 1 if baseline_median else float("inf")
+    low, high = relative_change_ci(baseline, current, confidence=1 - alpha)
+    _, p_value = mann_whitney(current, baseline)
+
+    verdict = "unchanged"
+    if p_value < alpha and change > threshold:
+        verdict = "regression"
+    elif p_value < alpha and change < -threshold:
+        verdict = "improvement"
+
+    return {
+        "baseline_median": baseline_median,
+        "current_median": current_median,
+        "baseline_ci": bootstrap_ci(baseline, confidence=1 - alpha),
+        "current_ci": bootstrap_ci(current, confidence=1 - alpha),
+        "change": change,
+        "change_ci": (low, high),
+        "p_value": p_value,
+        "baseline_n": len(baseline),
+        "current_n": len(current),
+        "verdict": verdict,
+    }
+
+def compare_runs(store: ResultsStore, current_id: int, baseline_id: int, metrics=("startup",),
+                 threshold: float = 0.10, alpha: float = 0.05, min_samples: int = 5) -> List[Dict]:
+    """Compare every image present in both runs, for each metric"""
+    comparisons = []
+    for metric in metrics:
+        baseline = store.samples(baseline_id, metric)
+        current = store.samples(current_id, metric)
+        for image in sorted(set(baseline) & set(current)):
+            if min(len(baseline[image]), len(current[image])) < min_samples:
+                comparisons.append({"image": image, "metric": metric, "verdict": "insufficient data",
+                                    "baseline_n": len(baseline[image]), "current_n": len(current[image])})
+                continue
+            result = compare_samples(baseline[image], current[image], threshold, alpha)
+            comparisons.append({"image": image, "metric": metric, **result})
+    return comparisons
+
+def format_comparison(comparisons: List[Dict], current: Dict, baseline: Dict) -> str:
+    """Text table of compare_runs() output"""
+    report = []
+    report.append(f"📈 Startup comparison: run {current['id']} vs baseline run {baseline['id']}"
+                  f" ({baseline.get('label') or 'unlabelled'})")
+    report.append("=" * 50)
+    if current.get("concurrency") != baseline.get("concurrency"):
+        report.append(f"⚠️  Concurrency differs ({current.get('concurrency')} vs {baseline.get('concurrency')}); "
+                      f"times are not directly comparable")
+
+    for row in comparisons:
+        report.append(f"📦 {row['image']} [{row['metric']}]")
+        if row["verdict"] == "insufficient data":
+            report.append(f"  Insufficient data ({row['current_n']} vs {row['baseline_n']} samples)")
+            continue
+        low, high = row["change_ci"]
+        report.append(f"  Median: {row['current_median']:.3f}s vs {row['baseline_median']:.3f}s "
+                      f"({row['change']:+.1%}, CI {low:+.1%} to {high:+.1%})")
+        report.append(f"  Mann-Whitney p = {row['p_value']:.4f} (n = {row['current_n']} / {row['baseline_n']})")
+        marker = {"regression": "❌", "improvement": "✅"}.get(row["verdict"], "➖")
+        report.append(f"  {marker} {row['verdict'].upper()}")
+
+    regressions = [row for row in comparisons if row["verdict"] == "regression"]
+    report.append("")
+    report.append(f"Regressions: {len(regressions)} of {len(comparisons)} comparisons")
+    return "\n".join(report)
+
+def check_regressions(store: ResultsStore, current_id: int, baseline_ref: str, metrics=("startup",),
+                      threshold: float = 0.10, alpha: float = 0.05) -> Tuple[str, bool]:
+    """Compare a run against a baseline reference; return (report, regressed).
+
+    Raises LookupError when the baseline cannot be resolved or shares no
+    image with the run, so a misspelled baseline fails a CI gate instead
+    of passing it.
+    """
+    baseline_id = store.resolve(baseline_ref, before=current_id)
+    if baseline_id is None:
+        raise LookupError(f"No baseline run found for '{baseline_ref}'")
+    comparisons = compare_runs(store, current_id, baseline_id, metrics, threshold, alpha)
+    if not comparisons:
+        raise LookupError(f"Run {current_id} and baseline run {baseline_id} have no images in common")
+    report = format_comparison(comparisons, store.run_info(current_id), store.run_info(baseline_id))
+    return report, any(row["verdict"] == "regression" for row in comparisons)
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup benchmark results store and regression check")
+    parser.add_argument("--db", default="startup_results.db", help="SQLite results database")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = subparsers.add_parser("import", help="Store a JSON report from container-startup-times.py")
+    import_parser.add_argument("results", help="JSON results file (-f json)")
+    import_parser.add_argument("--label", help="Label for the run, e.g. a branch name")
+
+    list_parser = subparsers.add_parser("list", help="List stored runs")
+    list_parser.add_argument("--label", help="Only runs with this label")
+    list_parser.add_argument("-n", "--limit", type=int, default=20)
+
+    compare_parser = subparsers.add_parser("compare", help="Compare a run with a baseline")
+    compare_parser.add_argument("--run", default=None, help="Run ID or label (default: latest run)")
+    compare_parser.add_argument("--baseline", required=True, help="Baseline run ID or label")
+    compare_parser.add_argument("--metric", action="append", help="Metric to compare (repeatable, default startup)")
+    compare_parser.add_argument("--threshold", type=float, default=0.10,
+                                help="Relative median slowdown counted as a regression (default 0.10)")
+    compare_parser.add_argument("--alpha", type=float, default=0.05, help="Significance level")
+
+    args = parser.parse_args()
+    store = ResultsStore(args.db)
+
+    try:
+        if args.command == "import":
+            with open(args.results) as f:
+                run_id = store.save_run(json.load(f), args.label)
+            print(f"Stored run {run_id}")
+
+        elif args.command == "list":
+            for run in store.runs(args.label, args.limit):
+                print(f"{run['id']:>5}  {run['timestamp']}  {run['label'] or '-':<20} "
+                      f"concurrency={run['concurrency']}")
+
+        else:
+            runs = store.runs(limit=1)
+            current_id = store.resolve(args.run) if args.run else (runs[0]["id"] if runs else None)
+            if current_id is None:
+                print("No run to compare")
+                sys.exit(1)
+            try:
+                report, regressed = check_regressions(store, current_id, args.baseline,
+                                                      args.metric or ["startup"], args.threshold, args.alpha)
+            except LookupError as e:
+                print(f"Comparison failed: {e}")
+                sys.exit(1)
+            print(report)
+            if regressed:
+                sys.exit(REGRESSION_EXIT)
+    finally:
+        store.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# Location: utilities/performance/benchmarks/test_startup_results.py
+# Tests for the startup results statistics and the SQLite results store
+
+import numpy as np
+import pytest
+
+import startup_results
+
+
+def test_rank_averages_ties():
+    ranks = startup_results.rank(np.array([10.0, 20.0, 20.0, 5.0, 20.0, 30.0]))
+    np.testing.assert_array_equal(ranks, [2.0, 4.0, 4.0, 1.0, 4.0, 6.0])
+
+
+def test_mann_whitney_separated_samples():
+    # Normal approximation with continuity correction: z = (0 - 4.5 + 0.5) / sqrt(9 * 7 / 12)
+    u, p = startup_results.mann_whitney([1, 2, 3], [4, 5, 6])
+    assert u == 0.0
+    assert p == pytest.approx(0.080856, rel=1e-4)
+    u, p = startup_results.mann_whitney([4, 5, 6], [1, 2, 3])
+    assert u == 9.0
+    assert p == pytest.approx(0.080856, rel=1e-4)
+
+
+def test_mann_whitney_tie_correction():
+    # Ranks of a: 1, 3, 3, 5.5 -> U = 2.5; tie term 24 + 6 + 6 = 36
+    u, p = startup_results.mann_whitney([1, 2, 2, 3], [2, 3, 4, 5, 5])
+    assert u == 2.5
+    assert p == pytest.approx(0.078546, rel=1e-4)
+
+
+def test_mann_whitney_identical_samples():
+    assert startup_results.mann_whitney([1.0] * 5, [1.0] * 6) == (15.0, 1.0)
+    _, p = startup_results.mann_whitney(np.arange(10), np.arange(10))
+    assert p == pytest.approx(1.0)
+
+
+def test_mann_whitney_large_shift():
+    u, p = startup_results.mann_whitney(np.arange(30), np.arange(30) + 29)
+    assert u == 0.5
+    assert p < 1e-10
+
+
+def test_compare_samples_verdicts():
+    rng = np.random.default_rng(0)
+    baseline = rng.normal(1.0, 0.02, 20)
+    assert startup_results.compare_samples(baseline, baseline * 1.5)["verdict"] == "regression"
+    assert startup_results.compare_samples(baseline, baseline * 0.5)["verdict"] == "improvement"
+    assert startup_results.compare_samples(baseline, baseline * 1.02)["verdict"] == "unchanged"
+
+
+def results(images, scale=1.0):
+    return {
+        "timestamp": "2024-01-01T00:00:00",
+        "iterations_per_image": 10,
+        "images": {
+            image: {
+                "concurrency": 1,
+                "success_rate": 100.0,
+                "startup_times": [scale * (0.5 + 0.01 * i) for i in range(10)],
+                "ready_times": [],
+                "timelines": [],
+            }
+            for image in images
+        },
+    }
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = startup_results.ResultsStore(str(tmp_path / "results.db"))
+    yield store
+    store.close()
+
+
+def test_store_round_trip(store):
+    run_id = store.save_run(results(["nginx"]), label="main")
+    assert store.resolve("main") == run_id
+    assert store.resolve(str(run_id)) == run_id
+    assert store.runs()[0]["label"] == "main"
+    np.testing.assert_allclose(store.samples(run_id, "startup")["nginx"], results(["nginx"])["images"]["nginx"]["startup_times"])
+
+
+def test_check_regressions(store):
+    baseline_id = store.save_run(results(["nginx"]), label="main")
+    same_id = store.save_run(results(["nginx"]), label="branch")
+    slow_id = store.save_run(results(["nginx"], scale=2.0), label="branch")
+    _, regressed = startup_results.check_regressions(store, same_id, "main")
+    assert not regressed
+    report, regressed = startup_results.check_regressions(store, slow_id, str(baseline_id))
+    assert regressed
+    assert "REGRESSION" in report
+
+
+def test_check_regressions_unresolved_baseline(store):
+    run_id = store.save_run(results(["nginx"]), label="branch")
+    with pytest.raises(LookupError):
+        startup_results.check_regressions(store, run_id, "mian")
+    # The latest 'branch' run older than run_id does not exist either
+    with pytest.raises(LookupError):
+        startup_results.check_regressions(store, run_id, "branch")
+
+
+def test_check_regressions_no_common_images(store):
+    store.save_run(results(["nginx"]), label="main")
+    run_id = store.save_run(results(["redis"]), label="branch")
+    with pytest.raises(LookupError):
+        startup_results.check_regressions(store, run_id, "main")
@@ -0,0 +1,126 @@
+# Location: utilities/performance/profiling/container_stats.py
+# Shared Docker stats helpers for the profiling tools
+
+import threading
+import time
+
+
+def online_cpus(cpu_stats):
+    """Number of CPUs the usage counters span.
+
+    ``percpu_usage`` is absent on cgroup v2 hosts, so prefer ``online_cpus``.
+    """
+    return (cpu_stats.get('online_cpus')
+            or len(cpu_stats.get('cpu_usage', {}).get('percpu_usage') or [])
+            or 1)
+
+
+def cpu_delta(prev, cur):
+    """CPU usage between two stats frames (dicts from the stats API)"""
+    prev_cpu, cur_cpu = prev['cpu_stats'], cur['cpu_stats']
+    cpu_delta = cur_cpu['cpu_usage']['total_usage'] - prev_cpu['cpu_usage']['total_usage']
+    system_delta = cur_cpu.get('system_cpu_usage', 0) - prev_cpu.get('system_cpu_usage', 0)
+
+    cpu_percent = 0.0
+    if system_delta > 0 and cpu_delta > 0:
+        cpu_percent = (cpu_delta / system_delta) * online_cpus(cur_cpu) * 100.0
+
+    prev_throttling = prev_cpu.get('throttling_data', {})
+    cur_throttling = cur_cpu.get('throttling_data', {})
+    return {
+        'cpu_percent': cpu_percent,
+        'throttling_periods': cur_throttling.get('periods', 0) - prev_throttling.get('periods', 0),
+        'throttling_throttled_periods': (cur_throttling.get('throttled_periods', 0)
+                                         - prev_throttling.get('throttled_periods', 0)),
+    }
+
+
+def memory_snapshot(frame):
+    """Memory figures from one stats frame"""
+    memory_stats = frame.get('memory_stats', {})
+    stats = memory_stats.get('stats', {})
+    usage = memory_stats.get('usage', 0)
+    limit = memory_stats.get('limit', 0)
+    return {
+        'usage': usage,
+        'limit': limit,
+        'percent': (usage / limit) * 100 if limit > 0 else 0,
+        # cgroup v1 reports 'cache'/'rss', cgroup v2 'file'/'anon'
+        'cache': stats.get('cache', stats.get('file', 0)),
+        'rss': stats.get('rss', stats.get('anon', 0)),
+        'swap': stats.get('swap', 0),
+    }
+
+
+class ContainerStatsStream:
+    """Streaming stats for one container over a single long-lived connection.
+
+    ``container.stats(stream=False)`` makes the daemon collect two samples a
+    second apart for every call. The streaming endpoint instead pushes one
+    cumulative frame per second on one HTTP connection; a background thread
+    decodes the frames as they arrive and keeps the latest, and callers
+    compute deltas between any two frames they have seen. The daemon's
+    frame rate (about 1 Hz) is the resolution limit of this source.
+    """
+
+    def __init__(self, client, container_id):
+        self.client = client
+        self.container_id = container_id
+        self.frames = 0
+        self.error = None
+        self._latest = None
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name=f'stats-{self.container_id[:12]}',
+                                            daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        try:
+            for frame in self.client.api.stats(self.container_id, stream=True, decode=True):
+                if not self._running:
+                    break
+                # A stopped container keeps streaming frames without CPU data
+                if not frame.get('cpu_stats', {}).get('cpu_usage'):
+                    continue
+                with self._cond:
+                    self.frames += 1
+                    self._latest = (self.frames, time.monotonic(), frame)
+                    self._cond.notify_all()
+        except Exception as e:
+            self.error = e
+        finally:
+            with self._cond:
+                self._running = False
+                self._cond.notify_all()
+
+    @property
+    def alive(self):
+        return self._running
+
+    def latest(self):
+        """Return (sequence, monotonic_time, frame) of the newest frame, or None"""
+        with self._cond:
+            return self._latest
+
+    def wait_for_frame(self, after=0, timeout=5.0):
+        """Block until a frame newer than sequence ``after`` arrives"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._running and (self._latest is None or self._latest[0] <= after):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return self._latest
+
+    def stop(self):
+        # The reader thread notices on the next frame; it is a daemon thread
+        # so an idle connection never blocks interpreter exit.
+        self._running = False
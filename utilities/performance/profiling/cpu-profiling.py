@@ -3,7 +3,6 @@
 
 import psutil
 import time
-import json
 import argparse
 import threading
 import docker
@@ -11,13 +10,42 @@ from collections import defaultdict
 from datetime import datetime
 import sys
 
+from cgroup_stats import cgroup_delta, open_container_sampler
+from container_stats import ContainerStatsStream, cpu_delta
+from timeseries import TimeSeriesBuffer
+
+CONTAINER_COLUMNS = {
+    'cpu_percent': ('f', 'mean'),
+    'cpu_percent_max': ('f', 'max'),
+    'throttling_periods': ('I', 'sum'),
+    'throttling_throttled_periods': ('I', 'sum'),
+    'throttled_usec': ('Q', 'sum'),
+    'cpu_pressure_percent': ('f', 'mean'),
+}
+
+SYSTEM_COLUMNS = {
+    'cpu_percent': ('f', 'mean'),
+    'cpu_percent_max': ('f', 'max'),
+    'load_1min': 'f',
+    'load_5min': 'f',
+    'load_15min': 'f',
+}
+
 class CPUProfiler:
-    def __init__(self, container_name=None):
+    def __init__(self, container_name=None, backend='auto', keep_raw=None, bucket=60.0):
         self.container_name = container_name
         self.client = docker.from_env() if container_name else None
         self.container = None
         self.running = False
-        self.stats_history = []
+        if container_name:
+            columns = CONTAINER_COLUMNS
+        else:
+            columns = dict(SYSTEM_COLUMNS, **{f'core_{i}': 'f' for i in range(psutil.cpu_count(logical=True))})
+        self.stats_history = TimeSeriesBuffer(columns, keep_raw, bucket)
+        self.stream = None
+        self._last_frame = None
+        self.cgroup = None
+        self._last_sample = None
         
         if container_name:
             try:
@@ -25,10 +53,16 @@ class CPUProfiler:
             except docker.errors.NotFound:
                 print(f"Container '{container_name}' not found")
                 sys.exit(1)
+            
+            if backend != 'api':
+                self.cgroup = open_container_sampler(self.container)
+                if self.cgroup is None and backend == 'cgroup':
+                    print("No cgroup v2 directory found for the container")
+                    sys.exit(1)
     
     def get_system_cpu_stats(self):
-        """Get system-wide CPU statistics"""
-        cpu_percent = psutil.cpu_percent(interval=1)
+        """Get system-wide CPU statistics since the previous call"""
+        cpu_percent = psutil.cpu_percent(interval=None)
         cpu_per_core = psutil.cpu_percent(interval=None, percpu=True)
         load_avg = psutil.getloadavg()
         
@@ -46,102 +80,173 @@ class CPUProfiler:
         }
     
     def get_container_cpu_stats(self):
-        """Get container CPU statistics"""
+        """Get container CPU statistics since the previous call.
+        
+        Deltas are taken between reads of the container's cgroup files when
+        they are visible, otherwise between frames of the streaming stats
+        connection, so each sample covers exactly the time since the last
+        one. Returns None when no new frame has arrived yet.
+        """
         if not self.container:
             return None
         
+        if self.cgroup:
+            return self._get_cgroup_cpu_stats()
+        
+        if self.stream is None:
+            self.stream = ContainerStatsStream(self.client, self.container.id).start()
+            self._last_frame = self.stream.wait_for_frame()
+        
+        latest = self.stream.latest()
+        if latest is None or self._last_frame is None or latest[0] == self._last_frame[0]:
+            if not self.stream.alive:
+                print(f"Stats stream ended: {self.stream.error or 'container stopped'}")
+                self.running = False
+            return None
+        
         try:
-            stats = self.container.stats(stream=False)
-            cpu_stats = stats['cpu_stats']
-            precpu_stats = stats['precpu_stats']
-            
-            cpu_delta = cpu_stats['cpu_usage']['total_usage'] - precpu_stats['cpu_usage']['total_usage']
-            system_delta = cpu_stats['system_cpu_usage'] - precpu_stats['system_cpu_usage']
-            
-            cpu_percent = 0.0
-            if system_delta > 0 and cpu_delta > 0:
-                cpu_percent = (cpu_delta / system_delta) * len(cpu_stats['cpu_usage']['percpu_usage']) * 100.0
-            
-            return {
-                'timestamp': datetime.now().isoformat(),
-                'type': 'container',
-                'container_name': self.container_name,
-                'cpu_percent': cpu_percent,
-                'throttling_periods': cpu_stats.get('throttling_data', {}).get('periods', 0),
-                'throttling_throttled_periods': cpu_stats.get('throttling_data', {}).get('throttled_periods', 0)
-            }
-        except Exception as e:
+            delta = cpu_delta(self._last_frame[2], latest[2])
+        except (KeyError, TypeError) as e:
             print(f"Error getting container stats: {e}")
             return None
+        self._last_frame = latest
+        
+        return {
+            'timestamp': datetime.now().isoformat(),
+            'type': 'container',
+            'container_name': self.container_name,
+            **delta
+        }
+    
+    def _get_cgroup_cpu_stats(self):
+        """Container CPU statistics read from its cgroup since the previous call"""
+        try:
+            sample = self.cgroup.sample()
+        except OSError as e:
+            print(f"Cgroup read failed ({e}), container stopped?")
+            self.running = False
+            return None
+        
+        previous, self._last_sample = self._last_sample, sample
+        if previous is None:
+            return None
+        
+        return {
+            'timestamp': datetime.now().isoformat(),
+            'type': 'container',
+            'container_name': self.container_name,
+            **cgroup_delta(previous, sample)
+        }
+    
+    def record(self, stats):
+        """Store one sample from get_*_cpu_stats() in the columnar history"""
+        if stats['type'] == 'system':
+            self.stats_history.append(
+                time.time(),
+                cpu_percent=stats['cpu_percent_total'],
+                cpu_percent_max=stats['cpu_percent_total'],
+                load_1min=stats['load_average']['1min'],
+                load_5min=stats['load_average']['5min'],
+                load_15min=stats['load_average']['15min'],
+                **{f'core_{i}': value for i, value in enumerate(stats['cpu_percent_per_core'])}
+            )
+        else:
+            values = {name: stats.get(name, 0) for name in CONTAINER_COLUMNS}
+            values['cpu_percent_max'] = stats['cpu_percent']
+            self.stats_history.append(time.time(), **values)
     
     def start_profiling(self, interval=1.0, duration=60):
         """Start CPU profiling"""
         print(f"Starting CPU profiling for {duration} seconds...")
         self.running = True
         
-        start_time = time.time()
-        while self.running and (time.time() - start_time) < duration:
+        # Prime the counters the first sample is measured against
+        if self.container_name:
+            self.get_container_cpu_stats()
+            if interval < 1.0 and not self.cgroup:
+                print("Note: Docker streams container stats about once per second; "
+                      "shorter intervals only record new frames")
+        else:
+            psutil.cpu_percent(interval=None)
+        
+        start_time = time.monotonic()
+        next_sample = start_time + interval
+        while self.running and (time.monotonic() - start_time) < duration:
+            # Sleep to a fixed schedule so sampling cost does not add drift
+            time.sleep(max(0.0, next_sample - time.monotonic()))
+            next_sample += interval
+            
             if self.container_name:
                 stats = self.get_container_cpu_stats()
             else:
                 stats = self.get_system_cpu_stats()
             
             if stats:
-                self.stats_history.append(stats)
+                self.record(stats)
                 print(f"CPU: {stats.get('cpu_percent_total', stats.get('cpu_percent', 0)):.1f}%")
-            
-            time.sleep(interval)
         
         self.running = False
+        if self.stream:
+            self.stream.stop()
+        if self.cgroup:
+            self.cgroup.close()
         print("Profiling completed!")
     
     def save_results(self, filename):
-        """Save profiling results to JSON file"""
-        with open(filename, 'w') as f:
-            json.dump(self.stats_history, f, indent=2)
-        print(f"Results saved to {filename}")
+        """Save profiling results (.npz for compressed columns, otherwise JSON)"""
+        metadata = {'target': self.container_name or 'system'}
+        fmt = self.stats_history.save(filename, metadata)
+        print(f"Results saved to {filename} ({fmt})")
     
     def generate_report(self):
         """Generate profiling report"""
-        if not self.stats_history:
+        if not len(self.stats_history):
             print("No profiling data available")
             return
         
-        cpu_values = []
-        for stat in self.stats_history:
-            if 'cpu_percent_total' in stat:
-                cpu_values.append(stat['cpu_percent_total'])
-            elif 'cpu_percent' in stat:
-                cpu_values.append(stat['cpu_percent'])
+        cpu_values = self.stats_history.column('cpu_percent')
+        samples = self.stats_history.column('samples')
         
-        if cpu_values:
-            avg_cpu = sum(cpu_values) / len(cpu_values)
-            max_cpu = max(cpu_values)
-            min_cpu = min(cpu_values)
+        if len(cpu_values):
+            # Downsampled rows are bucket means, weighted by the samples they cover
+            avg_cpu = float((cpu_values * samples).sum() / samples.sum())
+            max_cpu = float(self.stats_history.column('cpu_percent_max').max())
+            min_cpu = float(cpu_values.min())
             
             print(f"\n📊 CPU Profiling Report")
             print(f"=======================")
             print(f"Target: {'System' if not self.container_name else f'Container {self.container_name}'}")
-            print(f"Duration: {len(self.stats_history)} samples")
+            print(f"Duration: {int(samples.sum())} samples")
             print(f"Average CPU: {avg_cpu:.2f}%")
             print(f"Peak CPU: {max_cpu:.2f}%")
             print(f"Minimum CPU: {min_cpu:.2f}%")
             
-            if self.container_name and any('throttling_throttled_periods' in s for s in self.stats_history):
-                throttled = sum(s.get('throttling_throttled_periods', 0) for s in self.stats_history)
+            if self.container_name:
+                throttled = int(self.stats_history.column('throttling_throttled_periods').sum())
                 print(f"CPU Throttling Events: {throttled}")
+            
+            if self.cgroup:
+                pressure = self.stats_history.column('cpu_pressure_percent')
+                print(f"CPU Pressure (some): {float((pressure * samples).sum() / samples.sum()):.2f}% avg, "
+                      f"{float(pressure.max()):.2f}% peak")
 
 def main():
     parser = argparse.ArgumentParser(description="CPU profiling tool for Docker containers")
     parser.add_argument("-c", "--container", help="Container name or ID to profile")
     parser.add_argument("-d", "--duration", type=int, default=60, help="Profiling duration in seconds")
     parser.add_argument("-i", "--interval", type=float, default=1.0, help="Sampling interval in seconds")
-    parser.add_argument("-o", "--output", help="Output JSON file")
+    parser.add_argument("-o", "--output", help="Output file (.npz for compressed columns, otherwise JSON)")
+    parser.add_argument("--keep-raw", type=float,
+                        help="Keep full resolution for this many recent seconds; average older samples")
+    parser.add_argument("--bucket", type=float, default=60.0, help="Bucket size in seconds for older samples")
+    parser.add_argument("--backend", choices=["auto", "cgroup", "api"], default="auto",
+                        help="Container stats source: cgroup v2 files (fast, 10-100 Hz), Docker stats API, "
+                             "or cgroup with API fallback")
     parser.add_argument("--report-only", action="store_true", help="Generate report from existing data")
     
     args = parser.parse_args()
     
-    profiler = CPUProfiler(args.container)
+    profiler = CPUProfiler(args.container, args.backend, args.keep_raw, args.bucket)
     
     if not args.report_only:
         try:
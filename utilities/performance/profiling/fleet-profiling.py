@@ -0,0 +1,250 @@
+# Location: utilities/performance/profiling/fleet-profiling.py
+# CPU and memory profiling for many Docker containers at once
+#
+# Profiles every container matching a selector (labels, a compose project,
+# or all running containers) from one process and one Docker client. Each
+# container gets a single streaming stats connection, containers that start
+# or stop during the run are picked up from the daemon's event stream, and
+# all samples go to one merged time series:
+#
+#   python fleet-profiling.py --compose-project shop -d 300 -o shop.csv
+#   python fleet-profiling.py -l tier=backend -l env=staging -o backend.csv
+#   python fleet-profiling.py --all -d 60
+
+import argparse
+import csv
+import json
+import sys
+import threading
+import time
+from datetime import datetime
+
+import docker
+
+from container_stats import ContainerStatsStream, cpu_delta, memory_snapshot
+
+COMPOSE_PROJECT_LABEL = 'com.docker.compose.project'
+
+FIELDS = [
+    'timestamp', 'container_id', 'container_name', 'cpu_percent',
+    'throttled_periods', 'memory_usage', 'memory_limit', 'memory_percent',
+]
+
+
+class ContainerSummary:
+    """Running aggregates for the report, so memory stays flat over long runs"""
+
+    __slots__ = ('name', 'samples', 'cpu_sum', 'cpu_max', 'memory_max', 'memory_limit', 'throttled')
+
+    def __init__(self, name):
+        self.name = name
+        self.samples = 0
+        self.cpu_sum = 0.0
+        self.cpu_max = 0.0
+        self.memory_max = 0
+        self.memory_limit = 0
+        self.throttled = 0
+
+    def add(self, row):
+        self.samples += 1
+        self.cpu_sum += row['cpu_percent']
+        self.cpu_max = max(self.cpu_max, row['cpu_percent'])
+        self.memory_max = max(self.memory_max, row['memory_usage'])
+        self.memory_limit = row['memory_limit']
+        self.throttled += row['throttled_periods']
+
+
+class SeriesWriter:
+    """Appends samples to a CSV or JSON-lines file as they are taken"""
+
+    def __init__(self, filename):
+        self.file = open(filename, 'w', newline='')
+        self.jsonl = filename.endswith(('.jsonl', '.json'))
+        self.csv = None if self.jsonl else csv.DictWriter(self.file, fieldnames=FIELDS)
+        if self.csv:
+            self.csv.writeheader()
+
+    def write(self, rows):
+        if self.csv:
+            self.csv.writerows(rows)
+        else:
+            for row in rows:
+                self.file.write(json.dumps(row, separators=(',', ':')) + '\n')
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class FleetProfiler:
+    def __init__(self, labels=None, compose_project=None, all_containers=False, client=None):
+        self.labels = list(labels or [])
+        if compose_project:
+            self.labels.append(f'{COMPOSE_PROJECT_LABEL}={compose_project}')
+        if not self.labels and not all_containers:
+            raise ValueError("Select containers with labels, a compose project or --all")
+
+        self.client = client or docker.from_env()
+        self.running = False
+        self.streams = {}       # container id -> ContainerStatsStream
+        self.names = {}         # container id -> name
+        self.last_frames = {}   # container id -> frame the next delta is taken from
+        self.summaries = {}     # container id -> ContainerSummary
+        self.events_seen = 0
+        self._lock = threading.Lock()
+
+    def _filters(self):
+        return {'label': self.labels} if self.labels else {}
+
+    def _add(self, container):
+        with self._lock:
+            if container.id in self.streams and self.streams[container.id].alive:
+                return
+            self.names[container.id] = container.name
+            self.streams[container.id] = ContainerStatsStream(self.client, container.id).start()
+            self.last_frames.pop(container.id, None)
+            self.summaries.setdefault(container.id, ContainerSummary(container.name))
+        print(f"+ {container.name}")
+
+    def _remove(self, container_id):
+        with self._lock:
+            stream = self.streams.pop(container_id, None)
+            self.last_frames.pop(container_id, None)
+        if stream:
+            stream.stop()
+            print(f"- {self.names.get(container_id, container_id[:12])}")
+
+    def _follow_events(self, since):
+        """Track containers starting and stopping while profiling"""
+        filters = dict(self._filters(), type='container', event=['start', 'die'])
+        try:
+            for event in self.client.events(decode=True, filters=filters, since=since):
+                if not self.running:
+                    break
+                self.events_seen += 1
+                container_id = event.get('id') or event.get('Actor', {}).get('ID')
+                if event.get('status', event.get('Action')) == 'start':
+                    try:
+                        self._add(self.client.containers.get(container_id))
+                    except docker.errors.NotFound:
+                        continue
+                else:
+                    self._remove(container_id)
+        except Exception as e:
+            if self.running:
+                print(f"Event stream ended: {e}")
+
+    def sample(self):
+        """Take one sample per container with a new stats frame"""
+        timestamp = datetime.now().isoformat()
+        rows = []
+        with self._lock:
+            streams = list(self.streams.items())
+        for container_id, stream in streams:
+            latest = stream.latest()
+            previous = self.last_frames.get(container_id)
+            if latest is None or (previous and previous[0] == latest[0]):
+                continue
+            self.last_frames[container_id] = latest
+            if previous is None:
+                continue
+            try:
+                cpu = cpu_delta(previous[2], latest[2])
+            except (KeyError, TypeError):
+                continue
+            memory = memory_snapshot(latest[2])
+            row = {
+                'timestamp': timestamp,
+                'container_id': container_id[:12],
+                'container_name': self.names[container_id],
+                'cpu_percent': round(cpu['cpu_percent'], 3),
+                'throttled_periods': cpu['throttling_throttled_periods'],
+                'memory_usage': memory['usage'],
+                'memory_limit': memory['limit'],
+                'memory_percent': round(memory['percent'], 3),
+            }
+            self.summaries[container_id].add(row)
+            rows.append(row)
+        return rows
+
+    def start_profiling(self, interval=1.0, duration=60, output=None):
+        """Profile the fleet; samples are streamed to ``output`` if given"""
+        self.running = True
+        since = int(time.time())
+        threading.Thread(target=self._follow_events, args=(since,), name='docker-events', daemon=True).start()
+
+        for container in self.client.containers.list(filters=self._filters()):
+            self._add(container)
+        print(f"Profiling {len(self.streams)} containers for {duration} seconds...")
+
+        writer = SeriesWriter(output) if output else None
+        start_time = time.monotonic()
+        next_sample = start_time + interval
+        try:
+            while self.running and (time.monotonic() - start_time) < duration:
+                time.sleep(max(0.0, next_sample - time.monotonic()))
+                next_sample += interval
+                rows = self.sample()
+                if writer and rows:
+                    writer.write(rows)
+                if rows:
+                    total_cpu = sum(r['cpu_percent'] for r in rows)
+                    total_mb = sum(r['memory_usage'] for r in rows) / (1024**2)
+                    print(f"{len(rows)} containers  CPU: {total_cpu:.1f}%  Memory: {total_mb:.1f}MB")
+        finally:
+            self.running = False
+            with self._lock:
+                streams = list(self.streams.values())
+            for stream in streams:
+                stream.stop()
+            if writer:
+                writer.close()
+                print(f"Results saved to {output}")
+        print("Profiling completed!")
+
+    def generate_report(self):
+        """Generate per-container profiling report"""
+        summaries = [s for s in self.summaries.values() if s.samples]
+        if not summaries:
+            print("No profiling data available")
+            return
+
+        print("\n📊 Fleet Profiling Report")
+        print("=========================")
+        print(f"Containers: {len(summaries)}  Container events: {self.events_seen}")
+        print(f"{'Container':<32} {'Samples':>8} {'Avg CPU':>9} {'Peak CPU':>9} {'Peak Mem':>10} {'Throttled':>10}")
+        for s in sorted(summaries, key=lambda s: s.cpu_sum / s.samples, reverse=True):
+            print(f"{s.name[:32]:<32} {s.samples:>8} {s.cpu_sum / s.samples:>8.2f}% {s.cpu_max:>8.2f}% "
+                  f"{s.memory_max / (1024**2):>8.1f}MB {s.throttled:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU and memory profiling for a fleet of Docker containers")
+    parser.add_argument("-l", "--label", action="append", default=[],
+                        help="Label selector (key or key=value); repeat to require several")
+    parser.add_argument("-p", "--compose-project", help="Profile every container of a compose project")
+    parser.add_argument("--all", action="store_true", help="Profile all running containers")
+    parser.add_argument("-d", "--duration", type=int, default=60, help="Profiling duration in seconds")
+    parser.add_argument("-i", "--interval", type=float, default=1.0, help="Sampling interval in seconds")
+    parser.add_argument("-o", "--output", help="Merged time series file (.csv, or .jsonl for JSON lines)")
+
+    args = parser.parse_args()
+
+    try:
+        profiler = FleetProfiler(args.label, args.compose_project, args.all)
+    except ValueError as e:
+        parser.error(str(e))
+    except docker.errors.DockerException as e:
+        print(f"Cannot connect to Docker: {e}")
+        sys.exit(1)
+
+    try:
+        profiler.start_profiling(args.interval, args.duration, args.output)
+    except KeyboardInterrupt:
+        print("\nProfiling interrupted by user")
+        profiler.running = False
+
+    profiler.generate_report()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+# Location: utilities/performance/profiling/leak_analysis.py
+# Memory leak analysis for profiler time series
+#
+# Garbage-collected runtimes produce a sawtooth: memory climbs between
+# collections and drops after each one. A least-squares line through raw
+# samples follows the teeth, so a leak shows up reliably only in the level
+# memory returns to after collections. This module fits robust (Theil-Sen)
+# trends to the raw series and to that post-GC baseline, finds where the
+# growth pattern changes, and has an online detector for live profiling.
+
+import math
+from collections import namedtuple
+
+import numpy as np
+
+Trend = namedtuple('Trend', 'slope intercept low high')
+
+Z_95 = 1.959964
+
+
+def theil_sen(t, y, max_pairs=200_000, z=Z_95):
+    """Median of pairwise slopes, with Sen's rank-based confidence interval.
+
+    Exact over all pairs up to ``max_pairs``; beyond that a fixed random
+    sample of pairs is used, so the cost stays bounded for long runs.
+    """
+    t = np.asarray(t, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(t)
+    if n < 2:
+        raise ValueError("Need at least two samples for a trend")
+
+    total_pairs = n * (n - 1) // 2
+    if total_pairs <= max_pairs:
+        i, j = np.triu_indices(n, 1)
+    else:
+        rng = np.random.default_rng(0)
+        i = rng.integers(0, n, max_pairs)
+        j = rng.integers(0, n, max_pairs)
+    dt = t[j] - t[i]
+    valid = dt != 0
+    slopes = (y[j][valid] - y[i][valid]) / dt[valid]
+    if not len(slopes):
+        return Trend(0.0, float(np.median(y)), 0.0, 0.0)
+
+    slopes.sort()
+    slope = float(np.median(slopes))
+    intercept = float(np.median(y - slope * t))
+
+    # Sen (1968): the CI spans C ranks either side of the median, scaled to
+    # the number of pairs actually used
+    count = len(slopes)
+    c = z * math.sqrt(n * (n - 1) * (2 * n + 5) / 18) * count / total_pairs
+    low = slopes[max(0, int(math.floor((count - c) / 2)))]
+    high = slopes[min(count - 1, int(math.ceil((count + c) / 2)))]
+    return Trend(slope, intercept, float(low), float(high))
+
+
+def post_gc_minima(t, y, window=None):
+    """Lowest sample (and its time) in each ``window`` seconds: the post-GC baseline"""
+    t = np.asarray(t, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if window is None:
+        window = (t[-1] - t[0]) / 50 or 1.0
+    bucket = np.floor((t - t[0]) / window).astype(np.int64)
+    # A partial last window may miss its collection and read high
+    if bucket[-1] > 0 and (t[-1] - t[0]) - bucket[-1] * window < 0.9 * window:
+        keep = bucket < bucket[-1]
+        t, y, bucket = t[keep], y[keep], bucket[keep]
+    order = np.lexsort((y, bucket))
+    first = order[np.r_[True, bucket[order][1:] != bucket[order][:-1]]]
+    return t[first], y[first]
+
+
+def noise_sigma(y):
+    """Robust noise estimate from first differences (insensitive to trends and steps)"""
+    diffs = np.diff(np.asarray(y, dtype=np.float64))
+    if not len(diffs):
+        return 0.0
+    mad = np.median(np.abs(diffs - np.median(diffs)))
+    return float(1.4826 * mad / math.sqrt(2))
+
+
+def _line_sse(n, st, sy, stt, sty, syy):
+    """Residual sum of squares of a least-squares line, from the segment's sums"""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sxx = stt - st * st / n
+        sxy = sty - st * sy / n
+        sse = syy - sy * sy / n - np.where(sxx > 0, sxy * sxy / sxx, 0.0)
+    return np.maximum(sse, 0.0)
+
+
+def change_points(t, y, max_points=3, min_size=5, penalty=None):
+    """Indices where the series changes level or slope (binary segmentation).
+
+    Each candidate split is scored by how much two separate line fits reduce
+    the squared error against one fit, computed for every split at once from
+    cumulative sums. A split is kept if the reduction exceeds ``penalty``
+    noise variances (default BIC-like, 3 log n).
+    """
+    t = np.asarray(t, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n < 2 * min_size:
+        return []
+    # Scale time to [0, 1] so the cumulative sums stay well conditioned
+    span = (t[-1] - t[0]) or 1.0
+    ts = (t - t[0]) / span
+    sums = [np.r_[0.0, np.cumsum(v)] for v in (np.ones(n), ts, y, ts * ts, ts * y, y * y)]
+    sigma = noise_sigma(y) or float(np.std(y)) or 1.0
+    threshold = (penalty if penalty is not None else 3 * math.log(n)) * sigma * sigma
+
+    def best_split(a, b):
+        if b - a < 2 * min_size:
+            return None
+        k = np.arange(a + min_size, b - min_size + 1)
+        left = _line_sse(*(s[k] - s[a] for s in sums))
+        right = _line_sse(*(s[b] - s[k] for s in sums))
+        gain = _line_sse(*(s[b] - s[a] for s in sums)) - left - right
+        best = int(np.argmax(gain))
+        return (float(gain[best]), int(k[best])) if gain[best] > threshold else None
+
+    points = []
+    segments = [(0, n)]
+    while len(points) < max_points:
+        candidates = [(split, a, b) for a, b in segments if (split := best_split(a, b))]
+        if not candidates:
+            break
+        (gain, k), a, b = max(candidates, key=lambda c: c[0][0])
+        points.append(k)
+        segments.remove((a, b))
+        segments += [(a, k), (k, b)]
+    return sorted(points)
+
+
+def _hourly(trend):
+    return Trend(trend.slope * 3600, trend.intercept, trend.low * 3600, trend.high * 3600)
+
+
+def analyze(t, y, window=None, max_change_points=3):
+    """Robust trend, post-GC baseline trend and change points of a series.
+
+    ``t`` is in seconds; slopes are in units of ``y`` per hour. ``window``
+    should be longer than the collection cycle (default: 1/50 of the run).
+    Change points are searched in the baseline, since the sawtooth itself
+    would otherwise register as a change at every collection.
+    """
+    t = np.asarray(t, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    minima_t, minima_y = post_gc_minima(t, y, window)
+    points = change_points(minima_t, minima_y, max_change_points)
+    start = points[-1] if points else 0
+    has_baseline = len(minima_t) >= 3
+    return {
+        'samples': len(y),
+        'span_seconds': float(t[-1] - t[0]),
+        'trend': _hourly(theil_sen(t, y)),
+        'baseline': _hourly(theil_sen(minima_t, minima_y)) if has_baseline else None,
+        'baseline_points': len(minima_t),
+        'change_points': [float(minima_t[k]) for k in points],
+        # Baseline growth since the last change point, i.e. the current behaviour
+        'recent': _hourly(theil_sen(minima_t[start:], minima_y[start:])) if len(minima_t) - start >= 3 else None,
+    }
+
+
+class OnlineLeakDetector:
+    """Live leak detection with O(1) work and memory per sample.
+
+    Tracks the minimum of each ``window`` seconds (the post-GC baseline)
+    and fits a line through those minima with running sums (Welford-style
+    updates), flagging a leak when the slope's lower confidence bound is
+    positive and the fitted growth over the observed span reaches
+    ``threshold``.
+    """
+
+    def __init__(self, window=60.0, threshold=10.0, min_windows=5, z=Z_95):
+        self.window = window
+        self.threshold = threshold
+        self.min_windows = min_windows
+        self.z = z
+        self.leaking = False
+        self._window_start = None
+        self._window_min = None
+        # Running regression state over closed window minima
+        self.n = 0
+        self._mean_t = self._mean_y = 0.0
+        self._sxx = self._sxy = self._syy = 0.0
+        self._first_t = None
+        self._last_t = 0.0
+
+    def update(self, t, y):
+        """Add one sample; return the current estimate when a window closes, else None"""
+        closed = self._window_start is not None and t - self._window_start >= self.window
+        if closed:
+            self._add_minimum(*self._window_min)
+        if self._window_start is None or closed:
+            self._window_start = t
+            self._window_min = (t, y)
+        elif y < self._window_min[1]:
+            self._window_min = (t, y)
+        return self.estimate() if closed else None
+
+    def _add_minimum(self, t, y):
+        if self._first_t is None:
+            self._first_t = t
+        t -= self._first_t
+        self._last_t = t
+        self.n += 1
+        dt = t - self._mean_t
+        dy = y - self._mean_y
+        self._mean_t += dt / self.n
+        self._mean_y += dy / self.n
+        self._sxx += dt * (t - self._mean_t)
+        self._sxy += dt * (y - self._mean_y)
+        self._syy += dy * (y - self._mean_y)
+
+    def estimate(self):
+        """Baseline slope per hour with its confidence bounds, and the leak verdict"""
+        if self.n < max(3, self.min_windows) or self._sxx <= 0:
+            return None
+        slope = self._sxy / self._sxx
+        residual = max(self._syy - slope * self._sxy, 0.0)
+        stderr = math.sqrt(residual / (self.n - 2) / self._sxx)
+        low, high = slope - self.z * stderr, slope + self.z * stderr
+        growth = slope * self._last_t  # fitted change from the first to the last minimum
+        self.leaking = low > 0 and growth >= self.threshold
+        return {
+            'windows': self.n,
+            'slope_per_hour': slope * 3600,
+            'low_per_hour': low * 3600,
+            'high_per_hour': high * 3600,
+            'growth': growth,
+            'leaking': self.leaking,
+        }
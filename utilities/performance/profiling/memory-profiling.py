@@ -3,19 +3,64 @@
 
 import psutil
 import time
-import json
 import argparse
 import docker
 from datetime import datetime
 import sys
 
+from cgroup_stats import cgroup_memory, open_container_sampler
+from container_stats import memory_snapshot
+from leak_analysis import OnlineLeakDetector, analyze
+from proc_memory import ProcessTreeSampler, TopProcessTracker
+from timeseries import TimeSeriesBuffer
+
+# Columns per sample type; every type has 'percent', which leak detection uses
+COLUMNS = {
+    'system': {
+        'total': ('Q', 'last'), 'available': 'Q', 'used': 'Q', 'free': 'Q',
+        'percent': 'f', 'percent_max': ('f', 'max'), 'cached': 'Q', 'buffers': 'Q',
+        'swap_total': ('Q', 'last'), 'swap_used': 'Q', 'swap_free': 'Q', 'swap_percent': 'f',
+    },
+    'container': {
+        'usage': 'Q', 'usage_max': ('Q', 'max'), 'limit': ('Q', 'last'),
+        'percent': 'f', 'percent_max': ('f', 'max'), 'cache': 'Q', 'rss': 'Q', 'swap': 'Q',
+    },
+    'process': {
+        'rss': 'Q', 'rss_max': ('Q', 'max'), 'pss': 'Q', 'pss_max': ('Q', 'max'), 'uss': 'Q',
+        'anon': 'Q', 'pss_file': 'Q', 'swap': 'Q', 'percent': 'f', 'percent_max': ('f', 'max'),
+        'processes': ('I', 'max'),
+    },
+}
+
 class MemoryProfiler:
-    def __init__(self, container_name=None):
+    def __init__(self, container_name=None, backend='auto', keep_raw=None, bucket=60.0,
+                 leak_threshold=10, leak_window=60.0, pid=None, include_children=True):
         self.container_name = container_name
         self.client = docker.from_env() if container_name else None
         self.container = None
         self.running = False
-        self.stats_history = []
+        # Created on the first sample, when its type (system/container/process) is known
+        self.stats_history = None
+        self.sample_type = None
+        self.keep_raw = keep_raw
+        self.bucket = bucket
+        self.top_processes = []
+        self.cgroup = None
+        self.leak_threshold = leak_threshold
+        self.leak_window = leak_window
+        self.leak_monitor = OnlineLeakDetector(leak_window, leak_threshold)
+        self.pid = pid
+        self.include_children = include_children
+        self.process_sampler = None
+        
+        if pid:
+            if not psutil.pid_exists(pid):
+                print(f"Process {pid} not found")
+                sys.exit(1)
+            try:
+                self.process_sampler = ProcessTreeSampler(pid, include_children)
+            except FileNotFoundError:
+                print("smaps_rollup not available (Linux 4.14+ required); using psutil, which is much slower")
         
         if container_name:
             try:
@@ -23,6 +68,12 @@ class MemoryProfiler:
             except docker.errors.NotFound:
                 print(f"Container '{container_name}' not found")
                 sys.exit(1)
+            
+            if backend != 'api':
+                self.cgroup = open_container_sampler(self.container)
+                if self.cgroup is None and backend == 'cgroup':
+                    print("No cgroup v2 directory found for the container")
+                    sys.exit(1)
     
     def get_system_memory_stats(self):
         """Get system-wide memory statistics"""
@@ -55,157 +106,217 @@ class MemoryProfiler:
             return None
         
         try:
-            stats = self.container.stats(stream=False)
-            memory_stats = stats['memory_stats']
-            
-            usage = memory_stats.get('usage', 0)
-            limit = memory_stats.get('limit', 0)
-            cache = memory_stats.get('stats', {}).get('cache', 0)
-            
-            # Calculate memory usage percentage
-            if limit > 0:
-                percent = (usage / limit) * 100
+            if self.cgroup:
+                # Unlimited cgroups report 'max'; use host memory as the limit, like the API
+                memory = cgroup_memory(self.cgroup.sample(), psutil.virtual_memory().total)
             else:
-                percent = 0
+                memory = memory_snapshot(self.container.stats(stream=False))
             
             return {
                 'timestamp': datetime.now().isoformat(),
                 'type': 'container',
                 'container_name': self.container_name,
-                'memory': {
-                    'usage': usage,
-                    'limit': limit,
-                    'percent': percent,
-                    'cache': cache,
-                    'rss': memory_stats.get('stats', {}).get('rss', 0),
-                    'swap': memory_stats.get('stats', {}).get('swap', 0)
-                }
+                'memory': memory
             }
         except Exception as e:
             print(f"Error getting container stats: {e}")
             return None
     
     def get_process_memory_stats(self, pid=None):
-        """Get process memory statistics"""
+        """Get memory statistics summed over a process and its children.
+        
+        PSS and USS come from smaps_rollup; ``percent`` is PSS as a share of
+        host memory, so it does not double count pages shared in the tree.
+        """
+        pid = pid or self.pid or psutil.Process().pid
         try:
-            if pid:
-                process = psutil.Process(pid)
+            if self.process_sampler and pid == self.pid:
+                memory = self.process_sampler.sample(time.monotonic())
+                processes = memory.pop('processes')
             else:
-                process = psutil.Process()
-            
-            memory_info = process.memory_info()
-            memory_percent = process.memory_percent()
+                memory, processes = self._psutil_tree_memory(pid)
             
+            total = psutil.virtual_memory().total
             return {
                 'timestamp': datetime.now().isoformat(),
                 'type': 'process',
-                'pid': process.pid,
-                'name': process.name(),
+                'pid': pid,
+                'processes': processes,
                 'memory': {
-                    'rss': memory_info.rss,
-                    'vms': memory_info.vms,
-                    'percent': memory_percent,
-                    'shared': getattr(memory_info, 'shared', 0),
-                    'text': getattr(memory_info, 'text', 0),
-                    'data': getattr(memory_info, 'data', 0)
+                    'rss': memory['rss'],
+                    'pss': memory['pss'],
+                    'uss': memory['uss'],
+                    'anon': memory['anon'],
+                    'pss_file': memory['pss_file'],
+                    'swap': memory['swap'],
+                    'percent': (memory['pss'] or memory['rss']) / total * 100
                 }
             }
+        except psutil.NoSuchProcess:
+            print(f"Process {pid} exited")
+            self.running = False
+            return None
         except Exception as e:
             print(f"Error getting process stats: {e}")
             return None
     
+    def _psutil_tree_memory(self, pid):
+        """Fallback for hosts without smaps_rollup; reads full smaps per process"""
+        root = psutil.Process(pid)
+        processes = [root] + (root.children(recursive=True) if self.include_children else [])
+        memory = dict.fromkeys(('rss', 'pss', 'uss', 'anon', 'pss_file', 'swap'), 0)
+        for process in processes:
+            try:
+                info = process.memory_full_info()
+            except psutil.AccessDenied:
+                info = process.memory_info()
+            except psutil.NoSuchProcess:
+                if process is root:
+                    raise
+                continue
+            for key in ('rss', 'pss', 'uss', 'swap'):
+                memory[key] += getattr(info, key, 0)
+        return memory, len(processes)
+    
+    def record(self, stats):
+        """Store one sample from get_*_memory_stats() in the columnar history"""
+        if self.stats_history is None:
+            self.sample_type = stats['type']
+            self.stats_history = TimeSeriesBuffer(COLUMNS[self.sample_type], self.keep_raw, self.bucket)
+        
+        values = dict(stats['memory'])
+        values['percent_max'] = values['percent']
+        if stats['type'] == 'system':
+            values.update({f'swap_{key}': value for key, value in stats['swap'].items()})
+        elif stats['type'] == 'container':
+            values['usage_max'] = values['usage']
+        else:
+            values['rss_max'] = values['rss']
+            values['pss_max'] = values['pss']
+            values['processes'] = stats['processes']
+        now = time.time()
+        self.stats_history.append(now, **values)
+        
+        was_leaking = self.leak_monitor.leaking
+        estimate = self.leak_monitor.update(now, values['percent'])
+        if estimate and estimate['leaking'] and not was_leaking:
+            print(f"⚠️  Memory baseline rising {estimate['slope_per_hour']:.2f}%/h "
+                  f"(95% CI {estimate['low_per_hour']:.2f}-{estimate['high_per_hour']:.2f}) "
+                  f"over {estimate['windows']} windows")
+    
     def start_profiling(self, interval=1.0, duration=60, include_processes=False):
         """Start memory profiling"""
         print(f"Starting memory profiling for {duration} seconds...")
         self.running = True
         
-        start_time = time.time()
-        while self.running and (time.time() - start_time) < duration:
+        top_tracker = None
+        if include_processes and not self.container_name and not self.pid:
+            top_tracker = TopProcessTracker(5)
+        
+        start_time = time.monotonic()
+        next_sample = start_time
+        while self.running and (time.monotonic() - start_time) < duration:
+            # Sleep to a fixed schedule so sampling cost does not add drift
+            time.sleep(max(0.0, next_sample - time.monotonic()))
+            next_sample += interval
+            
             if self.container_name:
                 stats = self.get_container_memory_stats()
+            elif self.pid:
+                stats = self.get_process_memory_stats()
             else:
                 stats = self.get_system_memory_stats()
             
             if stats:
-                self.stats_history.append(stats)
+                self.record(stats)
                 
                 if stats['type'] == 'system':
                     usage_gb = stats['memory']['used'] / (1024**3)
                     total_gb = stats['memory']['total'] / (1024**3)
                     print(f"Memory: {usage_gb:.1f}GB/{total_gb:.1f}GB ({stats['memory']['percent']:.1f}%)")
+                elif stats['type'] == 'process':
+                    memory = stats['memory']
+                    print(f"Memory: PSS {memory['pss']/(1024**2):.1f}MB, USS {memory['uss']/(1024**2):.1f}MB, "
+                          f"RSS {memory['rss']/(1024**2):.1f}MB across {stats['processes']} processes "
+                          f"({memory['percent']:.1f}%)")
                 else:
                     usage_mb = stats['memory']['usage'] / (1024**2)
                     limit_mb = stats['memory']['limit'] / (1024**2)
                     print(f"Memory: {usage_mb:.1f}MB/{limit_mb:.1f}MB ({stats['memory']['percent']:.1f}%)")
             
             # Include top memory processes if requested
-            if include_processes and not self.container_name:
-                top_processes = []
-                for proc in sorted(psutil.process_iter(['pid', 'name', 'memory_percent']), 
-                                 key=lambda x: x.info['memory_percent'] or 0, reverse=True)[:5]:
-                    try:
-                        top_processes.append({
-                            'pid': proc.info['pid'],
-                            'name': proc.info['name'],
-                            'memory_percent': proc.info['memory_percent'] or 0
-                        })
-                    except:
-                        continue
-                
-                if 'top_processes' not in stats:
-                    stats['top_processes'] = top_processes
-            
-            time.sleep(interval)
+            if top_tracker:
+                self.top_processes.append({'timestamp': datetime.now().isoformat(),
+                                           'processes': top_tracker.update(time.monotonic())})
         
         self.running = False
+        if self.cgroup:
+            self.cgroup.close()
+        if self.process_sampler:
+            self.process_sampler.close()
         print("Profiling completed!")
     
-    def detect_memory_leaks(self, threshold_percent=10):
-        """Detect potential memory leaks"""
-        if len(self.stats_history) < 10:
+    def detect_memory_leaks(self, threshold_percent=None):
+        """Detect potential memory leaks.
+        
+        A leak is reported when the post-GC baseline (the trend of window
+        minima) rises with a confidence interval above zero and by at least
+        ``threshold_percent`` points over the run, or over the part of the
+        run since the growth pattern last changed.
+        """
+        if threshold_percent is None:
+            threshold_percent = self.leak_threshold
+        if not self.stats_history or len(self.stats_history) < 10:
             print("Need more data points to detect memory leaks")
             return []
         
         leaks = []
-        memory_values = []
-        
-        # Extract memory usage values
-        for stat in self.stats_history:
-            if stat['type'] == 'system':
-                memory_values.append(stat['memory']['percent'])
-            else:
-                memory_values.append(stat['memory']['percent'])
+        timestamps = self.stats_history.column('timestamp')
+        # Runs shorter than a few leak windows use the default (1/50 of the run)
+        window = self.leak_window if timestamps[-1] - timestamps[0] >= 5 * self.leak_window else None
+        result = analyze(timestamps, self.stats_history.column('percent'), window)
+        hours = result['span_seconds'] / 3600
         
-        # Simple linear trend analysis
-        n = len(memory_values)
-        if n < 2:
-            return leaks
+        # Too few windows for a baseline: fall back to the robust raw trend
+        if result['baseline']:
+            trend, kind = result['baseline'], 'rising_baseline'
+        else:
+            trend, kind = result['trend'], 'increasing_trend'
+        if trend.low > 0 and trend.slope * hours >= threshold_percent:
+            leaks.append({
+                'type': kind,
+                'slope_per_hour': trend.slope,
+                'confidence_interval': [trend.low, trend.high],
+                'description': (f"Memory {'baseline after GC' if kind == 'rising_baseline' else 'usage'} "
+                                f"increasing by ~{trend.slope:.2f}% per hour "
+                                f"(95% CI {trend.low:.2f}-{trend.high:.2f})")
+            })
         
-        # Calculate trend (slope)
-        x_mean = sum(range(n)) / n
-        y_mean = sum(memory_values) / n
-        
-        numerator = sum((i - x_mean) * (memory_values[i] - y_mean) for i in range(n))
-        denominator = sum((i - x_mean) ** 2 for i in range(n))
-        
-        if denominator != 0:
-            slope = numerator / denominator
-            
-            # If slope is positive and significant, potential memory leak
-            if slope > threshold_percent / len(memory_values):
+        recent = result['recent']
+        if result['change_points'] and recent and recent.low > 0:
+            since = result['change_points'][-1]
+            if recent.slope * (timestamps[-1] - since) / 3600 >= threshold_percent:
                 leaks.append({
-                    'type': 'increasing_trend',
-                    'slope': slope,
-                    'description': f'Memory usage increasing by ~{slope:.2f}% per sample'
+                    'type': 'growth_since_change',
+                    'since': datetime.fromtimestamp(since).isoformat(),
+                    'slope_per_hour': recent.slope,
+                    'confidence_interval': [recent.low, recent.high],
+                    'description': (f"Memory baseline increasing by ~{recent.slope:.2f}% per hour since "
+                                    f"{datetime.fromtimestamp(since).strftime('%H:%M:%S')}")
                 })
         
         return leaks
     
     def save_results(self, filename):
-        """Save profiling results to JSON file"""
-        with open(filename, 'w') as f:
-            json.dump(self.stats_history, f, indent=2)
-        print(f"Results saved to {filename}")
+        """Save profiling results (.npz for compressed columns, otherwise JSON)"""
+        if not self.stats_history:
+            print("No profiling data to save")
+            return
+        metadata = {'target': self.container_name or self.pid or self.sample_type, 'type': self.sample_type}
+        if self.top_processes:
+            metadata['top_processes'] = self.top_processes
+        fmt = self.stats_history.save(filename, metadata)
+        print(f"Results saved to {filename} ({fmt})")
     
     def generate_report(self):
         """Generate memory profiling report"""
@@ -213,22 +324,24 @@ class MemoryProfiler:
             print("No profiling data available")
             return
         
-        memory_values = []
-        for stat in self.stats_history:
-            if stat['type'] == 'system':
-                memory_values.append(stat['memory']['percent'])
-            else:
-                memory_values.append(stat['memory']['percent'])
+        memory_values = self.stats_history.column('percent')
+        samples = self.stats_history.column('samples')
         
-        if memory_values:
-            avg_memory = sum(memory_values) / len(memory_values)
-            max_memory = max(memory_values)
-            min_memory = min(memory_values)
+        if len(memory_values):
+            # Downsampled rows are bucket means, weighted by the samples they cover
+            avg_memory = float((memory_values * samples).sum() / samples.sum())
+            max_memory = float(self.stats_history.column('percent_max').max())
+            min_memory = float(memory_values.min())
             
-            print(f"\n💾 Memory Profiling Report")
-            print(f"==========================")
-            print(f"Target: {'System' if not self.container_name else f'Container {self.container_name}'}")
-            print(f"Duration: {len(self.stats_history)} samples")
+            print("\n💾 Memory Profiling Report")
+            print("==========================")
+            if self.container_name:
+                print(f"Target: Container {self.container_name}")
+            elif self.pid:
+                print(f"Target: Process {self.pid}{' and children' if self.include_children else ''}")
+            else:
+                print("Target: System")
+            print(f"Duration: {int(samples.sum())} samples")
             print(f"Average Memory: {avg_memory:.2f}%")
             print(f"Peak Memory: {max_memory:.2f}%")
             print(f"Minimum Memory: {min_memory:.2f}%")
@@ -236,54 +349,59 @@ class MemoryProfiler:
             # Memory leak detection
             leaks = self.detect_memory_leaks()
             if leaks:
-                print(f"\n⚠️  Potential Memory Issues:")
+                print("\n⚠️  Potential Memory Issues:")
                 for leak in leaks:
                     print(f"  • {leak['description']}")
             else:
-                print(f"\n✅ No memory leaks detected")
+                print("\n✅ No memory leaks detected")
             
             # Additional container-specific info
-            if self.container_name and self.stats_history:
-                last_stat = self.stats_history[-1]
-                usage_mb = last_stat['memory']['usage'] / (1024**2)
-                limit_mb = last_stat['memory']['limit'] / (1024**2)
+            if self.container_name:
+                usage_mb = self.stats_history.last('usage') / (1024**2)
+                limit_mb = self.stats_history.last('limit') / (1024**2)
                 print(f"\nCurrent Usage: {usage_mb:.1f}MB / {limit_mb:.1f}MB")
+            
+            if self.pid:
+                print(f"\nCurrent PSS: {self.stats_history.last('pss') / (1024**2):.1f}MB "
+                      f"(USS {self.stats_history.last('uss') / (1024**2):.1f}MB, "
+                      f"peak PSS {self.stats_history.column('pss_max').max() / (1024**2):.1f}MB) "
+                      f"across {self.stats_history.last('processes')} processes")
+                if self.process_sampler and self.process_sampler.latest:
+                    print("Largest processes by PSS:")
+                    for proc in self.process_sampler.top(5):
+                        print(f"  {proc['pid']:>7} {proc['name']:<16} PSS {proc['pss'] / (1024**2):>8.1f}MB  "
+                              f"USS {proc['uss'] / (1024**2):>8.1f}MB  Swap {proc['swap'] / (1024**2):>6.1f}MB")
 
 def main():
     parser = argparse.ArgumentParser(description="Memory profiling tool for Docker containers")
     parser.add_argument("-c", "--container", help="Container name or ID to profile")
-    parser.add_argument("-p", "--pid", type=int, help="Process ID to profile")
+    parser.add_argument("-p", "--pid", type=int, help="Process ID to profile (with its children)")
+    parser.add_argument("--no-children", action="store_true", help="With --pid, leave out child processes")
     parser.add_argument("-d", "--duration", type=int, default=60, help="Profiling duration in seconds")
     parser.add_argument("-i", "--interval", type=float, default=1.0, help="Sampling interval in seconds")
-    parser.add_argument("-o", "--output", help="Output JSON file")
+    parser.add_argument("-o", "--output", help="Output file (.npz for compressed columns, otherwise JSON)")
+    parser.add_argument("--keep-raw", type=float,
+                        help="Keep full resolution for this many recent seconds; average older samples")
+    parser.add_argument("--bucket", type=float, default=60.0, help="Bucket size in seconds for older samples")
     parser.add_argument("--include-processes", action="store_true", help="Include top memory processes")
-    parser.add_argument("--leak-threshold", type=float, default=10, help="Memory leak detection threshold")
+    parser.add_argument("--leak-threshold", type=float, default=10,
+                        help="Memory growth (percentage points) that counts as a leak")
+    parser.add_argument("--leak-window", type=float, default=60.0,
+                        help="Window in seconds whose minimum is the post-GC baseline; longer than the GC cycle")
+    parser.add_argument("--backend", choices=["auto", "cgroup", "api"], default="auto",
+                        help="Container stats source: cgroup v2 files (fast, 10-100 Hz), Docker stats API, "
+                             "or cgroup with API fallback")
     
     args = parser.parse_args()
     
-    if args.pid:
-        # Profile specific process
-        profiler = MemoryProfiler()
-        try:
-            profiler.running = True
-            start_time = time.time()
-            while (time.time() - start_time) < args.duration:
-                stats = profiler.get_process_memory_stats(args.pid)
-                if stats:
-                    profiler.stats_history.append(stats)
-                    print(f"Memory: {stats['memory']['rss']/(1024**2):.1f}MB ({stats['memory']['percent']:.1f}%)")
-                time.sleep(args.interval)
-        except KeyboardInterrupt:
-            print("\nProfiling interrupted by user")
-    else:
-        # Profile container or system
-        profiler = MemoryProfiler(args.container)
-        
-        try:
-            profiler.start_profiling(args.interval, args.duration, args.include_processes)
-        except KeyboardInterrupt:
-            print("\nProfiling interrupted by user")
-            profiler.running = False
+    profiler = MemoryProfiler(args.container, args.backend, args.keep_raw, args.bucket,
+                              args.leak_threshold, args.leak_window, args.pid, not args.no_children)
+    
+    try:
+        profiler.start_profiling(args.interval, args.duration, args.include_processes)
+    except KeyboardInterrupt:
+        print("\nProfiling interrupted by user")
+        profiler.running = False
     
     profiler.generate_report()
     
@@ -0,0 +1,258 @@
+# Location: utilities/performance/profiling/proc_memory.py
+# Per-process memory from /proc for the memory profiler
+#
+# /proc/<pid>/smaps_rollup (Linux 4.14+) sums a process's mappings in the
+# kernel: PSS (shared pages split between the processes using them), USS
+# (private pages), anonymous, file-backed and swapped memory. PSS adds up
+# across a process tree without double counting shared libraries, which
+# RSS does not.
+
+import heapq
+import os
+from operator import itemgetter
+
+import psutil
+
+PROC = '/proc'
+
+# smaps_rollup fields kept, in kB in the file and bytes in samples
+SMAPS_FIELDS = {
+    b'Rss': 'rss',
+    b'Pss': 'pss',
+    b'Pss_Anon': 'pss_anon',
+    b'Pss_File': 'pss_file',
+    b'Private_Clean': 'private_clean',
+    b'Private_Dirty': 'private_dirty',
+    b'Anonymous': 'anon',
+    b'Swap': 'swap',
+}
+
+
+def parse_smaps_rollup(data):
+    """Fields of a smaps_rollup read, in bytes, plus USS (private pages)"""
+    values = dict.fromkeys(SMAPS_FIELDS.values(), 0)
+    # First line is the '[rollup]' pseudo-mapping header
+    for line in data.split(b'\n')[1:]:
+        key, _, rest = line.partition(b':')
+        name = SMAPS_FIELDS.get(key)
+        if name:
+            values[name] = int(rest.split()[0]) * 1024
+    values['uss'] = values['private_clean'] + values['private_dirty']
+    # Pss_File is absent before Linux 5.7; everything not anonymous is file/shmem
+    if not values['pss_file'] and values['pss_anon']:
+        values['pss_file'] = values['pss'] - values['pss_anon']
+    return values
+
+
+class ProcessTreeSampler:
+    """Samples smaps_rollup for a process and all of its descendants.
+
+    Each process's smaps_rollup is opened once and re-read with pread at
+    offset 0, so a sample costs one syscall per process and no path
+    lookups. The fd stays bound to the process it was opened for, so a
+    recycled PID cannot be misattributed: reads fail once the process exits
+    and its fd is dropped. The tree is re-walked every ``rescan_interval``
+    seconds through /proc/<pid>/task/<tid>/children.
+    """
+
+    def __init__(self, root_pid, include_children=True, rescan_interval=1.0, proc=PROC):
+        self.root_pid = root_pid
+        self.include_children = include_children
+        self.rescan_interval = rescan_interval
+        self.proc = proc
+        self.names = {}
+        self.latest = {}      # pid -> fields of its last sample
+        self._fds = {}        # pid -> smaps_rollup fd
+        self._scanned_at = None
+        self._read_size = 4096
+        if not os.path.exists(os.path.join(proc, str(root_pid), 'smaps_rollup')):
+            raise FileNotFoundError(f"No smaps_rollup for PID {root_pid}")
+        # Kernels without CONFIG_PROC_CHILDREN lack these; psutil scans /proc instead
+        self._children_files = os.path.exists(os.path.join(proc, str(root_pid), 'task', str(root_pid), 'children'))
+
+    def _children(self, pid):
+        if not self._children_files:
+            try:
+                return [p.pid for p in psutil.Process(pid).children()]
+            except psutil.Error:
+                return []
+
+        task_dir = os.path.join(self.proc, str(pid), 'task')
+        children = []
+        try:
+            tids = os.listdir(task_dir)
+        except OSError:
+            return children
+        for tid in tids:
+            try:
+                with open(os.path.join(task_dir, tid, 'children'), 'rb') as f:
+                    children.extend(int(child) for child in f.read().split())
+            except OSError:
+                # Thread exited while walking
+                continue
+        return children
+
+    def tree(self):
+        """PIDs of the root process and, if enabled, all its descendants"""
+        pids = [self.root_pid]
+        if self.include_children:
+            for pid in pids:
+                pids.extend(self._children(pid))
+        return pids
+
+    def _rescan(self, now):
+        current = set(self.tree())
+        for pid in set(self._fds) - current:
+            self._drop(pid)
+        for pid in current - set(self._fds):
+            try:
+                self._fds[pid] = os.open(os.path.join(self.proc, str(pid), 'smaps_rollup'), os.O_RDONLY)
+                with open(os.path.join(self.proc, str(pid), 'comm')) as f:
+                    self.names[pid] = f.read().strip()
+            except OSError:
+                continue
+        self._scanned_at = now
+
+    def _drop(self, pid):
+        os.close(self._fds.pop(pid))
+        self.latest.pop(pid, None)
+        self.names.pop(pid, None)
+
+    def sample(self, now):
+        """Read every process in the tree; return the summed fields and process count"""
+        if self._scanned_at is None or now - self._scanned_at >= self.rescan_interval:
+            self._rescan(now)
+
+        totals = dict.fromkeys(list(SMAPS_FIELDS.values()) + ['uss'], 0)
+        for pid, fd in list(self._fds.items()):
+            try:
+                data = os.pread(fd, self._read_size, 0)
+                while len(data) == self._read_size:
+                    self._read_size *= 2
+                    data = os.pread(fd, self._read_size, 0)
+            except OSError:
+                # The process exited
+                self._drop(pid)
+                continue
+            if not data:
+                # Zombie: no address space left
+                self.latest.pop(pid, None)
+                continue
+            values = self.latest[pid] = parse_smaps_rollup(data)
+            for key, value in values.items():
+                totals[key] += value
+        if self.root_pid not in self._fds:
+            raise psutil.NoSuchProcess(self.root_pid)
+        totals['processes'] = len(self.latest)
+        return totals
+
+    def top(self, n=5, key='pss'):
+        """Largest processes of the last sample"""
+        ranked = sorted(self.latest.items(), key=lambda item: item[1][key], reverse=True)[:n]
+        return [{'pid': pid, 'name': self.names.get(pid, '?'), **values} for pid, values in ranked]
+
+    def close(self):
+        """Release the fds; the last sample stays available for reporting"""
+        for fd in self._fds.values():
+            os.close(fd)
+        self._fds = {}
+
+
+class TopProcessTracker:
+    """Largest processes by RSS with bounded work per tick.
+
+    Sorting every process each tick costs O(P log P) plus a psutil call
+    per process. Instead, RSS is read from /proc/<pid>/statm (one small
+    read), and each tick re-reads only the current leading ``candidates``
+    plus the next ``budget`` processes in round-robin order, so every
+    process is refreshed within P / budget ticks. The top ``n`` are picked
+    with a heap, and only they get full details through psutil's
+    ``oneshot()``. The PID list is refreshed every ``rescan_interval``
+    seconds, and new processes are read immediately. Without /proc (macOS)
+    RSS comes from psutil instead, with the same bounded sweep.
+    """
+
+    def __init__(self, n=5, candidates=None, budget=256, rescan_interval=5.0, proc=PROC):
+        self.n = n
+        self.candidates = candidates or 4 * n
+        self.budget = budget
+        self.rescan_interval = rescan_interval
+        self.proc = proc
+        self.statm = os.path.exists(os.path.join(proc, 'self', 'statm'))
+        self.page_size = os.sysconf('SC_PAGE_SIZE')
+        self.total_memory = psutil.virtual_memory().total
+        self._rss = {}          # pid -> RSS bytes from statm
+        self._order = []        # round-robin sweep order
+        self._cursor = 0
+        self._processes = {}    # pid -> psutil.Process, for the current top only
+        self._scanned_at = None
+
+    def _read_rss(self, pid):
+        if not self.statm:
+            try:
+                self._rss[pid] = psutil.Process(pid).memory_info().rss
+            except psutil.Error:
+                self._rss.pop(pid, None)
+            return
+        try:
+            fd = os.open(f'{self.proc}/{pid}/statm', os.O_RDONLY)
+            try:
+                data = os.read(fd, 128)
+            finally:
+                os.close(fd)
+            self._rss[pid] = int(data.split()[1]) * self.page_size
+        except (OSError, IndexError, ValueError):
+            # Exited; the next rescan removes it from the sweep order
+            self._rss.pop(pid, None)
+
+    def _rescan(self, now):
+        if self.statm:
+            pids = [int(name) for name in os.listdir(self.proc) if name.isdigit()]
+        else:
+            pids = psutil.pids()
+        current = set(pids)
+        for pid in list(self._rss):
+            if pid not in current:
+                del self._rss[pid]
+        for pid in pids:
+            if pid not in self._rss:
+                self._read_rss(pid)
+        self._order = pids
+        self._cursor = 0
+        self._scanned_at = now
+
+    def update(self, now):
+        """Refresh a bounded set of processes and return the current top ``n``"""
+        if self._scanned_at is None or now - self._scanned_at >= self.rescan_interval:
+            self._rescan(now)
+        else:
+            for pid in heapq.nlargest(self.candidates, self._rss, key=self._rss.__getitem__):
+                self._read_rss(pid)
+            sweep = self._order[self._cursor:self._cursor + self.budget]
+            self._cursor = (self._cursor + self.budget) if len(sweep) == self.budget else 0
+            for pid in sweep:
+                self._read_rss(pid)
+
+        top = []
+        for pid, rss in heapq.nlargest(self.n, self._rss.items(), key=itemgetter(1)):
+            try:
+                process = self._processes.get(pid) or psutil.Process(pid)
+                with process.oneshot():
+                    name = process.name()
+                    memory = process.memory_info()
+            except psutil.Error:
+                # Exited since its statm read
+                self._rss.pop(pid, None)
+                self._processes.pop(pid, None)
+                continue
+            self._processes[pid] = process
+            top.append({
+                'pid': pid,
+                'name': name,
+                'rss': memory.rss,
+                'vms': memory.vms,
+                'memory_percent': memory.rss / self.total_memory * 100,
+            })
+        # Keep psutil handles only for processes that are still on top
+        self._processes = {entry['pid']: self._processes[entry['pid']] for entry in top}
+        return top
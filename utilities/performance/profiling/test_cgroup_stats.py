@@ -0,0 +1,147 @@
+# Location: utilities/performance/profiling/test_cgroup_stats.py
+# Tests for cgroup_stats against a fake cgroup v2 tree built in tmp_path
+
+import importlib
+
+import pytest
+
+import cgroup_stats
+
+CONTAINER_ID = 'abc123'
+
+CPU_STAT = """usage_usec 2000000
+user_usec 1500000
+system_usec 500000
+nr_periods 100
+nr_throttled 7
+throttled_usec 35000
+"""
+
+MEMORY_STAT = """anon 52428800
+file 10485760
+kernel 1048576
+"""
+
+IO_STAT = """8:0 rbytes=4096 wbytes=8192 rios=1 wios=2 dbytes=0 dios=0
+8:16 rbytes=1000 wbytes=24 rios=3 wios=4 dbytes=0 dios=0
+"""
+
+CPU_PRESSURE = """some avg10=1.50 avg60=0.75 avg300=0.10 total=120000
+full avg10=0.00 avg60=0.00 avg300=0.00 total=0
+"""
+
+
+def write_cgroup(path, **files):
+    path.mkdir(parents=True, exist_ok=True)
+    for name, content in files.items():
+        (path / name.replace('_', '.')).write_text(content)
+    return path
+
+
+@pytest.fixture
+def cgroup_root(tmp_path, monkeypatch):
+    """Point CGROUP_ROOT (read at import time) at an empty v2 tree"""
+    (tmp_path / 'cgroup.controllers').write_text('cpu io memory pids\n')
+    monkeypatch.setenv('CGROUP_ROOT', str(tmp_path))
+    importlib.reload(cgroup_stats)
+    yield tmp_path
+    monkeypatch.undo()
+    importlib.reload(cgroup_stats)
+
+
+@pytest.fixture
+def container_cgroup(cgroup_root):
+    return write_cgroup(
+        cgroup_root / f'system.slice/docker-{CONTAINER_ID}.scope',
+        cpu_stat=CPU_STAT,
+        memory_current='67108864\n',
+        memory_max='134217728\n',
+        memory_stat=MEMORY_STAT,
+        io_stat=IO_STAT,
+        cpu_pressure=CPU_PRESSURE,
+    )
+
+
+def test_parsers():
+    assert cgroup_stats._parse_flat(CPU_STAT)['throttled_usec'] == 35000
+    assert cgroup_stats._parse_io(IO_STAT) == {'rbytes': 5096, 'wbytes': 8216, 'rios': 4, 'wios': 6}
+    pressure = cgroup_stats._parse_pressure(CPU_PRESSURE)
+    assert pressure['some'] == {'avg10': 1.5, 'avg60': 0.75, 'avg300': 0.1, 'total': 120000}
+    assert pressure['full']['total'] == 0
+    assert cgroup_stats._parse_max('max\n') is None
+    assert cgroup_stats._parse_max('1024\n') == 1024
+
+
+def test_find_container_cgroup(cgroup_root, container_cgroup):
+    assert cgroup_stats.CGROUP_ROOT == str(cgroup_root)
+    assert cgroup_stats.find_container_cgroup(CONTAINER_ID) == str(container_cgroup)
+    assert cgroup_stats.find_container_cgroup('missing') is None
+
+
+def test_find_container_cgroup_requires_v2(tmp_path):
+    write_cgroup(tmp_path / f'docker/{CONTAINER_ID}', cpu_stat=CPU_STAT)
+    assert cgroup_stats.find_container_cgroup(CONTAINER_ID, root=str(tmp_path)) is None
+
+
+def test_sampler_reads_every_file(container_cgroup):
+    sampler = cgroup_stats.CgroupSampler(str(container_cgroup))
+    try:
+        sample = sampler.sample()
+    finally:
+        sampler.close()
+    assert sample['cpu_usage_usec'] == 2000000
+    assert sample['nr_throttled'] == 7
+    assert sample['memory_current'] == 67108864
+    assert sample['memory_max'] == 134217728
+    assert sample['memory_anon'] == 52428800
+    assert sample['memory_file'] == 10485760
+    assert sample['swap_current'] == 0
+    assert sample['io'] == {'rbytes': 5096, 'wbytes': 8216, 'rios': 4, 'wios': 6}
+    assert sample['cpu_pressure']['some']['total'] == 120000
+
+
+def test_sampler_rereads_updated_files(container_cgroup):
+    sampler = cgroup_stats.CgroupSampler(str(container_cgroup))
+    try:
+        first = sampler.sample()
+        (container_cgroup / 'cpu.stat').write_text(CPU_STAT.replace('usage_usec 2000000', 'usage_usec 2500000'))
+        second = sampler.sample()
+    finally:
+        sampler.close()
+    assert second['cpu_usage_usec'] - first['cpu_usage_usec'] == 500000
+
+
+def test_sampler_skips_missing_files(cgroup_root):
+    path = write_cgroup(cgroup_root / 'docker' / CONTAINER_ID, cpu_stat=CPU_STAT, memory_max='max\n')
+    sampler = cgroup_stats.CgroupSampler(str(path))
+    try:
+        sample = sampler.sample()
+    finally:
+        sampler.close()
+    assert sample['memory_current'] == 0
+    assert sample['memory_max'] is None
+    assert sample['io'] == {}
+    assert sample['cpu_pressure'] == {}
+
+
+def test_sampler_requires_cpu_stat(cgroup_root):
+    path = write_cgroup(cgroup_root / 'docker' / CONTAINER_ID, memory_current='1\n')
+    with pytest.raises(FileNotFoundError):
+        cgroup_stats.CgroupSampler(str(path))
+
+
+def test_cgroup_delta_and_memory():
+    prev = {'mono': 10.0, 'cpu_usage_usec': 1000000, 'nr_periods': 10, 'nr_throttled': 1,
+            'throttled_usec': 5000, 'cpu_pressure': {'some': {'total': 100000}}}
+    cur = {'mono': 11.0, 'cpu_usage_usec': 1500000, 'nr_periods': 20, 'nr_throttled': 4,
+           'throttled_usec': 20000, 'cpu_pressure': {'some': {'total': 350000}}}
+    delta = cgroup_stats.cgroup_delta(prev, cur)
+    assert delta['cpu_percent'] == pytest.approx(50.0)
+    assert delta['throttling_periods'] == 10
+    assert delta['throttling_throttled_periods'] == 3
+    assert delta['throttled_usec'] == 15000
+    assert delta['cpu_pressure_percent'] == pytest.approx(25.0)
+
+    sample = {'memory_current': 256, 'memory_max': None, 'memory_file': 64, 'memory_anon': 128, 'swap_current': 0}
+    memory = cgroup_stats.cgroup_memory(sample, host_total=1024)
+    assert memory == {'usage': 256, 'limit': 1024, 'percent': 25.0, 'cache': 64, 'rss': 128, 'swap': 0}
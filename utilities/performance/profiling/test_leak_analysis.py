@@ -0,0 +1,125 @@
+# Location: utilities/performance/profiling/test_leak_analysis.py
+# Tests for leak_analysis on synthetic garbage-collected memory series
+
+import numpy as np
+import pytest
+
+import leak_analysis
+
+GC_PERIOD = 30.0
+
+
+def sawtooth(seconds=7200, leak_per_hour=0.0, base=100.0, tooth=20.0, noise=0.0, seed=1):
+    """1 Hz samples: memory climbs ``tooth`` MB per GC cycle on a baseline growing ``leak_per_hour``"""
+    t = np.arange(0, seconds, 1.0)
+    y = base + leak_per_hour * t / 3600 + tooth * (t % GC_PERIOD) / GC_PERIOD
+    if noise:
+        y += np.random.default_rng(seed).normal(0, noise, len(t))
+    return t, y
+
+
+def test_theil_sen_exact_line():
+    t = np.arange(20.0)
+    trend = leak_analysis.theil_sen(t, 3 * t + 5)
+    assert trend.slope == pytest.approx(3.0)
+    assert trend.intercept == pytest.approx(5.0)
+    assert trend.low == pytest.approx(3.0)
+    assert trend.high == pytest.approx(3.0)
+
+
+def test_theil_sen_ignores_outliers():
+    t = np.arange(50.0)
+    y = 2 * t
+    y[[5, 17, 40]] = 1000
+    trend = leak_analysis.theil_sen(t, y)
+    assert trend.slope == pytest.approx(2.0)
+    assert trend.low <= 2.0 <= trend.high
+
+
+def test_theil_sen_sampled_pairs():
+    t, y = sawtooth(seconds=3000, leak_per_hour=36.0, noise=0.5)
+    exact = leak_analysis.theil_sen(t, y)
+    sampled = leak_analysis.theil_sen(t, y, max_pairs=50_000)
+    assert sampled.slope == pytest.approx(exact.slope, rel=0.05)
+
+
+def test_theil_sen_needs_two_samples():
+    with pytest.raises(ValueError):
+        leak_analysis.theil_sen([1.0], [1.0])
+    assert leak_analysis.theil_sen([1.0, 1.0], [2.0, 4.0]).slope == 0.0
+
+
+def test_post_gc_minima_tracks_baseline():
+    t, y = sawtooth(leak_per_hour=60.0)
+    minima_t, minima_y = leak_analysis.post_gc_minima(t, y, window=60.0)
+    assert len(minima_t) == 120
+    # Every window contains a collection, so its minimum sits on the baseline
+    np.testing.assert_allclose(minima_y, 100.0 + 60.0 * minima_t / 3600)
+
+
+def test_post_gc_minima_drops_partial_last_window():
+    t, y = sawtooth(seconds=630)
+    minima_t, _ = leak_analysis.post_gc_minima(t, y, window=60.0)
+    assert len(minima_t) == 10
+
+
+def test_change_points_finds_step_in_slope():
+    t = np.arange(200.0)
+    y = np.where(t < 120, 50.0, 50.0 + 2.0 * (t - 120))
+    y += np.random.default_rng(0).normal(0, 0.5, len(t))
+    points = leak_analysis.change_points(t, y)
+    assert points
+    assert any(abs(k - 120) <= 5 for k in points)
+
+
+def test_change_points_flat_series():
+    t = np.arange(200.0)
+    y = 50.0 + np.random.default_rng(0).normal(0, 0.5, len(t))
+    assert leak_analysis.change_points(t, y) == []
+    assert leak_analysis.change_points(t[:8], y[:8]) == []
+
+
+def test_analyze_separates_sawtooth_from_leak():
+    t, y = sawtooth(leak_per_hour=30.0, noise=0.2)
+    result = leak_analysis.analyze(t, y, window=60.0)
+    assert result['samples'] == len(t)
+    assert result['baseline_points'] == 120
+    assert result['baseline'].slope == pytest.approx(30.0, rel=0.1)
+    assert result['baseline'].low > 0
+    assert result['recent'] is not None
+
+
+def test_analyze_no_leak():
+    t, y = sawtooth(noise=0.2)
+    baseline = leak_analysis.analyze(t, y, window=60.0)['baseline']
+    assert baseline.low <= 0 <= baseline.high
+
+
+def feed(detector, t, y):
+    estimate = None
+    for ti, yi in zip(t, y):
+        estimate = detector.update(ti, yi) or estimate
+    return estimate
+
+
+def test_online_detector_flags_leak():
+    detector = leak_analysis.OnlineLeakDetector(window=60.0, threshold=10.0)
+    estimate = feed(detector, *sawtooth(leak_per_hour=30.0, noise=0.2))
+    assert detector.leaking
+    assert estimate['leaking']
+    assert estimate['slope_per_hour'] == pytest.approx(30.0, rel=0.1)
+    assert estimate['windows'] == 119
+
+
+def test_online_detector_ignores_sawtooth():
+    detector = leak_analysis.OnlineLeakDetector(window=60.0, threshold=10.0)
+    estimate = feed(detector, *sawtooth(noise=0.2))
+    assert not detector.leaking
+    assert not estimate['leaking']
+
+
+def test_online_detector_waits_for_min_windows():
+    detector = leak_analysis.OnlineLeakDetector(window=60.0, min_windows=5)
+    t, y = sawtooth(seconds=300, leak_per_hour=600.0)
+    assert feed(detector, t, y) is None
+    assert detector.estimate() is None
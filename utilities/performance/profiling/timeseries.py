@@ -0,0 +1,155 @@
+# Location: utilities/performance/profiling/timeseries.py
+# Columnar time-series buffer for the profilers
+#
+# Samples are stored one typed array per column (float64 epoch timestamps,
+# float32 percentages, integer byte counts), about 4-8 bytes per value
+# instead of a dict with an ISO timestamp string per sample. Samples older
+# than ``keep_raw`` seconds can be folded into ``bucket``-second averages,
+# so a 24 hour run keeps full resolution only for the recent window. Results
+# are written as compressed NPZ or as JSON records.
+
+import json
+from array import array
+from datetime import datetime
+
+import numpy as np
+
+# Per-column aggregation when older samples are downsampled
+AGGREGATES = ('mean', 'max', 'sum', 'last')
+
+
+class TimeSeriesBuffer:
+    """Append-only typed columns with optional downsampling of older data.
+
+    ``columns`` maps a name to an ``array`` typecode, or to a
+    ``(typecode, aggregate)`` pair; the default aggregate is ``mean``. Two
+    columns are always present: ``timestamp`` (epoch seconds) and
+    ``samples``, the number of raw samples a row stands for.
+    """
+
+    def __init__(self, columns, keep_raw=None, bucket=60.0):
+        self.specs = {'timestamp': ('d', 'last'), 'samples': ('I', 'sum')}
+        for name, spec in columns.items():
+            typecode, aggregate = (spec, 'mean') if isinstance(spec, str) else spec
+            if aggregate not in AGGREGATES:
+                raise ValueError(f"Unknown aggregate '{aggregate}' for column '{name}'")
+            self.specs[name] = (typecode, aggregate)
+        self.keep_raw = keep_raw
+        self.bucket = bucket
+        self._raw = self._empty()
+        self._downsampled = self._empty()
+        self._next_compact = 1024
+        self._limits = {name: self._bounds(typecode) for name, (typecode, _) in self.specs.items()}
+
+    @staticmethod
+    def _bounds(typecode):
+        """(min, max) representable by an integer typecode, None for floats"""
+        if typecode in 'fd':
+            return None
+        bits = 8 * array(typecode).itemsize
+        if typecode in 'bhilq':
+            return -(1 << (bits - 1)), (1 << (bits - 1)) - 1
+        return 0, (1 << bits) - 1
+
+    def _empty(self):
+        return {name: array(typecode) for name, (typecode, _) in self.specs.items()}
+
+    @property
+    def columns(self):
+        return list(self.specs)
+
+    def __len__(self):
+        return len(self._raw['timestamp']) + len(self._downsampled['timestamp'])
+
+    @property
+    def nbytes(self):
+        return sum(col.itemsize * len(col) for part in (self._raw, self._downsampled) for col in part.values())
+
+    def append(self, timestamp, **values):
+        """Add one sample; columns not given are stored as 0.
+
+        Integer values are clamped to their column's range (e.g. a negative
+        byte delta becomes 0 in an unsigned column). Every value is converted
+        before any column is touched, so a bad value leaves the buffer as is.
+        """
+        row = []
+        for name, limits in self._limits.items():
+            if name == 'timestamp':
+                value = float(timestamp)
+            elif name == 'samples':
+                value = 1
+            elif limits is None:
+                value = float(values.get(name) or 0)
+            else:
+                value = min(max(int(values.get(name) or 0), limits[0]), limits[1])
+            row.append(value)
+        for col, value in zip(self._raw.values(), row):
+            col.append(value)
+        if self.keep_raw is not None and len(self._raw['timestamp']) >= self._next_compact:
+            self.compact()
+
+    def compact(self):
+        """Fold raw samples older than ``keep_raw`` into ``bucket``-second rows"""
+        # Copies, not views: the arrays cannot be resized while a view exists
+        timestamps = np.array(self._raw['timestamp'], dtype=np.float64)
+        if not len(timestamps):
+            return
+        # Cut on a bucket boundary so no bucket is split between two passes
+        cutoff = np.floor((timestamps[-1] - self.keep_raw) / self.bucket) * self.bucket
+        count = int(np.searchsorted(timestamps, cutoff))
+        if count:
+            buckets = np.floor(timestamps[:count] / self.bucket)
+            starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+            ends = np.r_[starts[1:], count] - 1
+            weights = np.array(self._raw['samples'][:count], dtype=np.float64)
+            for name, (typecode, aggregate) in self.specs.items():
+                values = np.array(self._raw[name][:count], dtype=np.float64)
+                if aggregate == 'mean':
+                    folded = np.add.reduceat(values * weights, starts) / np.add.reduceat(weights, starts)
+                elif aggregate == 'max':
+                    folded = np.maximum.reduceat(values, starts)
+                elif aggregate == 'sum':
+                    folded = np.add.reduceat(values, starts)
+                else:
+                    folded = values[ends]
+                if typecode not in 'fd':
+                    folded = np.rint(folded)
+                self._downsampled[name].extend(folded.astype(np.dtype(typecode)).tolist())
+                del self._raw[name][:count]
+        # Amortized O(1) per append: the next pass waits for the raw part to double
+        self._next_compact = 2 * len(self._raw['timestamp']) + 1024
+
+    def column(self, name):
+        """All values of a column, oldest first, as a NumPy array"""
+        typecode = self.specs[name][0]
+        # np.array copies, so the buffer can keep growing while the result is held
+        return np.concatenate([np.array(self._downsampled[name], dtype=np.dtype(typecode)),
+                               np.array(self._raw[name], dtype=np.dtype(typecode))])
+
+    def last(self, name):
+        col = self._raw[name] or self._downsampled[name]
+        return col[-1] if col else None
+
+    def records(self):
+        """Samples as flat dicts with ISO timestamps (for JSON)"""
+        # float32 values widen to noisy doubles (9.1 -> 9.100000381...); keep their precision
+        float32 = [name for name, (typecode, _) in self.specs.items() if typecode == 'f']
+        for part in (self._downsampled, self._raw):
+            names = list(part)
+            for row in zip(*part.values()):
+                record = dict(zip(names, row))
+                record['timestamp'] = datetime.fromtimestamp(record['timestamp']).isoformat()
+                for name in float32:
+                    record[name] = float(f'{record[name]:.7g}')
+                yield record
+
+    def save(self, filename, metadata=None):
+        """Write ``.npz`` (compressed columns) or JSON records; return the format"""
+        if filename.endswith('.npz'):
+            meta = dict(metadata or {}, keep_raw=self.keep_raw, bucket=self.bucket)
+            np.savez_compressed(filename, _metadata=np.array(json.dumps(meta)),
+                                **{name: self.column(name) for name in self.specs})
+            return 'npz'
+        with open(filename, 'w') as f:
+            json.dump({'metadata': metadata or {}, 'samples': list(self.records())}, f, separators=(',', ':'))
+        return 'json'